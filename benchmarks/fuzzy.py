@@ -0,0 +1,103 @@
+"""
+Times the BK-tree backed FuzzyIndex against a linear scan with get_best_difference.
+Copyright (C) 2021 kal-byte
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Usage: python benchmarks/fuzzy.py [--candidates 10000] [--queries 1000]
+"""
+
+import argparse
+import pathlib
+import random
+import string
+import sys
+import time
+import Levenshtein
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from utils.fuzzy import FuzzyIndex  # noqa: E402
+from utils.utils import get_best_difference  # noqa: E402
+
+
+def make_word(rng: random.Random) -> str:
+    return "".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 14)))
+
+
+def make_typo(rng: random.Random, word: str) -> str:
+    """The word with one or two random edits, like someone mistyping a tag or command name."""
+
+    for _ in range(rng.randint(1, 2)):
+        position = rng.randrange(len(word))
+        edit = rng.choice(("insert", "delete", "replace"))
+
+        if edit == "insert":
+            word = word[:position] + rng.choice(string.ascii_lowercase) + word[position:]
+        elif edit == "delete" and len(word) > 1:
+            word = word[:position] + word[position + 1:]
+        else:
+            word = word[:position] + rng.choice(string.ascii_lowercase) + word[position + 1:]
+
+    return word
+
+
+def timed(name: str, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    print(f"  {name:<24} {elapsed * 1000:>10,.1f}ms")
+    return result
+
+
+def main(candidates: int, queries: int, max_distance: int, seed: int):
+    rng = random.Random(seed)
+
+    words = list({make_word(rng) for _ in range(candidates)})
+    # Half are typos of something that's there, half are made up and mostly have no match.
+    lookups = [make_typo(rng, rng.choice(words)) if i % 2 else make_word(rng) for i in range(queries)]
+
+    print(f"{len(words):,} candidates, {len(lookups):,} queries, within {max_distance} edits")
+
+    index = timed("FuzzyIndex build", FuzzyIndex, words)
+    indexed = timed("FuzzyIndex.best", lambda: [index.best(query, max_distance) for query in lookups])
+    timed("FuzzyIndex.top_k(3)", lambda: [index.top_k(query, 3, max_distance) for query in lookups])
+    timed("FuzzyIndex.search", lambda: [index.search(query, max_distance) for query in lookups])
+
+    scanned = timed("get_best_difference", lambda: [get_best_difference(words, query) for query in lookups])
+
+    # get_best_difference always allows 5 edits and ties can go either way, so only the distances are compared.
+    def distance(query, word):
+        return Levenshtein.distance(query, word) if word is not None else None
+
+    agreed = 0
+    for query, a, b in zip(lookups, indexed, scanned):
+        expected = distance(query, b)
+        if expected is not None and expected > max_distance:
+            expected = None
+        agreed += distance(query, a) == expected
+
+    matched = sum(a is not None for a in indexed)
+    print(f"  {matched:,} queries matched, {agreed:,} of {len(lookups):,} agreed with the linear scan")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time FuzzyIndex against get_best_difference.")
+    parser.add_argument("--candidates", type=int, default=10_000)
+    parser.add_argument("--queries", type=int, default=1_000)
+    parser.add_argument("--max-distance", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    main(args.candidates, args.queries, args.max_distance, args.seed)
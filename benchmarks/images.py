@@ -0,0 +1,115 @@
+"""
+Times 50 image requests at once run on the default thread pool, like the image commands used to, against the ImagePool.
+Copyright (C) 2021 kal-byte
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Usage: python benchmarks/images.py [--requests 50] [--rounds 2] [--workers N]
+"""
+
+import argparse
+import asyncio
+import io
+import pathlib
+import random
+import statistics
+import sys
+import time
+import types
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from PIL import Image, ImageFilter  # noqa: E402
+from utils.images import ImagePool  # noqa: E402
+from utils.metrics import MetricsRegistry  # noqa: E402
+
+
+def manipulate(data: bytes) -> bytes:
+    """About what an image command does, decode an avatar sized png, filter it and encode it again."""
+
+    with Image.open(io.BytesIO(data)) as image:
+        image = image.convert("RGB").resize((1024, 1024)).filter(ImageFilter.GaussianBlur(4))
+        buffer = io.BytesIO()
+        image.save(buffer, "png")
+
+    return buffer.getvalue()
+
+
+def make_image(rng: random.Random) -> bytes:
+    image = Image.frombytes("RGB", (512, 512), rng.randbytes(512 * 512 * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, "png")
+    return buffer.getvalue()
+
+
+async def measure(name: str, run, images: list, rounds: int):
+    """Sends every image at once `rounds` times, the loop's lag is sampled the whole time."""
+
+    lags = []
+    stop = asyncio.Event()
+
+    async def sample_lag():
+        while not stop.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lags.append(time.perf_counter() - start - 0.01)
+
+    async def timed(data):
+        start = time.perf_counter()
+        await run(manipulate, data)
+        return time.perf_counter() - start
+
+    sampler = asyncio.ensure_future(sample_lag())
+    latencies = []
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        latencies.extend(await asyncio.gather(*(timed(data) for data in images)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await sampler
+
+    p95 = statistics.quantiles(latencies, n=20)[-1]
+    print(f"  {name:<14} {len(latencies) / elapsed:>7,.1f} jobs/s | p50 {statistics.median(latencies) * 1000:>8,.1f}ms "
+          f"| p95 {p95 * 1000:>8,.1f}ms | loop lag max {max(lags) * 1000:>7,.1f}ms")
+
+
+async def main(requests: int, rounds: int, workers: int, seed: int):
+    rng = random.Random(seed)
+    images = [make_image(rng) for _ in range(requests)]
+
+    pool = ImagePool(types.SimpleNamespace(metrics=MetricsRegistry()), workers=workers)
+    pool.start()
+    print(f"{requests} requests at once, {rounds} rounds, {pool.size} workers")
+
+    try:
+        # The workers are started and have imported everything before they're timed.
+        await asyncio.gather(*(pool.run(manipulate, images[0]) for _ in range(pool.size)))
+
+        await measure("to_thread", asyncio.to_thread, images, rounds)
+        await measure("ImagePool", pool.run, images, rounds)
+    finally:
+        await pool.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time image jobs on threads against the worker processes.")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=2)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.requests, args.rounds, args.workers, args.seed))
@@ -0,0 +1,110 @@
+"""
+Times the cookie leaderboard against a single sorted list with synthetic users.
+Copyright (C) 2021 kal-byte
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Usage: python benchmarks/leaderboard.py [--users 1000000] [--operations 100000]
+"""
+
+import argparse
+import bisect
+import pathlib
+import random
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from utils.leaderboard import Leaderboard  # noqa: E402
+
+
+class SortedList:
+    """What the leaderboard replaced, every (-score, user id) in one list."""
+
+    def __init__(self):
+        self.scores = {}
+        self.keys = []
+
+    def load(self, entries):
+        self.scores = dict(entries)
+        self.keys = sorted((-score, user_id) for user_id, score in self.scores.items())
+
+    def increment(self, user_id, amount=1):
+        old = self.scores.get(user_id)
+        if old is not None:
+            del self.keys[bisect.bisect_left(self.keys, (-old, user_id))]
+
+        score = self.scores[user_id] = (old or 0) + amount
+        bisect.insort(self.keys, (-score, user_id))
+
+    def rank(self, user_id):
+        return bisect.bisect_left(self.keys, (-self.scores[user_id], user_id)) + 1
+
+    def page(self, offset, limit):
+        return [(user_id, -score) for score, user_id in self.keys[offset:offset + limit]]
+
+
+def timed(name: str, func, *args):
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+    print(f"  {name:<12} {elapsed * 1000:>10,.1f}ms")
+
+
+def run(board, entries, user_ids, offsets, per_page):
+    def increments():
+        for user_id in user_ids:
+            board.increment(user_id)
+
+    def ranks():
+        for user_id in user_ids:
+            board.rank(user_id)
+
+    def pages():
+        for offset in offsets:
+            board.page(offset, per_page)
+
+    timed("load", board.load, entries)
+    timed("increment", increments)
+    timed("rank", ranks)
+    timed("page", pages)
+
+
+def main(users: int, operations: int, per_page: int, seed: int):
+    rng = random.Random(seed)
+
+    # Most people click a handful of times, a few click a lot.
+    entries = [(user_id, int(rng.paretovariate(1.2))) for user_id in range(users)]
+    user_ids = [rng.randrange(users) for _ in range(operations)]
+    offsets = [rng.randrange(users) for _ in range(operations)]
+
+    print(f"{users:,} users, {operations:,} of each operation")
+
+    print("Leaderboard")
+    run(Leaderboard(), entries, user_ids, offsets, per_page)
+
+    print("Sorted list")
+    run(SortedList(), entries, user_ids, offsets, per_page)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the cookie leaderboard with synthetic users.")
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--operations", type=int, default=100_000)
+    parser.add_argument("--per-page", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    main(args.users, args.operations, args.per_page, args.seed)
@@ -0,0 +1,130 @@
+"""
+Times owoifying large embeds with the single pass engine against the regex pass per pattern it replaced.
+Copyright (C) 2021 kal-byte
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Usage: python benchmarks/owoify.py [--embeds 200]
+"""
+
+import argparse
+import pathlib
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+import discord  # noqa: E402
+from utils import utils  # noqa: E402
+
+WORDS = ("the there this thing error rust row roller early happy lovely really hello world member role "
+         "channel server warn mute kick ban reason moderator everyone").split()
+
+
+def _maintain_case_replace(sub: str, repl: str, text: str):
+    def _repl(match: re.Match):
+        group = match.group()
+
+        for cond, method in utils.METHODS.items():
+            if cond(group):
+                return method(repl)
+        return repl
+    return re.sub(sub, _repl, text, flags=re.I)
+
+
+def old_owoify_text(text: str):
+    """owoify_text as it was, a regex pass for every pattern."""
+
+    for sub, repl in utils.OWO_REPL.items():
+        text = _maintain_case_replace(sub, repl, text)
+
+    return text + " " + random.choice(("owo", "uwu"))
+
+
+def old_owoify_embed(embed: discord.Embed):
+    embed.title = old_owoify_text(embed.title) if embed.title else None
+    embed.description = (old_owoify_text(embed.description)
+                         if embed.description else None)
+    embed.set_footer(text=old_owoify_text(embed.footer.text),
+                     icon_url=embed.footer.icon_url) if embed.footer else None
+    embed.set_author(name=old_owoify_text(embed.author.name),
+                     url=embed.author.url,
+                     icon_url=embed.author.icon_url) if embed.author else None
+    for i, field in enumerate(embed.fields):
+        embed.set_field_at(
+            i,
+            name=old_owoify_text(field.name),
+            value=old_owoify_text(field.value),
+            inline=field.inline
+        )
+    return embed
+
+
+def sentence(rng: random.Random, length: int) -> str:
+    words = []
+    while sum(map(len, words)) + len(words) < length:
+        word = rng.choice(WORDS)
+        words.append(word.title() if rng.random() < 0.1 else word)
+
+    return " ".join(words)[:length]
+
+
+def make_embed(rng: random.Random) -> discord.Embed:
+    """About as big as Discord lets an embed get, with the same footer and author the bot puts on everything."""
+
+    embed = discord.Embed(title=sentence(rng, 200), description=sentence(rng, 4000))
+    embed.set_footer(text="Requested by someone#0001", icon_url="https://cdn.discordapp.com/embed/avatars/0.png")
+    embed.set_author(name="Travis Bott", icon_url="https://cdn.discordapp.com/embed/avatars/1.png")
+
+    for _ in range(25):
+        embed.add_field(name=sentence(rng, 40), value=sentence(rng, 200), inline=False)
+
+    return embed
+
+
+def timed(name: str, func, embeds: list):
+    start = time.perf_counter()
+    for embed in embeds:
+        func(embed.copy())
+    elapsed = time.perf_counter() - start
+
+    print(f"  {name:<24} {elapsed * 1000:>10,.1f}ms ({elapsed / len(embeds) * 1000:.2f}ms an embed)")
+
+
+def main(count: int, seed: int):
+    rng = random.Random(seed)
+    embeds = [make_embed(rng) for _ in range(count)]
+
+    print(f"{count:,} embeds of about {len(embeds[0]):,} characters")
+
+    timed("regex per pattern", old_owoify_embed, embeds)
+
+    utils._owoify.cache_clear()
+    timed("single pass", utils.owoify_embed, embeds)
+
+    # The cache only holds 1024 strings, which is every string of the last few dozen embeds.
+    repeated = embeds[:10] * (count // 10)
+    utils._owoify.cache_clear()
+    timed("single pass, 10 repeated", utils.owoify_embed, repeated)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time owoifying large embeds.")
+    parser.add_argument("--embeds", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    main(args.embeds, args.seed)
@@ -0,0 +1,142 @@
+"""
+Times how the bot turns away messages that aren't commands, before and after the prefixes were precomputed.
+Copyright (C) 2021 kal-byte
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Usage: python benchmarks/prefix.py [--messages 200000] [--guilds 1000]
+"""
+
+import argparse
+import asyncio
+import pathlib
+import random
+import re
+import sys
+import time
+import types
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from discord.ext import commands  # noqa: E402
+from discord.ext.commands.view import StringView  # noqa: E402
+from utils.config import GuildSettings  # noqa: E402
+from utils.subclasses import MyBot  # noqa: E402
+
+BOT_ID = 706530005169209386
+WORDS = "the a lol yeah no i you it that what is so ok gg wait why how".split()
+
+
+async def old_get_prefix(bot, message):
+    """get_prefix as it was, a new list for every message."""
+
+    base = [f"<@{bot.user.id}> ", f"<@!{bot.user.id}> "]
+
+    if message.guild is None:
+        base.append("tb!")
+        return base
+
+    try:
+        prefix = bot.old_config[message.guild.id]["guild_prefix"]
+    except KeyError:
+        prefix = "tb!"
+
+    base.append(prefix)
+    return base
+
+
+async def old_filter(bot, message) -> bool:
+    """What on_message and process_commands did before finding out a message isn't a command."""
+
+    if re.fullmatch(f"<@(!)?{bot.user.id}>", message.content):
+        return True
+
+    # get_context always made a context before looking at the prefix.
+    commands.Context(prefix=None, view=StringView(message.content), bot=bot, message=message)
+    prefix = await old_get_prefix(bot, message)
+    return message.content.startswith(tuple(prefix))
+
+
+def new_filter(bot, message) -> bool:
+    content = message.content
+
+    if content in bot._bare_mentions:
+        return True
+
+    return content.startswith(MyBot.get_prefixes(bot, message.guild))
+
+
+def make_messages(rng: random.Random, count: int, guilds: list) -> list:
+    """Mostly chatter, a few commands and the odd mention of the bot."""
+
+    messages = []
+    for _ in range(count):
+        guild = rng.choice(guilds)
+        roll = rng.random()
+
+        if roll < 0.03:
+            content = f"tb!{rng.choice(('help', 'ping', 'cc', 'tag info'))}"
+        elif roll < 0.04:
+            content = f"<@!{BOT_ID}>"
+        else:
+            content = " ".join(rng.choices(WORDS, k=rng.randint(1, 20)))
+
+        messages.append(types.SimpleNamespace(content=content, guild=guild, _state=None))
+
+    return messages
+
+
+def make_bot(guilds: list):
+    return types.SimpleNamespace(
+        user=types.SimpleNamespace(id=BOT_ID),
+        # The config was a dict of dicts, now it hands out GuildSettings.
+        old_config={guild.id: {"guild_prefix": "tb!"} for guild in guilds},
+        config={guild.id: GuildSettings(guild.id) for guild in guilds},
+        _prefixes={},
+        _mention_prefixes=(f"<@{BOT_ID}> ", f"<@!{BOT_ID}> "),
+        _bare_mentions=frozenset((f"<@{BOT_ID}>", f"<@!{BOT_ID}>")),
+    )
+
+
+async def main(count: int, guild_count: int, seed: int):
+    rng = random.Random(seed)
+    guilds = [types.SimpleNamespace(id=guild_id) for guild_id in range(guild_count)]
+    messages = make_messages(rng, count, guilds)
+    bot = make_bot(guilds)
+
+    print(f"{count:,} messages over {guild_count:,} guilds")
+
+    start = time.perf_counter()
+    old = [await old_filter(bot, message) for message in messages]
+    old_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    new = [new_filter(bot, message) for message in messages]
+    new_elapsed = time.perf_counter() - start
+
+    assert old == new, "The two paths disagreed on which messages are commands."
+
+    print(f"  per message get_prefix {old_elapsed * 1000:>10,.1f}ms ({old_elapsed / count * 1e6:.2f}us a message)")
+    print(f"  cached prefix tuple    {new_elapsed * 1000:>10,.1f}ms ({new_elapsed / count * 1e6:.2f}us a message)")
+    print(f"  {sum(new):,} messages went on to be processed as commands")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time turning away messages that aren't commands.")
+    parser.add_argument("--messages", type=int, default=200_000)
+    parser.add_argument("--guilds", type=int, default=1_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.messages, args.guilds, args.seed))
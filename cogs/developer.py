@@ -17,7 +17,9 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
 import ast
+import asyncio
 import collections
+import datetime
 import glob
 import io
 import logging
@@ -67,18 +69,40 @@ class CommandConverter(Converter):
         return ctx.bot.get_command(argument)
 
 
+def code_page(menu, source, lines: typing.Iterable[str]) -> discord.Embed:
+    """An embed with the lines in a code block and the page number in the footer."""
+
+    embed = menu.ctx.bot.embed(menu.ctx)
+    embed.description = "```py\n" + "\n".join(lines) + "```"
+    embed.set_footer(
+        text=f"Page {menu.current_page + 1}/{source.get_max_pages()}")
+    return embed
+
+
 class SQLListPageSource(menus.ListPageSource):
     def __init__(self, data, *, per_page=10):
         super().__init__(data, per_page=per_page)
 
     async def format_page(self, menu, page):
-        embed = menu.ctx.bot.embed(menu.ctx)
-        embed.description = (f"```py\n" +
-                             "\n".join(page) +
-                             "```")
-        embed.set_footer(
-            text=f"Page {menu.current_page + 1}/{self.get_max_pages()}")
-        return embed
+        return code_page(menu, self, page)
+
+
+class SQLResultPageSource(utils.AsyncPageSource):
+    """The results of a statement that has already ran, only the rows being shown get formatted."""
+
+    def __init__(self, results: list, *, per_page=10):
+        super().__init__(per_page=per_page, prefetch=False)
+        self.results = results
+
+    async def fetch_count(self):
+        return len(self.results)
+
+    async def fetch_page(self, page_number: int):
+        offset = self.offset(page_number)
+        return self.results[offset:offset + self.per_page]
+
+    async def render(self, menu, page):
+        return code_page(menu, self, (repr(result) for result in page))
 
 
 class Developer(Cog, command_attrs=dict(hidden=True)):
@@ -88,37 +112,58 @@ class Developer(Cog, command_attrs=dict(hidden=True)):
         self.logger = utils.create_logger(
             self.__class__.__name__, logging.INFO)
 
-        @bot.ipc.route()
+        # Server.route() doesn't give the function back, so they're kept here to be called directly.
+        self.ipc_routes = {}
+
+        def route(func):
+            bot.ipc.route()(func)
+            self.ipc_routes[func.__name__] = func
+            return func
+
+        @route
+        async def get_cluster_stats(data):
+            return {
+                "guilds": len(bot.guilds),
+                "members": sum(g.member_count for g in bot.guilds),
+            }
+
+        @route
+        async def is_ready(data):
+            return bot.prepped.is_set()
+
+        @route
         async def get_stats(data):
+            # The website only talks to the main cluster, it asks the rest for their numbers.
+            stats = [await self.ipc_routes["get_cluster_stats"](data)]
+            if bot.cluster.is_main:
+                stats += await bot.cluster.request_peers("get_cluster_stats", bot.settings["misc"]["secret_key"])
+
             return [
-                f"{len(bot.guilds):,}",
-                f"{sum(g.member_count for g in bot.guilds):,}",
+                f"{sum(s['guilds'] for s in stats):,}",
+                f"{sum(s['members'] for s in stats):,}",
                 f"{sum(1 for c in bot.walk_commands()):,}"
             ]
 
-        @bot.ipc.route()
+        @route
         async def get_bot_id(data):
             user = await bot.fetch_user(data.bot_id)
             if not user.bot:
                 return "706530005169209386"
             return user.id
 
-        @bot.ipc.route()
-        async def get_bot_commands(data):
-            cmd_list = list()
-
-            for command in self.bot.commands:
-                if not command.help or not command.cog or not hasattr(command.cog, "show_name"):
-                    continue
+        @route
+        async def get_metrics(data):
+            p50, p95, p99 = bot.lag_monitor.percentiles(50, 95, 99)
 
-                sig = f"tb!{command.qualified_name} {command.signature}"
-                ret = {
-                    "command": sig,
-                    "help": command.short_doc,
-                }
-                cmd_list.append(ret)
+            return {
+                "commands": bot.command_metrics.summary(),
+                "loop_lag": {"p50": p50, "p95": p95, "p99": p99},
+                "prometheus": bot.metrics.render(),
+            }
 
-            return cmd_list
+        @route
+        async def get_bot_commands(data):
+            return self.bot.help_catalogue.dashboard()
 
     async def cog_check(self, ctx: utils.CustomContext):
         return await self.bot.is_owner(ctx.author)
@@ -147,8 +192,7 @@ class Developer(Cog, command_attrs=dict(hidden=True)):
         if user.id in self.bot.blacklist.keys():
             return await ctx.send("That user is already blacklisted.")
 
-        await self.bot.pool.execute("INSERT INTO blacklist VALUES($1, $2)",
-                                    user.id, reason)
+        await self.bot.queries.blacklist.add(user.id, reason)
         self.bot.blacklist[user.id] = reason
 
         await ctx.send(
@@ -222,6 +266,7 @@ class Developer(Cog, command_attrs=dict(hidden=True)):
         server_count = sum(1 for g in self.bot.guilds)
         user_count = sum(g.member_count for g in self.bot.guilds)
         command_count = sum(1 for cmd in self.bot.walk_commands())
+        command_usage = await self.bot.queries.command_usage.total() + self.bot.counters.pending("command_usage")
         ping = round(self.bot.latency * 1000)
         uptime = utils.format_time(self.bot.start_time)
 
@@ -229,7 +274,7 @@ class Developer(Cog, command_attrs=dict(hidden=True)):
             ["Server Count", server_count, True],
             ["User Count", user_count, True],
             ["Command Count", command_count, True],
-            ["Command Usage (last restart)", self.bot.cmd_usage, True],
+            ["Command Usage", f"{command_usage:,}", True],
             ["Ping", ping, True],
             ["Uptime", uptime["precise"], True],
             ["Code Count", f"```\n{code_count}```", False]
@@ -239,13 +284,86 @@ class Developer(Cog, command_attrs=dict(hidden=True)):
             [embed.add_field(name=n, value=v, inline=i) for n, v, i in fields]
             await ctx.send(embed=embed)
 
+    @dev.command(name="metrics")
+    async def dev_metrics(self, ctx: utils.CustomContext, *, command: str = None):
+        """Shows how long commands take since the last restart, in milliseconds."""
+
+        summary = self.bot.command_metrics.summary()
+
+        if command is not None:
+            found = self.bot.get_command(command)
+            if found is None:
+                return await ctx.send("I couldn't find that command.")
+
+            entry = discord.utils.find(lambda e: e["command"] == found.qualified_name, summary)
+            if entry is None:
+                return await ctx.send("That command hasn't been used since the last restart.")
+
+            data = [f"{entry['command']}: {entry['uses']:,} uses, {entry.get('errors', 0):,} errors",
+                    f"{'phase':<11}{'mean':>10}{'p50':>10}{'p95':>10}"]
+            for phase in utils.CommandMetrics.PHASES:
+                stats = entry["phases"].get(phase)
+                if stats is not None:
+                    data.append(f"{phase:<11}{stats['mean']:>10,.2f}{stats['p50']:>10,.2f}{stats['p95']:>10,.2f}")
+        else:
+            p50, p95, p99 = (lag * 1000 for lag in self.bot.lag_monitor.percentiles(50, 95, 99))
+            data = [f"loop lag: p50 {p50:,.2f} | p95 {p95:,.2f} | p99 {p99:,.2f}",
+                    f"{'command':<20}{'uses':>7}{'errors':>7}{'p50':>10}{'p95':>10}"]
+            for entry in summary:
+                total = entry["phases"]["total"]
+                data.append(f"{entry['command'][:19]:<20}{entry['uses']:>7,}{entry.get('errors', 0):>7,}"
+                            f"{total['p50']:>10,.2f}{total['p95']:>10,.2f}")
+
+        menu = utils.KalPages(SQLListPageSource(data, per_page=15))
+        await menu.start(ctx)
+
+    @dev.command(name="usage")
+    async def dev_usage(self, ctx: utils.CustomContext, window: TimeConverter = 86400.0):
+        """Shows command usage, error rates and p95 latency across every cluster, e.g. `{prefix}dev usage 7d`."""
+
+        # Records still in the buffer wouldn't show up otherwise.
+        await self.bot.usage_recorder.flush()
+
+        since = datetime.datetime.utcnow() - datetime.timedelta(seconds=window)
+        period = "hour" if window <= 172800 else "day"
+
+        by_command, timeline, errors = await asyncio.gather(
+            self.bot.queries.usage.commands(since),
+            self.bot.queries.usage.timeline(since, period),
+            self.bot.queries.usage.errors(since),
+        )
+
+        if not by_command:
+            return await ctx.send("No commands have been used in that window.")
+
+        total = sum(entry["uses"] for entry in timeline)
+        failed = sum(entry["errors"] for entry in timeline)
+        data = [f"{total:,} uses, {failed / total:.2%} errors since {since:%Y-%m-%d %H:%M} UTC",
+                f"{'command':<20}{'uses':>8}{'errors':>8}{'p95':>10}"]
+
+        for entry in by_command:
+            data.append(f"{entry['command'][:19]:<20}{entry['uses']:>8,}{entry['errors'] / entry['uses']:>8.1%}"
+                        f"{entry['p95'] * 1000:>10,.0f}")
+
+        data.append(f"{period:<20}{'uses':>8}{'errors':>8}{'p95':>10}")
+        for entry in timeline:
+            data.append(f"{entry['period']:%m-%d %H:%M}{'':<9}{entry['uses']:>8,}"
+                        f"{entry['errors'] / entry['uses']:>8.1%}{entry['p95'] * 1000:>10,.0f}")
+
+        if errors:
+            data.append("errors by type")
+            data.extend(f"    {entry['error']}: {entry['count']:,}" for entry in errors)
+
+        menu = utils.KalPages(SQLListPageSource(data, per_page=15))
+        await menu.start(ctx)
+
     @dev.command(name="leave")
     async def dev_leave(self, ctx: utils.CustomContext):
         """Forces the bot to leave the current server"""
 
         await ctx.guild.leave()
 
-    @dev.command(name="sql")
+    @dev.group(name="sql", invoke_without_command=True)
     async def dev_sql(self, ctx: utils.CustomContext, *, query: codeblock_converter):
         """Executes an SQL statement for the bot."""
 
@@ -258,16 +376,56 @@ class Developer(Cog, command_attrs=dict(hidden=True)):
             results = await strategy(query.format(author=ctx.author,
                                                   guild=ctx.guild))
 
-            data = []
-            if isinstance(results, list):
-                for result in results:
-                    data.append(repr(result))
-            else:
-                data.append(repr(results))
+            if not isinstance(results, list):
+                results = [results]
 
-            menu = utils.KalPages(SQLListPageSource(data))
+            menu = utils.KalPages(SQLResultPageSource(results))
             await menu.start(ctx)
 
+    @dev_sql.command(name="stats")
+    async def dev_sql_stats(self, ctx: utils.CustomContext, sort_by: str = "total"):
+        """Shows which statements take up the most database time, sort by total, calls, mean, max or rows."""
+
+        if sort_by not in ("total", "calls", "mean", "max", "rows"):
+            return await ctx.send("You can only sort by total, calls, mean, max or rows.")
+
+        pool = self.bot.pool.summary()
+        data = [
+            f"pool: {pool['in_use']}/{pool['size']} in use (max {pool['max_size']}), "
+            f"acquire p50 {pool['acquire_p50']:,.2f}ms p95 {pool['acquire_p95']:,.2f}ms",
+            f"{pool['queries']:,} queries, {pool['slow_queries']:,} slow",
+        ]
+
+        for stats in self.bot.pool.top_statements(key=sort_by):
+            data.append(f"{stats.total * 1000:,.0f}ms total | {stats.calls:,} calls | {stats.mean * 1000:,.2f}ms mean "
+                        f"| {stats.max * 1000:,.2f}ms max | {stats.rows:,} rows")
+            data.append(f"    {textwrap.shorten(stats.query, 110)}")
+
+        menu = utils.KalPages(SQLListPageSource(data, per_page=12))
+        await menu.start(ctx)
+
+    @dev.command(name="migrate")
+    async def dev_migrate(self, ctx: utils.CustomContext, apply: bool = False):
+        """Lists the database migrations, pass `yes` to apply the pending ones."""
+
+        if apply:
+            async with ctx.timeit:
+                ran = await self.bot.migrations.run()
+
+            return await ctx.send(f"Applied {len(ran)} migration(s) in {(ctx.timeit.end - ctx.timeit.start) * 1000:,.2f}ms: "
+                                  + (", ".join(map(str, ran)) or "nothing to do"))
+
+        applied = await self.bot.migrations.applied()
+        data = []
+
+        for migration in self.bot.migrations.discover():
+            applied_at = applied.get(migration.version)
+            status = f"applied {applied_at:%Y-%m-%d %H:%M}" if applied_at else "pending"
+            data.append(f"{str(migration):<40} {status}")
+
+        menu = utils.KalPages(SQLListPageSource(data, per_page=15))
+        await menu.start(ctx)
+
     @dev.command(name="restart")
     async def dev_restart(self, ctx: utils.CustomContext, what: str):
         await ctx.send(f"⚠ Restarting {what.lower()} now...")
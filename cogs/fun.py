@@ -119,6 +119,29 @@ class RockPaperScissors(menus.Menu):
         return await self._handle_winner(winner)
 
 
+class LeaderboardPageSource(utils.AsyncPageSource):
+    def __init__(self, bot, *, per_page=10):
+        # It's all in memory already, nothing to prefetch.
+        super().__init__(per_page=per_page, prefetch=False)
+        self.bot = bot
+
+    async def fetch_count(self):
+        return len(self.bot.cookie_leaderboard)
+
+    async def fetch_page(self, page_number: int):
+        return self.bot.cookie_leaderboard.page(self.offset(page_number), self.per_page)
+
+    async def render(self, menu: menus.Menu, page: list):
+        offset = self.offset(menu.current_page)
+        embed = menu.ctx.bot.embed(menu.ctx)
+        embed.description = "\n".join(
+            f"`{index + 1}`. {self.bot.get_user(user_id)} - {cookies} cookies"
+            for index, (user_id, cookies) in enumerate(page, offset)
+        )
+
+        return embed
+
+
 class Fun(commands.Cog, name="fun"):
     """Fun Commands"""
 
@@ -170,14 +193,8 @@ class Fun(commands.Cog, name="fun"):
     async def handle_cookies(self, user: discord.Member):
         """Handles added cookies to user"""
 
-        sql = (
-            "INSERT INTO cookies VALUES($1, $2) "
-            "ON CONFLICT (user_id) "
-            "DO UPDATE SET cookies = cookies.cookies + 1 "
-            "WHERE cookies.user_id = $1;"
-        )
-        values = (user.id, 1)
-        await self.bot.pool.execute(sql, *values)
+        self.bot.counters.add("cookies", user.id)
+        self.bot.cookie_leaderboard.increment(user.id)
 
     @commands.group(name="bottom", invoke_without_command=True)
     async def bottom_group(self, ctx: utils.CustomContext):
@@ -213,8 +230,8 @@ class Fun(commands.Cog, name="fun"):
     async def owo_text(self, ctx: utils.CustomContext, *, text: commands.clean_content):
         """Owoifies a given piece of text."""
 
-        owoified = utils.owoify_text(
-            text) if not self.bot.config[ctx.guild.id]["owoify"] else text
+        owoify_enabled = ctx.guild and self.bot.config.get(ctx.guild.id).owoify
+        owoified = utils.owoify_text(text) if not owoify_enabled else text
 
         await ctx.send(
             owoified,
@@ -254,7 +271,7 @@ class Fun(commands.Cog, name="fun"):
 
                     try:
                         text = utils.owoify_text(
-                            response.text) if self.bot.config[ctx.guild.id]["owoify"] else response.text
+                            response.text) if self.bot.config.get(ctx.guild.id).owoify else response.text
                     except (KeyError, AttributeError):
                         text = response.text
 
@@ -379,17 +396,31 @@ class Fun(commands.Cog, name="fun"):
     async def cookieclick_leaderboard(self, ctx: utils.CustomContext):
         """Gives the leaderboard of all cookie clickers."""
 
-        fields = await self.bot.pool.fetch("SELECT * FROM cookies order by cookies DESC LIMIT 100")
+        source = LeaderboardPageSource(self.bot)
+        pages = menus.MenuPages(source=source, clear_reactions_after=True)
+        await pages.start(ctx)
+
+    @cookieclick.command(name="rank")
+    async def cookieclick_rank(self, ctx: utils.CustomContext, *, user: discord.User = None):
+        """Shows where you, or someone else, are on the cookie leaderboard."""
 
-        desc = []
+        user = user or ctx.author
+        around = self.bot.cookie_leaderboard.around(user.id)
 
-        for field in fields:
-            user = self.bot.get_user(field["user_id"])
-            desc.append(f"{user} - {field['cookies']} cookies")
+        if not around:
+            return await ctx.send(f"`{user}` hasn't clicked any cookies yet.")
 
-        source = utils.GeneralPageSource(desc, per_page=10)
-        pages = menus.MenuPages(source=source, clear_reactions_after=True)
-        await pages.start(ctx)
+        embed = self.bot.embed(ctx)
+        embed.title = f"{user}'s cookie rank"
+        lines = []
+        for rank, user_id, cookies in around:
+            line = f"`{rank}`. {self.bot.get_user(user_id) or user_id} - {cookies} cookies"
+            lines.append(f"**{line}**" if user_id == user.id else line)
+
+        embed.description = "\n".join(lines)
+        embed.set_footer(text=f"Out of {len(self.bot.cookie_leaderboard):,} cookie clickers")
+
+        await ctx.send(embed=embed)
 
     @commands.command(aliases=["fban"])
     @commands.cooldown(1, standard_cooldown, commands.BucketType.member)
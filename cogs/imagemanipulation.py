@@ -26,36 +26,31 @@ from typing import Optional, Union
 from discord.ext import commands
 from io import BytesIO
 from polaroid import Image as PoImage
-from PIL import Image as PImage, ImageFont, ImageDraw
+from PIL import ImageDraw
 from wand.image import Image as WImage
+from utils.templates import templates
 
 
 emoji_user = Optional[Union[discord.Member, discord.PartialEmoji]]
 
 class Manipulation:
+    """These run in the image worker processes, they take and give back bytes so they're cheap to hand over."""
 
     @staticmethod
-    @utils.to_thread
     def solarize(b: bytes):
         image = PoImage(b)
         image.solarize()
-        save_bytes = image.save_bytes()
-        io_bytes = BytesIO(save_bytes)
 
-        return io_bytes
+        return image.save_bytes()
 
     @staticmethod
-    @utils.to_thread
     def brighten(b: bytes, amount: int):
         image = PoImage(b)
         image.brighten(amount)
-        save_bytes = image.save_bytes()
-        io_bytes = BytesIO(save_bytes)
 
-        return io_bytes
+        return image.save_bytes()
 
     @staticmethod
-    @utils.to_thread
     def facetime(image_one_bytes: bytes,
                  image_two_bytes: bytes):
         image_one = PoImage(image_one_bytes)
@@ -66,19 +61,15 @@ class Manipulation:
         if image_two.size != (256, 256):
             image_two.resize(256, 256, 5)
 
-        facetime_buttons = PoImage("./data/facetimebuttons.png")
-        facetime_buttons.resize(1024, 1024, 5)
-
         image_one.watermark(image_two, 15, 15)
-        image_one.watermark(facetime_buttons, 0, 390)
-        io_bytes = BytesIO(image_one.save_bytes())
+        image_one.watermark(templates.facetime_buttons, 0, 390)
 
-        return io_bytes
+        return image_one.save_bytes()
 
     @staticmethod
-    @utils.to_thread
-    def magik(image: BytesIO):
-        with WImage(file=image) as img:
+    @utils.uncached
+    def magik(image: bytes):
+        with WImage(blob=image) as img:
             img.liquid_rescale(width=int(img.width * 0.5),
                                height=int(img.height * 0.5),
                                delta_x=random.randint(1, 2),
@@ -92,41 +83,33 @@ class Manipulation:
             buffer = BytesIO()
             img.save(file=buffer)
 
-        buffer.seek(0)
-        return buffer
+        return buffer.getvalue()
 
     @staticmethod
-    @utils.to_thread
-    def chroma(image: BytesIO):
-        with WImage(file=image) as img:
+    def chroma(image: bytes):
+        with WImage(blob=image) as img:
             img.function("sinusoid", [1.5, -45, 0.2, 0.60])
             buffer = BytesIO()
             img.save(file=buffer)
 
-        buffer.seek(0)
-        return buffer
+        return buffer.getvalue()
 
     @staticmethod
-    @utils.to_thread
-    def swirl(image: BytesIO, degrees: int = 90):
-        with WImage(file=image) as img:
+    def swirl(image: bytes, degrees: int = 90):
+        with WImage(blob=image) as img:
             degrees = 360 if degrees > 360 else -360 if degrees < -360 else degrees
             img.swirl(degree=degrees)
             buffer = BytesIO()
             img.save(file=buffer)
 
-        buffer.seek(0)
-        return buffer
+        return buffer.getvalue()
 
     @staticmethod
-    @utils.to_thread
     def alwayshasbeen(txt: str):
-        PImage.MAX_IMAGE_PIXELS = (1200 * 1000)
-
-        with PImage.open("./data/ahb.png") as img:
+        with templates.image("ahb.png") as img:
             wrapped = textwrap.wrap(txt, 20)
 
-            font = ImageFont.truetype("./data/JetBrainsMono-Regular.ttf", 36)
+            font = templates.font(36)
             draw = ImageDraw.Draw(img)
 
             cur_height, pad = 300, 5
@@ -138,17 +121,13 @@ class Manipulation:
             buffer = BytesIO()
             img.save(buffer, "png")
 
-        buffer.seek(0)
-        return buffer
+        return buffer.getvalue()
 
     @staticmethod
-    @utils.to_thread
     def rainbowify(b: bytes):
         img = PoImage(b)
         img.apply_gradient()
-        save_bytes = img.save_bytes()
-        io_bytes = BytesIO(save_bytes)
-        return io_bytes
+        return img.save_bytes()
 
 
 class ImageManipulation(commands.Cog, name="imagemanipulation"):
@@ -158,40 +137,59 @@ class ImageManipulation(commands.Cog, name="imagemanipulation"):
         self.bot: utils.MyBot = bot
         self.show_name = "\N{EYE} Image Manipulation"
         self.logger = utils.create_logger(self.__class__.__name__, logging.INFO)
+        templates.load()
 
     async def cog_before_invoke(_, ctx: utils.CustomContext):
         await ctx.trigger_typing()
 
     @staticmethod
-    async def get_image(ctx: utils.CustomContext, target: emoji_user):
-        if target:
-            meth = target.url_as if isinstance(target, discord.PartialEmoji) else target.avatar_url_as
-            return await meth(format="png").read()
-        if ctx.message.attachments:
-            return await ctx.message.attachments[0].read()
-        return await ctx.author.avatar_url_as(format="png").read()
-
-    @staticmethod
-    async def get_image_url(ctx: utils.CustomContext, target: emoji_user):
+    def image_source(ctx: utils.CustomContext, target: emoji_user, *, proxy: bool = False) -> str:
         if target:
             meth = target.url_as if isinstance(target, discord.PartialEmoji) else target.avatar_url_as
             return str(meth(format="png"))
         if ctx.message.attachments:
-            return await ctx.message.attachments[0].proxy_url
+            attachment = ctx.message.attachments[0]
+            return attachment.proxy_url if proxy else attachment.url
         return str(ctx.author.avatar_url_as(format="png"))
 
-    async def do_dagpi(self, target: emoji_user, feature: asyncdagpi.ImageFeatures):
-        feature = getattr(asyncdagpi.ImageFeatures, feature)()
-        image = await self.bot.dagpi.image_process(feature, target)
-        return discord.File(image.image, f"travis_bott_{feature}.{image.format}")
+    async def get_image(self, ctx: utils.CustomContext, target: emoji_user):
+        return await self.bot.assets.fetch(self.image_source(ctx, target))
+
+    async def get_image_url(self, ctx: utils.CustomContext, target: emoji_user):
+        return self.image_source(ctx, target, proxy=True)
+
+    async def process(self, func, *args) -> bytes:
+        """Runs one of the `Manipulation` functions in the image workers, unless the output is cached.
+
+        Images going in are checked against the function's ingest limits first."""
+
+        async def make(func, *args):
+            args = [await self.bot.ingest.prepare(func.__name__, arg) if isinstance(arg, bytes) else arg
+                    for arg in args]
+            return await self.bot.images.run(func, *args)
+
+        return await self.bot.image_cache.get_or_make(func, *args, make=make)
+
+    async def do_dagpi(self, target: str, feature: str):
+        # Avatar and emoji URLs change with the image so the URL is as good as hashing the bytes.
+        key = self.bot.image_cache.key(f"dagpi.{feature}", target)
+        data = await self.bot.image_cache.get(key)
+
+        if data is None:
+            image = await self.bot.dagpi.image_process(getattr(asyncdagpi.ImageFeatures, feature)(), target)
+            data = image.image.getvalue()
+            await self.bot.image_cache.put(key, data)
+
+        extension = "gif" if data[:4] == b"GIF8" else "png"
+        return discord.File(BytesIO(data), f"travis_bott_{feature}.{extension}")
 
     @commands.command(aliases=["rainbowify"])
     async def rainbow(self, ctx: utils.CustomContext, *, target: emoji_user):
         """Applies a rainbow effect to a given emoji, attachment or member."""
         image = await self.get_image(ctx, target)
         async with ctx.timeit:
-            img = await Manipulation.rainbowify(image)
-            file = discord.File(img, "travis_bott_rainbow.png")
+            img = await self.process(Manipulation.rainbowify, image)
+            file = discord.File(BytesIO(img), "travis_bott_rainbow.png")
             with ctx.embed() as e:
                 e.set_image(url="attachment://travis_bott_rainbow.png")
                 await ctx.send(file=file, embed=e)
@@ -201,8 +199,8 @@ class ImageManipulation(commands.Cog, name="imagemanipulation"):
         """It always has been..."""
         text = text or "I'm dumb and didn't put any text..."
         async with ctx.timeit:
-            img = await Manipulation.alwayshasbeen(text)
-            file = discord.File(img, "travis_bott_ahb.png")
+            img = await self.process(Manipulation.alwayshasbeen, text)
+            file = discord.File(BytesIO(img), "travis_bott_ahb.png")
             with ctx.embed() as e:
                 e.set_image(url="attachment://travis_bott_ahb.png")
                 await ctx.send(file=file, embed=e)
@@ -212,8 +210,8 @@ class ImageManipulation(commands.Cog, name="imagemanipulation"):
         """Swirls a given attachment, emoji or member."""
         image = await self.get_image(ctx, target)
         async with ctx.timeit:
-            img = await Manipulation.swirl(BytesIO(image), amount or 90)
-            file = discord.File(img, "travis_bott_swirl.png")
+            img = await self.process(Manipulation.swirl, image, amount or 90)
+            file = discord.File(BytesIO(img), "travis_bott_swirl.png")
             with ctx.embed() as e:
                 e.set_image(url="attachment://travis_bott_swirl.png")
                 await ctx.send(file=file, embed=e)
@@ -223,8 +221,8 @@ class ImageManipulation(commands.Cog, name="imagemanipulation"):
         """Applies a chroma effect to a given emoji, attachment or member."""
         image = await self.get_image(ctx, target)
         async with ctx.timeit:
-            img = await Manipulation.chroma(BytesIO(image))
-            file = discord.File(img, "travis_bott_chroma.png")
+            img = await self.process(Manipulation.chroma, image)
+            file = discord.File(BytesIO(img), "travis_bott_chroma.png")
             with ctx.embed() as e:
                 e.set_image(url="attachment://travis_bott_chroma.png")
                 await ctx.send(file=file, embed=e)
@@ -232,11 +230,11 @@ class ImageManipulation(commands.Cog, name="imagemanipulation"):
     @commands.command(aliases=["ft"])
     async def facetime(self, ctx: utils.CustomContext, target: emoji_user):
         """Gives a neat facetime effect to a given emoji, attachment or member."""
-        image = await self.get_image(ctx, target)
+        image, thumbnail = await self.bot.assets.fetch_many(
+            self.image_source(ctx, target), str(ctx.author.avatar_url_as(format="png")))
         async with ctx.timeit:
-            thumbnail = await ctx.author.avatar_url_as(format="png").read()
-            img = await Manipulation.facetime(image, thumbnail)
-            file = discord.File(img, "travis_bott_ft.png")
+            img = await self.process(Manipulation.facetime, image, thumbnail)
+            file = discord.File(BytesIO(img), "travis_bott_ft.png")
             with ctx.embed() as e:
                 e.set_image(url="attachment://travis_bott_ft.png")
                 await ctx.send(file=file, embed=e)
@@ -246,8 +244,8 @@ class ImageManipulation(commands.Cog, name="imagemanipulation"):
         """Applies a solarize effect to a given emoji, attachment or member."""
         image = await self.get_image(ctx, target)
         async with ctx.timeit:
-            img = await Manipulation.solarize(image)
-            file = discord.File(img, "travis_bott_solarize.png")
+            img = await self.process(Manipulation.solarize, image)
+            file = discord.File(BytesIO(img), "travis_bott_solarize.png")
             with ctx.embed() as e:
                 e.set_image(url="attachment://travis_bott_solarize.png")
                 await ctx.send(file=file, embed=e)
@@ -258,8 +256,8 @@ class ImageManipulation(commands.Cog, name="imagemanipulation"):
         amount = 250 if amount > 250 else amount
         image = await self.get_image(ctx, target)
         async with ctx.timeit:
-            img = await Manipulation.brighten(image, amount or 50)
-            file = discord.File(img, "travis_bott_brighten.png")
+            img = await self.process(Manipulation.brighten, image, amount or 50)
+            file = discord.File(BytesIO(img), "travis_bott_brighten.png")
             with ctx.embed() as e:
                 e.set_image(url="attachment://travis_bott_brighten.png")
                 await ctx.send(file=file, embed=e)
@@ -100,11 +100,13 @@ class Management(commands.Cog, name="management"):
     async def _zip_all_guild_emojis(self, guild: discord.Guild):
         """Helper method to zip up all of the guilds emojis."""
 
+        # Not stored, a guild's worth of emojis would push every avatar out of the cache.
+        emojis = await self.bot.assets.fetch_many(*(str(emoji.url) for emoji in guild.emojis), store=False)
+
         buffer = io.BytesIO()
         with ZipFile(buffer, "w") as zip_file:
-            for emoji in guild.emojis:
+            for emoji, emoji_bytes in zip(guild.emojis, emojis):
                 png_or_gif = "gif" if emoji.animated else "png"
-                emoji_bytes = await emoji.url.read()
                 zip_file.writestr(f"{emoji.name}.{png_or_gif}", emoji_bytes)
 
         buffer.seek(0)
@@ -115,17 +117,15 @@ class Management(commands.Cog, name="management"):
     async def add_mute_new_channel(self, channel: discord.abc.GuildChannel):
         """Updated the new channels mute perms once created if the guild has a mute role set."""
 
-        try:
-            mute_role_id = self.bot.config[channel.guild.id]["mute_role_id"]
-        except KeyError:
+        mute_role_id = self.bot.config.get(channel.guild.id).mute_role_id
+
+        if mute_role_id is None:
             return
 
         role = channel.guild.get_role(mute_role_id)
 
         if role is None:
-            await self.bot.pool.execute("UPDATE guild_settings SET mute_role_id = NULL WHERE guild_id = $1",
-                                        channel.guild.id)
-            self.bot.config[channel.guild.id]["mute_role_id"] = None
+            self.bot.config.update(channel.guild.id, mute_role_id=None)
             return
 
         role_overwrites = channel.overwrites_for(role)
@@ -138,6 +138,18 @@ class Management(commands.Cog, name="management"):
                 reason="Disable mute role permissions to talk in this channel."
             )
 
+    @commands.Cog.listener()
+    async def on_giveaway_timer_complete(self, timer: utils.Timer):
+        self.bot.giveaway_roles.pop(timer.key, None)
+
+        channel = self.bot.get_channel(timer.data["channel_id"])
+
+        if channel is None:
+            return
+
+        message = discord.PartialMessage(channel=channel, id=timer.key)
+        self.bot.dispatch("giveaway_end", message)
+
     @commands.Cog.listener()
     async def on_giveaway_end(self, message: discord.PartialMessage):
         message: discord.Message = await message.fetch()
@@ -197,9 +209,8 @@ class Management(commands.Cog, name="management"):
         role = guild.get_role(role_id)
 
         if role is None:
-            del self.bot.verification_config[payload.message_id]
-            await self.bot.pool.execute("DELETE FROM guild_verification WHERE message_id = $1",
-                                        payload.message_id)
+            self.bot.verification_config.pop(payload.message_id, None)
+            await self.bot.queries.verification.delete_by_message(payload.message_id)
 
         await payload.member.add_roles(role, reason="Reaction Verification")
 
@@ -279,19 +290,13 @@ class Management(commands.Cog, name="management"):
         message = await channel.send(embed=embed)
         await message.add_reaction("\N{PARTY POPPER}")
 
-        if role_needed == "None":
-            query = "INSERT INTO giveaways VALUES($1, $2, $3)"
-            values = message.id, channel.id, time_end.replace(tzinfo=None)
-        else:
-            query = "INSERT INTO giveaways VALUES($1, $2, $3, $4)"
-            values = message.id, channel.id, time_end.replace(tzinfo=None), role_needed.id
-
-        await self.bot.pool.execute(query, *values)
+        role_id = role_needed.id if role_needed != "None" else None
+        await self.bot.queries.giveaways.create(message.id, channel.id, time_end.replace(tzinfo=None), role_id)
 
         if role_needed != "None":
             self.bot.giveaway_roles[message.id] = role_needed.id
 
-        await utils.set_giveaway(self.bot, time_end, channel.id, message.id)
+        self.bot.timers.create("giveaway", message.id, time_end.timestamp(), channel_id=channel.id)
 
     # @commands.group(invoke_without_command=True)
     # @commands.guild_only()
@@ -311,16 +316,18 @@ class Management(commands.Cog, name="management"):
         embed = self.bot.embed(ctx)
 
         mapped_names = {
-            "guild_prefix": "Current Prefix",
+            "prefix": "Current Prefix",
             "mute_role_id": "Mute Role ID",
             "log_channel": "Logging Channel ID",
             "owoify": "Owoified Texts",
+            "suggest_commands": "Command Suggestions",
         }
 
-        for k, v in self.bot.config[ctx.guild.id].items():
-            name = mapped_names.get(k)
+        settings = self.bot.config.get(ctx.guild.id)
+
+        for k, name in mapped_names.items():
             embed.add_field(name=name,
-                            value=f"`{v}`",
+                            value=f"`{getattr(settings, k)}`",
                             inline=False)
 
         await ctx.send(embed=embed)
@@ -359,11 +366,7 @@ class Management(commands.Cog, name="management"):
 
         await ctx.thumbsup()
 
-        sql = "UPDATE guild_settings SET log_channel = $1 WHERE guild_id = $2;"
-        values = (channel.id, ctx.guild.id)
-
-        await self.bot.pool.execute(sql, *values)
-        self.bot.config[ctx.guild.id]["log_channel"] = channel.id
+        self.bot.config.update(ctx.guild.id, log_channel=channel.id)
 
     @logging.command(name="unset")
     @commands.guild_only()
@@ -371,14 +374,13 @@ class Management(commands.Cog, name="management"):
     async def logging_unset(self, ctx: utils.CustomContext):
         """Sets up an interactive message to unset logging."""
 
-        log_channel = self.bot.config.get(ctx.guild.id).get("log_channel", None)
+        log_channel = self.bot.config.get(ctx.guild.id).log_channel
 
-        if log_channel:
+        if not log_channel:
             return await ctx.send("You do not have logging set up, therefore can't remove it.")
 
-        sql = "UPDATE guild_settings SET log_channel = NULL WHERE guild_id = $1;"
-        await self.bot.pool.execute(sql, ctx.guild.id)
-        self.bot.confg[ctx.guild.id]["log_channel"] = None
+        self.bot.config.update(ctx.guild.id, log_channel=None)
+        await ctx.thumbsup()
 
     @commands.command()
     @commands.guild_only()
@@ -388,16 +390,16 @@ class Management(commands.Cog, name="management"):
         """Sets the mute role for the server."""
 
         if role is None:
-            try:
-                mute_role_id = self.bot.config[ctx.guild.id]["mute_role_id"]
-            except KeyError:
+            mute_role_id = self.bot.config.get(ctx.guild.id).mute_role_id
+            role = ctx.guild.get_role(mute_role_id) if mute_role_id else None
+
+            if role is None:
                 fmt = (
                     "There is no mute role set for this server... set one using "
                     f"`{ctx.prefix}muterole [Role Name Here]`"
                 )
                 return await ctx.send(fmt)
 
-            role = ctx.guild.get_role(mute_role_id)
             fmt = f"Your current mute role is: {role} (ID: {role.id})"
             return await ctx.send(fmt)
 
@@ -417,9 +419,7 @@ class Management(commands.Cog, name="management"):
         else:
             content = message.content.lower()
             if content == "yes":
-                await self.bot.pool.execute("UPDATE guild_settings SET mute_role_id = $1 WHERE guild_id = $2",
-                                            role.id, ctx.guild.id)
-                self.bot.config[ctx.guild.id]["mute_role_id"] = role.id
+                self.bot.config.update(ctx.guild.id, mute_role_id=role.id)
 
                 await ctx.send("Alright, this may take a while.")
 
@@ -445,21 +445,26 @@ class Management(commands.Cog, name="management"):
     async def owoify(self, ctx: utils.CustomContext, enabled: bool):
         """Enables owoified text for the server."""
 
-        self.bot.config[ctx.guild.id]["owoify"] = enabled
-        await self.bot.pool.execute("UPDATE guild_settings SET owoify = $1 WHERE guild_id = $2",
-                                    enabled, ctx.guild.id)
+        self.bot.config.update(ctx.guild.id, owoify=enabled)
 
         await ctx.send("Successfully updated your owoify settings")
 
+    @commands.command()
+    @commands.guild_only()
+    @commands.has_permissions(manage_guild=True)
+    async def suggestions(self, ctx: utils.CustomContext, enabled: bool):
+        """Enables suggesting a similar command when one isn't found in the server."""
+
+        self.bot.config.update(ctx.guild.id, suggest_commands=enabled)
+
+        await ctx.send("Successfully updated your command suggestion settings")
+
     @commands.group(invoke_without_command=True)
     @commands.guild_only()
     async def prefix(self, ctx: utils.CustomContext):
         """Gets the current prefix."""
 
-        try:
-            prefix = self.bot.config[ctx.guild.id]["guild_prefix"]
-        except AttributeError:
-            prefix = "tb!"
+        prefix = self.bot.config.get(ctx.guild.id).prefix
 
         await ctx.send(f"The current prefix for this server is: `{prefix}`")
 
@@ -480,12 +485,7 @@ class Management(commands.Cog, name="management"):
         if prefix.startswith((f"<@!{_id}>", f"<@{_id}>")):
             return await ctx.send("That prefix is reserved/already in use.")
 
-        await self.bot.pool.execute(
-            "UPDATE guild_settings SET guild_prefix = $1 WHERE guild_id = $2",
-            prefix,
-            ctx.guild.id,
-        )
-        self.bot.config[ctx.guild.id]["guild_prefix"] = prefix
+        self.bot.config.update(ctx.guild.id, prefix=prefix)
         await ctx.thumbsup()
 
     @commands.group(aliases=["verify"], invoke_without_command=True)
@@ -506,9 +506,7 @@ class Management(commands.Cog, name="management"):
     async def verification_setup(self, ctx: utils.CustomContext, channel: discord.TextChannel, *, role: utils.RoleConverter):
         """Goes through the process to set up verification."""
 
-        check_guild = await self.bot.pool.fetchrow(
-            "SELECT * FROM guild_verification WHERE guild_id = $1", ctx.guild.id
-        )
+        check_guild = await self.bot.queries.verification.for_guild(ctx.guild.id)
 
         if check_guild:
             return await ctx.send("❌ Verification is already set up.")
@@ -527,8 +525,7 @@ class Management(commands.Cog, name="management"):
             return await ctx.send("I can not send messages in that channel, please give me permissions to!")
 
         await msg.add_reaction("✅")
-        await self.bot.pool.execute(
-            "INSERT INTO guild_verification(guild_id, message_id, role_id) VALUES($1, $2, $3)",
+        await self.bot.queries.verification.create(
             ctx.guild.id,
             msg.id,
             role.id,
@@ -543,20 +540,12 @@ class Management(commands.Cog, name="management"):
     async def verification_reset(self, ctx: utils.CustomContext):
         """Resets verification in the server."""
 
-        check_guild = await self.bot.pool.fetchrow(
-            "SELECT * FROM guild_verification WHERE guild_id = $1", ctx.guild.id
-        )
+        msg_id = await self.bot.queries.verification.delete_for_guild(ctx.guild.id)
 
-        if not check_guild:
+        if msg_id is None:
             return await ctx.send("❌ You do not have verification set up.")
 
-        msg_id = await self.bot.pool.fetchval("SELECT message_id FROM guild_verification WHERE guild_id = $1",
-                                              ctx.guild.id)
-
-        await self.bot.pool.execute(
-            "DELETE FROM guild_verification WHERE guild_id = $1", ctx.guild.id
-        )
-        del self.bot.verification_config[msg_id]
+        self.bot.verification_config.pop(msg_id, None)
 
         await ctx.thumbsup()
 
@@ -17,6 +17,7 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
 import argparse
+import asyncio
 import logging
 import os
 import re
@@ -94,6 +95,29 @@ class ColourConverter(commands.Converter):
             f"Couldn't find a colour value matching `{argument}`.")
 
 
+class TodoPageSource(utils.AsyncPageSource):
+    def __init__(self, bot, user_id: int, order: str, *, per_page=10):
+        super().__init__(per_page=per_page)
+        self.bot = bot
+        self.user_id = user_id
+        self.order = order
+
+    async def fetch_count(self):
+        return await self.bot.queries.todos.count_for_user(self.user_id)
+
+    async def fetch_page(self, page_number: int):
+        return await self.bot.queries.todos.page_for_user(
+            self.user_id, self.per_page, self.offset(page_number), self.order)
+
+    async def render(self, menu: menus.Menu, page: list):
+        offset = self.offset(menu.current_page)
+        embed = menu.ctx.bot.embed(menu.ctx)
+        embed.description = "\n".join(
+            [f"`{index + 1}`. {item['task']}" for index, item in enumerate(page, offset)])
+
+        return embed
+
+
 class Meta(commands.Cog, name="meta"):
     """General and utility commands"""
 
@@ -104,6 +128,8 @@ class Meta(commands.Cog, name="meta"):
             self.__class__.__name__, logging.INFO)
 
         self.weather_api_key = self.bot.settings["keys"]["weather_api"]
+        self.currency_converter = None
+        self._currency_converter_lock = asyncio.Lock()
 
     @asynccontextmanager
     async def google_search(self, query: str):
@@ -135,20 +161,17 @@ class Meta(commands.Cog, name="meta"):
 
         return discord.Colour(0)
 
-    async def _get_task_by_enumeration(self, user: discord.Member, enumerated_id: int):
-        """Helper method to get a task by its enumeration ID."""
+    async def _get_tasks_by_enumeration(self, user: discord.Member, *enumerated_ids: int):
+        """Helper method to get tasks by their enumeration IDs."""
 
-        sql = "SELECT * FROM todos WHERE user_id = $1"
-        all_tasks = await self.bot.pool.fetch(sql, user.id)
+        all_tasks = await self.bot.queries.todos.for_user(user.id)
 
         try:
-            resultant_task = all_tasks[enumerated_id - 1]
-        except IndexError:
+            return [all_tasks[enumerated_id - 1]["id"] for enumerated_id in enumerated_ids]
+        except (IndexError, TypeError):
             raise commands.BadArgument(
                 "You do not have a task that corresponds with that ID.")
 
-        return resultant_task["id"]
-
     @commands.command(aliases=["readthefuckingsource"])
     async def rtfs(self, ctx: utils.CustomContext, *, query: t.Optional[str]):
         """Queries the discord.py source with a given search."""
@@ -338,9 +361,7 @@ class Meta(commands.Cog, name="meta"):
             raise commands.BadArgument(
                 "Your task can not be longer than 100 characters.")
 
-        sql = "INSERT INTO todos VALUES(DEFAULT, $1, $2)"
-        values = (ctx.author.id, task)
-        await self.bot.pool.execute(sql, *values)
+        await self.bot.queries.todos.create(ctx.author.id, task)
 
         await ctx.send("Successfully added that to your to-do list.")
 
@@ -354,17 +375,12 @@ class Meta(commands.Cog, name="meta"):
             raise commands.BadArgument(
                 "You can not insert more than 10 tasks at a time.")
 
-        values = []
-
         for task in tasks:
             if len(task) > 100:
                 raise commands.BadArgument(
                     "I couldn't add one of your tasks as they were above 100 characters.")
 
-            values.append((ctx.author.id, task))
-
-        sql = "INSERT INTO todos VALUES(DEFAULT, $1, $2)"
-        await self.bot.pool.executemany(sql, values)
+        await self.bot.queries.todos.create_many(ctx.author.id, list(tasks))
 
         await ctx.send("Successfully added those tasks to your to-do list.")
 
@@ -374,28 +390,19 @@ class Meta(commands.Cog, name="meta"):
         Do: `{prefix}to-do remove *` to remove all of your tasks."""
 
         if todo_ids[0] == "*":
-            sql = "DELETE FROM todos WHERE user_id = $1"
-            await self.bot.pool.execute(sql, ctx.author.id)
+            await self.bot.queries.todos.delete_all(ctx.author.id)
             return await ctx.send("Successfully removed all of your current tasks.")
 
-        values = []
-
-        for todo_id in todo_ids:
-            _id = await self._get_task_by_enumeration(ctx.author, todo_id)
-            values.append((ctx.author.id, _id))
-
-        sql = "DELETE FROM todos WHERE user_id = $1 AND id = $2"
-        await self.bot.pool.executemany(sql, values)
+        ids = await self._get_tasks_by_enumeration(ctx.author, *todo_ids)
+        await self.bot.queries.todos.delete_many(ctx.author.id, ids)
         await ctx.send(f"Successfully deleted {len(todo_ids)} of your tasks.")
 
     @todo.command(name="edit")
     async def todo_edit(self, ctx: utils.CustomContext, task_id: int, *, task: str):
         """Edits a given task id with a new task description."""
 
-        _id = await self._get_task_by_enumeration(ctx.author, task_id)
-        sql = "UPDATE todos SET task = $1 WHERE id = $2"
-        values = (task, _id)
-        await self.bot.pool.execute(sql, *values)
+        _id, = await self._get_tasks_by_enumeration(ctx.author, task_id)
+        await self.bot.queries.todos.update(ctx.author.id, _id, task)
 
         await ctx.send("Alright, updated that task for you!")
 
@@ -407,7 +414,7 @@ class Meta(commands.Cog, name="meta"):
         `--size` - Sorts all tasks by size.
         Note: If you try to delete a task that is in one of these orders you may delete another task by accident!"""
 
-        sql = "SELECT * FROM todos WHERE user_id = $1"
+        order = "id"
 
         if flag:
             parser = argparse.ArgumentParser()
@@ -421,21 +428,16 @@ class Meta(commands.Cog, name="meta"):
                     "The only available flags are `--alphabetical` and `--size`.")
 
             if args.alphabetical:
-                sql += " ORDER BY task ASC"
+                order = "alphabetical"
             if args.size:
-                sql += " ORDER BY CHAR_LENGTH(task) ASC"
+                order = "size"
 
-        results = await self.bot.pool.fetch(sql, ctx.author.id)
+        source = TodoPageSource(self.bot, ctx.author.id, order)
+        await source.prepare()
 
-        if not results:
+        if not source.count:
             raise utils.NoTodoItems("You have no to-do items I can show you.")
 
-        todo_list = []
-
-        for item in results:
-            todo_list.append(item["task"])
-
-        source = utils.GeneralPageSource(todo_list, per_page=10)
         paginator = utils.KalPages(source)
 
         await paginator.start(ctx)
@@ -456,7 +458,12 @@ class Meta(commands.Cog, name="meta"):
     async def convert(self, ctx: utils.CustomContext, amount: float, cur_from: str, cur_to: str):
         """Converts a given amount of money from one currency (3 letter e.g. GBP) to another currency."""
 
-        currency_converter = CurrencyConverter()
+        # Building the converter parses its whole rates file, keep that off the loop and only do it once.
+        async with self._currency_converter_lock:
+            if self.currency_converter is None:
+                self.currency_converter = await self.bot.loop.run_in_executor(None, CurrencyConverter)
+
+        currency_converter = self.currency_converter
         cur_from = cur_from.upper()
         cur_to = cur_to.upper()
 
@@ -147,7 +147,7 @@ class Misc(commands.Cog, name="misc"):
 
     @commands.Cog.listener()
     async def on_command(self, ctx: utils.CustomContext):
-        self.bot.cmd_usage += 1
+        self.bot.counters.add("command_usage", ctx.command.qualified_name)
         # if ctx.guild:
         #     if not ctx.guild.chunked:
         #         await ctx.guild.chunk()
@@ -434,6 +434,8 @@ class Misc(commands.Cog, name="misc"):
 
         heartbeat_ms = ("Heartbeat Latency", self.bot.latency * 1000)
 
+        p50, p95, p99 = (lag * 1000 for lag in self.bot.lag_monitor.percentiles(50, 95, 99))
+
         with ctx.embed() as e:
             for typeof, result in typing_time_ms, db_time_ms, heartbeat_ms:
                 e.add_field(
@@ -442,6 +444,19 @@ class Misc(commands.Cog, name="misc"):
                     inline=False
                 )
 
+            pool = self.bot.pool.summary()
+            e.add_field(
+                name="DB Pool",
+                value=f"{pool['in_use']}/{pool['size']} in use | acquire p95 {pool['acquire_p95']:,.2f} ms",
+                inline=False
+            )
+
+            e.add_field(
+                name="Loop Lag",
+                value=f"p50 {p50:,.2f} ms | p95 {p95:,.2f} ms | p99 {p99:,.2f} ms",
+                inline=False
+            )
+
             await ctx.send(embed=e)
 
     @commands.command(hidden=True, aliases=["hello"])
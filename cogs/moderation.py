@@ -16,17 +16,17 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+import contextlib
 import humanize
 import asyncpg
 import utils
 import asyncio
 import logging
 import discord
-import uuid
 import re
 import typing as tp
 from time import time as t
-from datetime import datetime as dt
+from datetime import datetime as dt, timezone
 from discord.ext import commands, menus
 
 
@@ -129,14 +129,30 @@ class Role(commands.Converter):
         return role
 
 
-class ModerationsMenu(menus.ListPageSource):
-    def __init__(self, data, *, per_page=5):
-        super().__init__(data, per_page=per_page)
+class ModerationsMenu(utils.AsyncPageSource):
+    def __init__(self, bot, guild: discord.Guild, *, per_page=5):
+        super().__init__(per_page=per_page)
+        self.bot = bot
+        self.guild = guild
+
+    async def fetch_count(self):
+        return await self.bot.queries.mutes.count_for_guild(self.guild.id)
+
+    async def fetch_page(self, page_number: int):
+        return await self.bot.queries.mutes.page_for_guild(self.guild.id, self.per_page, self.offset(page_number))
+
+    async def render(self, menu: menus.Menu, page):
+        fmt = []
+
+        for mute in page:
+            user = self.guild.get_member(mute["member_id"])
+            dt_obj = dt.fromtimestamp(mute["end_time"])
+            humanized = humanize.precisedelta(dt_obj, format="%0.0f")
+            fmt.append(f"{user} | {humanized}")
 
-    async def format_page(self, menu: menus.Menu, page):
         embed = menu.ctx.bot.embed(menu.ctx)
         embed.title = "Active Mutes"
-        embed.description = "\n".join(page)
+        embed.description = "\n".join(fmt)
 
         return embed
 
@@ -154,14 +170,37 @@ class NotStaffMember(commands.Converter):
             return member
 
 
-class WarnsPageSource(menus.ListPageSource):
-    def __init__(self, data: tp.List[str], *, per_page=4):
-        super().__init__(data, per_page=per_page)
+class WarnsPageSource(utils.KeysetPageSource):
+    """A members warns, paged through by case number."""
+
+    def __init__(self, bot, guild_id: int, offender_id: int, *, per_page=4):
+        super().__init__(per_page=per_page)
+        self.bot = bot
+        self.guild_id = guild_id
+        self.offender_id = offender_id
+
+    def key(self, entry: asyncpg.Record):
+        return entry["case_id"]
+
+    async def fetch_count(self):
+        return await self.bot.queries.warns.count_for_member(self.guild_id, self.offender_id)
+
+    async def fetch_after(self, key, limit):
+        return await self.bot.queries.warns.page_after(self.guild_id, self.offender_id, key or 0, limit)
+
+    async def fetch_before(self, key, limit):
+        before = key if key is not None else 2 ** 31 - 1
+        return await self.bot.queries.warns.page_before(self.guild_id, self.offender_id, before, limit)
+
+    async def render(self, menu: menus.Menu, page: tp.List[asyncpg.Record]):
+        lines = []
+        for record in page:
+            warner = menu.ctx.bot.get_user(record["moderator_id"])
+            warned_date = utils.format_time(record["time_warned"])["date"]
+            lines.append(f"`#{record['case_id']}` - Warned by: {warner} - Warned at: {warned_date} | {record['reason']}")
 
-    async def format_page(self, menu: menus.Menu, page: tp.List[str]):
-        fmt = "\n".join(page)
         embed = menu.ctx.bot.embed(menu.ctx)
-        embed.description = fmt
+        embed.description = "\n".join(lines) or "No warns on this page."
 
         return embed
 
@@ -177,28 +216,64 @@ class Moderation(commands.Cog, name="moderation"):
         self.logger = utils.create_logger(
             self.__class__.__name__, logging.INFO)
 
-    async def get_warn_by_id(self, user_id: int, index: int):
-        sql = "SELECT * FROM warns WHERE offender_id = $1;"
-        records = await self.bot.pool.fetch(sql, user_id)
+    def _get_mute_role(self, guild: discord.Guild) -> tp.Optional[discord.Role]:
+        """Gets the guilds set mute role, falls back to a role called "muted" and remembers it."""
 
-        try:
-            item = records[index - 1]
-        except IndexError:
-            raise commands.BadArgument(
-                "That user does not have a warn with that ID.")
+        settings = self.bot.config.get(guild.id)
+        mute_role = guild.get_role(settings.mute_role_id) if settings.mute_role_id else None
+
+        if mute_role is None:
+            mute_role = discord.utils.find(lambda r: r.name.lower() == "muted", guild.roles)
+
+            if mute_role is not None:
+                self.bot.config.update(guild.id, mute_role_id=mute_role.id)
+
+        return mute_role
+
+    @commands.Cog.listener()
+    async def on_mute_timer_complete(self, timer: utils.Timer):
+        guild_id, member_id = timer.key
+        guild = self.bot.get_guild(guild_id)
+
+        if guild is None:
+            return
+
+        mute_role = guild.get_role(self.bot.config.get(guild_id).mute_role_id)
+        member = guild.get_member(member_id)
+
+        if member is None:
+            with contextlib.suppress(discord.HTTPException):
+                member = await guild.fetch_member(member_id)
+
+        if member is None or mute_role is None:
+            return
+
+        with contextlib.suppress(discord.HTTPException):
+            await member.remove_roles(mute_role, reason="Mute time is over.")
 
-        return item["id"]
+    @commands.Cog.listener()
+    async def on_tempban_timer_complete(self, timer: utils.Timer):
+        guild = self.bot.get_guild(timer.data["guild_id"])
+
+        if guild is None:
+            return
+
+        with contextlib.suppress(discord.HTTPException):
+            await guild.unban(discord.Object(id=timer.data["user_id"]), reason="Tempban time is over.")
 
     @commands.Cog.listener("on_member_join")
     async def persistent_mutes(self, member: discord.Member):
-        is_user_muted = await self.bot.pool.fetchrow("SELECT * FROM guild_mutes WHERE member_id = $1 AND guild_id = $2",
-                                                     member.id, member.guild.id)
+        is_user_muted = await self.bot.queries.mutes.for_member(member.guild.id, member.id)
 
         if not is_user_muted:
             return
 
-        mute_role_id = self.bot.config[member.guild.id]["guild_prefix"]
-        mute_role = member.guild.get_role(role_id=mute_role_id)
+        mute_role_id = self.bot.config.get(member.guild.id).mute_role_id
+        mute_role = member.guild.get_role(mute_role_id)
+
+        if mute_role is None:
+            return
+
         await member.add_roles(mute_role, reason="Mute Role Persist")
 
     @commands.command()
@@ -212,12 +287,10 @@ class Moderation(commands.Cog, name="moderation"):
             raise commands.BadArgument(
                 "The warn reason must not be greater than 255 characters.")
 
-        sql = "INSERT INTO warns VALUES(default, $1, $2, $3, $4, $5);"
-        values = (ctx.guild.id, ctx.author.id, user.id, reason, dt.utcnow())
-        await self.bot.pool.execute(sql, *values)
+        case_id = await self.bot.queries.warns.create(ctx.guild.id, ctx.author.id, user.id, reason, dt.utcnow())
 
         await ctx.send(
-            f"Successfully warned `{user}` for: {reason}. "
+            f"Successfully warned `{user}` for: {reason} (case `#{case_id}`). "
             f"Do `{ctx.prefix}warns {user}` to view their current warns."
         )
 
@@ -227,36 +300,26 @@ class Moderation(commands.Cog, name="moderation"):
     async def warns(self, ctx: utils.CustomContext, *, user: discord.Member):
         """Get the current warns of a given user."""
 
-        sql = "SELECT * FROM warns WHERE offender_id = $1;"
-        records = await self.bot.pool.fetch(sql, user.id)
-        ret = []
-
-        for index, record in enumerate(records, start=1):
-            warner = self.bot.get_user(record["moderator_id"])
-            warned_at = record["time_warned"]
-            warned_date = utils.format_time(warned_at)["date"]
-            ret.append(
-                f"`{index}` - Warned by: {warner} - Warned at: {warned_date} | {record['reason']}"
-            )
+        source = WarnsPageSource(self.bot, ctx.guild.id, user.id)
+        await source.prepare()
 
-        if not ret:
+        if not source.count:
             raise commands.BadArgument("That user has no warns to display.")
 
-        source = WarnsPageSource(ret)
         page = utils.KalPages(source)
         await page.start(ctx)
 
     @commands.command()
     @commands.guild_only()
     @commands.has_permissions(manage_messages=True)
-    async def delwarn(self, ctx: utils.CustomContext, user: discord.Member, warn_id: int):
-        """Deletes a warn off a given user."""
+    async def delwarn(self, ctx: utils.CustomContext, user: discord.Member, case_id: int):
+        """Deletes a warn off a given user by its case number.
+        The case numbers are shown in `{prefix}warns someone#1234`."""
 
-        warn_id = await self.get_warn_by_id(user.id, warn_id)
+        if not await self.bot.queries.warns.delete_case(ctx.guild.id, user.id, case_id):
+            raise commands.BadArgument("That user does not have a warn with that case number.")
 
-        sql = "DELETE FROM warns WHERE id = $1;"
-        await self.bot.pool.execute(sql, warn_id)
-        await ctx.send(f"Successfully cleared that warn for `{user}`")
+        await ctx.send(f"Successfully cleared case `#{case_id}` for `{user}`")
 
     @commands.command(aliases=["tban"], disabled=True, hidden=True)
     @commands.guild_only()
@@ -271,12 +334,13 @@ class Moderation(commands.Cog, name="moderation"):
             f"You were temporarily banned by {ctx.author} for the reason: {reason}. This ban expires in {format_time}"
         )
 
-        sql = "INSERT INTO temp_bans VALUES($1, $2, $3, $4, $5, $6);"
-        values = (str(uuid.uuid4()), ctx.guild.id,
-                  ctx.author.id, user.id, reason, how_long)
-        await self.bot.pool.execute(sql, *values)
+        end_time = how_long.astimezone(timezone.utc)
+        ban_id = await self.bot.queries.tempbans.create(ctx.guild.id, ctx.author.id, user.id, reason,
+                                                        end_time.replace(tzinfo=None))
 
         await user.ban(reason=reason)
+        self.bot.timers.create("tempban", ban_id, end_time.timestamp(),
+                               guild_id=ctx.guild.id, user_id=user.id)
 
         fmt = f"{user} was banned by {ctx.author} for {format_time} for the reason: {reason}"
         await ctx.send(fmt)
@@ -293,39 +357,20 @@ class Moderation(commands.Cog, name="moderation"):
         if _time < 5:
             return await ctx.send("You must provide a time that is 5 seconds or higher")
 
-        try:
-            mute_role_id = self.bot.config[ctx.guild.id]["mute_role_id"]
-            mute_role = ctx.guild.get_role(mute_role_id)
-        except KeyError:
-            def predicate(r): return r.name.lower() == "muted"
-
-            mute_role = discord.utils.find(
-                predicate=predicate, seq=ctx.guild.roles)
-
-            self.bot.config[ctx.guild.id]["mute_role_id"] = mute_role.id
-
-            await self.bot.pool.execute("UPDATE guild_settings SET mute_role_id = $1 WHERE guild_id = $2",
-                                        mute_role.id, ctx.guild.id)
+        mute_role = self._get_mute_role(ctx.guild)
 
         if mute_role is None:
             mute_role = await ctx.guild.create_role(name="Muted")
 
             await ctx.channel.set_permissions(mute_role, send_messages=False)
 
-            await self.bot.pool.execute("UPDATE guild_settings SET mute_role_id = $1 WHERE guild_id = $2",
-                                        mute_role.id, ctx.guild.id)
-
-            self.bot.config[ctx.guild.id]["mute_role_id"] = mute_role.id
+            self.bot.config.update(ctx.guild.id, mute_role_id=mute_role.id)
 
         await user.add_roles(mute_role, reason=f"Muted by: {ctx.author}")
-        await utils.set_mute(bot=self.bot,
-                             guild_id=ctx.guild.id,
-                             user_id=user.id,
-                             _time=_time)
 
         end_time = int(t() + _time)
-        await self.bot.pool.execute("INSERT INTO guild_mutes VALUES($1, $2, $3)",
-                                    ctx.guild.id, user.id, end_time)
+        await self.bot.queries.mutes.create(ctx.guild.id, user.id, end_time)
+        self.bot.timers.create("mute", (ctx.guild.id, user.id), end_time)
 
         timestamp = t() + _time
         dt_obj = dt.fromtimestamp(timestamp)
@@ -346,23 +391,13 @@ class Moderation(commands.Cog, name="moderation"):
     async def unmute(self, ctx: utils.CustomContext, user: discord.Member):
         """Unmutes a given user if they have the guilds set muted role."""
 
-        try:
-            mute_role_id = self.bot.config[ctx.guild.id]["mute_role_id"]
-            mute_role = ctx.guild.get_role(mute_role_id)
-        except KeyError:
-            def predicate(r): return r.name.lower() == "muted"
-            mute_role = discord.utils.find(
-                predicate=predicate, seq=ctx.guild.roles)
+        mute_role = self._get_mute_role(ctx.guild)
 
-            self.bot.config[ctx.guild.id]["mute_role_id"] = mute_role.id
-
-            await self.bot.pool.execute("UPDATE guild_settings SET mute_role_id = $1 WHERE guild_id = $2",
-                                        mute_role.id, ctx.guild.id)
-
-        if mute_role not in user.roles:
+        if mute_role is None or mute_role not in user.roles:
             return await ctx.send("That user does not have the guilds set muted role.")
 
         await user.remove_roles(mute_role, reason=f"Unmuted by: {ctx.author}")
+        self.bot.timers.cancel("mute", (ctx.guild.id, user.id))
         embed = self.bot.embed(ctx)
         embed.description = f"{ctx.author.mention} ({ctx.author}) unmuted {user.mention} ({user})"
 
@@ -374,18 +409,7 @@ class Moderation(commands.Cog, name="moderation"):
     async def moderations(self, ctx: utils.CustomContext):
         """Gets all of the current active mutes."""
 
-        mutes = await self.bot.pool.fetch("SELECT * FROM guild_mutes WHERE guild_id = $1",
-                                          ctx.guild.id)
-
-        fmt = []
-
-        for mute in mutes:
-            user = ctx.guild.get_member(mute["member_id"])
-            dt_obj = dt.fromtimestamp(mute["end_time"])
-            humanized = humanize.precisedelta(dt_obj, format="%0.0f")
-            fmt.append(f"{user} | {humanized}")
-
-        menu = utils.KalPages(ModerationsMenu(fmt), clear_reactions_after=True)
+        menu = utils.KalPages(ModerationsMenu(self.bot, ctx.guild), clear_reactions_after=True)
         await menu.start(ctx)
 
     @commands.command(aliases=["unbanall"])
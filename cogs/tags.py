@@ -24,23 +24,32 @@ import typing as t
 from discord.ext import commands, menus
 
 
-class TagsListPageSource(menus.ListPageSource):
-    def __init__(self, username: str, all_tags: list, *, per_page: int = 10):
-        super().__init__(all_tags, per_page=per_page)
+class TagsListPageSource(utils.AsyncPageSource):
+    def __init__(self, bot, user: discord.Member, *, per_page: int = 10):
+        super().__init__(per_page=per_page)
 
-        self.username: str = username
+        self.bot = bot
+        self.user: discord.Member = user
 
-    async def format_page(self, menu: menus.Menu, all_tags: list):
+    async def fetch_count(self):
+        return await self.bot.queries.tags.count_for_author(self.user.id, self.user.guild.id)
+
+    async def fetch_page(self, page_number: int):
+        return await self.bot.queries.tags.titles_for_author(
+            self.user.id, self.user.guild.id, self.per_page, self.offset(page_number))
+
+    async def render(self, menu: menus.Menu, tags: list):
+        offset = self.offset(menu.current_page)
         embed = menu.ctx.bot.embed(menu.ctx)
-        embed.title = f'{self.username}\'s tags'
-        embed.description = "\n".join(all_tags)
+        embed.title = f'{self.user.name}\'s tags'
+        embed.description = "\n".join(f'`{i + 1}`. {tag["title"]}' for i, tag in enumerate(tags, offset))
 
         return embed
 
 
 class TagTitle(commands.Converter):
     async def convert(self, ctx: utils.CustomContext, argument: str):
-        reserved_names: list = ['create', 'make', 'add', 'list', 'delete']
+        reserved_names: list = ['create', 'make', 'add', 'list', 'search', 'remove', 'delete', 'del']
         if len(argument) > 32:
             raise commands.BadArgument(
                 'The title must not be longer than 32 characters.')
@@ -59,11 +68,22 @@ class Tags(commands.Cog, name="tags"):
             self.__class__.__name__, logging.INFO)
 
     async def cog_check(self, ctx: utils.CustomContext):
-        return hasattr(ctx, 'guild')
+        # Tags belong to a guild, same as commands.guild_only() but for the whole cog.
+        if ctx.guild is None:
+            raise commands.NoPrivateMessage()
+        return True
 
     def _is_privileged(self, ctx: utils.CustomContext):
         return ctx.author.guild_permissions.manage_messages
 
+    @staticmethod
+    def _not_found(tags: utils.GuildTags, title: str) -> str:
+        suggestions = tags.suggest(title)
+        if not suggestions:
+            return 'I could not find that tag.'
+
+        return f'I could not find that tag, did you mean {", ".join(f"`{s}`" for s in suggestions)}?'
+
     @commands.group(invoke_without_command=True)
     async def tag(self, ctx: utils.CustomContext, tag: t.Optional[str]):
         """The base command for everything to do with tags.
@@ -72,12 +92,14 @@ class Tags(commands.Cog, name="tags"):
         if not tag:
             return await ctx.send_help(ctx.command)
 
-        tag = await self.bot.pool.fetchrow('SELECT * FROM tags WHERE title = $1', tag)
+        tags = await self.bot.tag_cache.get(ctx.guild.id)
+        found = tags.get(tag)
 
-        if tag is None:
-            raise commands.BadArgument('I could not find that tag.')
+        if found is None:
+            raise commands.BadArgument(self._not_found(tags, tag))
 
-        await ctx.send(tag['content'])
+        self.bot.counters.add("tag_uses", found['id'])
+        await ctx.send(found['content'])
 
     @tag.command(name="list")
     async def tag_list(self, ctx: utils.CustomContext, *, user: t.Optional[discord.Member]):
@@ -85,22 +107,34 @@ class Tags(commands.Cog, name="tags"):
         Example: `{prefix}tag list @kal#1806`"""
 
         user: discord.Member = user or ctx.author
-        all_user_tags = await self.bot.pool.fetch('SELECT title FROM tags WHERE author = $1 AND guild = $2',
-                                                  user.id, ctx.guild.id)
+        source = TagsListPageSource(self.bot, user)
+        await source.prepare()
 
-        if not all_user_tags:
+        if not source.count:
             fmt: str = f'`{user.name}` has no tags to display.'
             return await ctx.send(fmt)
 
-        all_tags = []
-        for i, tag in enumerate(all_user_tags):
-            all_tags.append(f'`{i + 1}`. {tag["title"]}')
-
-        source = TagsListPageSource(user.name, all_tags)
         menu = utils.KalPages(source)
 
         await menu.start(ctx)
 
+    @tag.command(name="search")
+    async def tag_search(self, ctx: utils.CustomContext, *, prefix: str):
+        """Lists the tags in this server that start with what you give.
+        Example: `{prefix}tag search kal`"""
+
+        tags = await self.bot.tag_cache.get(ctx.guild.id)
+        titles = tags.with_prefix(prefix)
+
+        if not titles:
+            raise commands.BadArgument(self._not_found(tags, prefix))
+
+        embed = self.bot.embed(ctx)
+        embed.title = f'Tags starting with "{prefix}"'
+        embed.description = "\n".join(f'`{i + 1}`. {title}' for i, title in enumerate(titles))
+
+        await ctx.send(embed=embed)
+
     @tag.command(name='create', aliases=['make', 'add'])
     async def tag_create(self,
                          ctx: utils.CustomContext,
@@ -110,18 +144,11 @@ class Tags(commands.Cog, name="tags"):
         Example: `{prefix}tag create "kal is the best" this is a very true statement.`"""
 
         tag_id = uuid.uuid4()
-        check_sql = 'SELECT COUNT(*) FROM tags WHERE title = $1'
-        count = await self.bot.pool.fetchval(check_sql, tag_name)
 
-        if count > 0:
+        if not await self.bot.tag_cache.create(str(tag_id), ctx.guild.id, ctx.author.id, tag_name, tag_content):
             raise commands.BadArgument(
                 'There is already a tag with that name.')
 
-        sql = 'INSERT INTO tags VALUES($1, $2, $3, $4, $5, $6)'
-        values = (str(tag_id), ctx.guild.id,
-                  ctx.author.id, tag_name, tag_content, 0)
-        await self.bot.pool.execute(sql, *values)
-
         await ctx.send('Successfully added that tag.')
 
     @tag.command(name='remove', aliases=['delete', 'del'])
@@ -129,18 +156,17 @@ class Tags(commands.Cog, name="tags"):
         """Removes a given tag by it's name.
         You can only remove it if you're server staff (Manage Messages) or you own the tag."""
 
-        tag = await self.bot.pool.fetchrow('SELECT * FROM tags WHERE title = $1', tag_name)
+        tags = await self.bot.tag_cache.get(ctx.guild.id)
+        tag = tags.get(tag_name)
 
         if tag is None:
-            raise commands.BadArgument(
-                'There is no tag found that has that name.')
+            raise commands.BadArgument(self._not_found(tags, tag_name))
 
-        if not tag['author'] == ctx.author.id or not self._is_privileged(ctx):
+        if tag['author'] != ctx.author.id and not self._is_privileged(ctx):
             raise utils.NotTagOwner(
                 'You do not have sufficient permissions to remove this tag.')
 
-        sql = 'DELETE FROM tags WHERE id = $1'
-        await self.bot.pool.execute(sql, tag['id'])
+        await self.bot.tag_cache.remove(ctx.guild.id, tag_name)
 
         fmt = 'Successfully removed that tag.'
         await ctx.send(fmt)
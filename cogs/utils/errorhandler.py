@@ -29,6 +29,19 @@ class ErrorHandler(commands.Cog):
         self.logger = utils.create_logger(
             self.__class__.__name__, logging.INFO)
 
+    async def _suggest_command(self, ctx: utils.CustomContext):
+        # Guilds opt in, otherwise a message that happens to start with the prefix gets a reply.
+        if ctx.guild is None or not self.bot.config.get(ctx.guild.id).suggest_commands:
+            return
+
+        # Short words are too easy to be a couple of edits away from a command by accident.
+        if ctx.invoked_with is None or len(ctx.invoked_with) < 3:
+            return
+
+        suggestion = self.bot.command_index.best(ctx.invoked_with, 2)
+        if suggestion is not None:
+            await ctx.send(f"I couldn't find a command called `{ctx.invoked_with}`, did you mean `{suggestion}`?")
+
     @commands.Cog.listener()
     async def on_command_error(self, ctx: utils.CustomContext, error: Exception):
         IGNORED_ERRORS = (commands.CommandNotFound,)
@@ -40,10 +53,13 @@ class ErrorHandler(commands.Cog):
             commands.CommandOnCooldown,
             commands.NotOwner,
             commands.CheckFailure,
-            commands.BadArgument
+            commands.BadArgument,
+            utils.ImageTimeout
         )
 
         if isinstance(error, IGNORED_ERRORS):
+            if isinstance(error, commands.CommandNotFound):
+                await self._suggest_command(ctx)
             return
 
         if isinstance(error, PLAIN_ERRORS):
@@ -23,12 +23,12 @@ from discord.ext import commands, menus
 
 
 class GroupHelp(menus.ListPageSource):
-    def __init__(self, group, cmds, *, prefix):
-        super().__init__(entries=cmds, per_page=4)
+    def __init__(self, group, fields, *, prefix):
+        super().__init__(entries=fields, per_page=4)
         self.group = group
         self.prefix = prefix
 
-    async def format_page(self, menu, cmds):
+    async def format_page(self, menu, fields):
         embed = menu.ctx.bot.embed(menu.ctx)
         command_name = f"{self.group.qualified_name}{' | ' + ' | '.join(self.group.aliases) if self.group.aliases else ''}"
         embed.title = f"{self.prefix}{command_name} {self.group.signature}"
@@ -37,11 +37,8 @@ class GroupHelp(menus.ListPageSource):
             f"\n\n**Category: {self.group.cog.show_name}**"
         )
 
-        for cmd in cmds:
-            command_name = f"{cmd.qualified_name}{' | ' + ' | '.join(cmd.aliases) if cmd.aliases else ''}"
-            signature = f"{self.prefix}{command_name} {cmd.signature}"
-            embed.add_field(
-                name=signature, value=cmd.help.format(prefix=self.prefix) or "No help given...", inline=False)
+        for signature, value in fields:
+            embed.add_field(name=signature, value=value, inline=False)
 
         maximum = self.get_max_pages()
         if maximum > 1:
@@ -54,24 +51,19 @@ class GroupHelp(menus.ListPageSource):
 
 
 class CogHelp(menus.ListPageSource):
-    def __init__(self, ctx, cog, cmds, *, prefix):
-        super().__init__(entries=cmds, per_page=4)
+    def __init__(self, ctx, cog, fields, *, prefix):
+        super().__init__(entries=fields, per_page=4)
         self.ctx = ctx
         self.cog = cog
         self.prefix = prefix
         self.title = f"{self.cog.show_name} Commands"
 
-    async def format_page(self, menu, cmds):
+    async def format_page(self, menu, fields):
         embed = self.ctx.bot.embed(menu.ctx)
         embed.title = self.title
 
-        for cmd in cmds:
-            signature = f"{self.prefix}{cmd.name} {cmd.signature}"
-            embed.add_field(
-                name=signature,
-                value=cmd.help.format(prefix=self.prefix),
-                inline=False
-            )
+        for signature, value in fields:
+            embed.add_field(name=signature, value=value, inline=False)
 
         maximum = self.get_max_pages()
         if maximum > 1:
@@ -96,8 +88,9 @@ class BaseHelp(menus.Menu):
         await self.message.delete()
         self.message = None
         cog = self.bot.get_cog(what_cog)
+        fields = self.bot.help_catalogue.category_fields(what_cog, self.prefix)
         menu = utils.KalPages(
-            CogHelp(self.ctx, cog, cog.get_commands(), prefix=self.prefix),
+            CogHelp(self.ctx, cog, fields, prefix=self.prefix),
             clear_reactions_after=True
         )
         return menu
@@ -200,16 +193,7 @@ class CustomHelp(commands.HelpCommand):
         return f"Couldn't find the help for `{string}`"
 
     async def send_bot_help(self, mapping: Mapping[commands.Cog, List[commands.Command]]):
-        titles = []
-        for cog, all_commands in mapping.items():
-            if not hasattr(cog, "show_name"):
-                continue
-            if sum(not c.hidden for c in all_commands) == 0:
-                continue
-
-            titles.append(cog.show_name)
-
-        menu = BaseHelp(titles, self.clean_prefix)
+        menu = BaseHelp(self.context.bot.help_catalogue.titles, self.clean_prefix)
         await menu.start(self.context)
 
     async def send_command_help(self, command: commands.Command):
@@ -230,9 +214,9 @@ class CustomHelp(commands.HelpCommand):
         if not hasattr(group.cog, "show_name"):
             return await self.send_error_message(self.command_not_found(group.qualified_name))
 
-        sorted = await self.filter_commands(group.commands, sort=True)
+        fields = self.context.bot.help_catalogue.group_fields(group, self.clean_prefix)
         menu = utils.KalPages(
-            GroupHelp(group, sorted, prefix=self.clean_prefix))
+            GroupHelp(group, fields, prefix=self.clean_prefix))
         await menu.start(self.context)
 
 
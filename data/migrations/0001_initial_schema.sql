@@ -0,0 +1,103 @@
+-- The schema as it was before migrations, written so it can also be ran against a database made from it.
+CREATE TABLE IF NOT EXISTS guild_settings (
+    guild_id BIGINT PRIMARY KEY,
+    guild_prefix VARCHAR(10) DEFAULT 'tb!',
+    mute_role_id BIGINT,
+    log_channel BIGINT,
+    owoify BOOLEAN DEFAULT 'f'
+);
+
+CREATE TABLE IF NOT EXISTS guild_mutes (
+    guild_id BIGINT,
+    member_id BIGINT,
+    end_time BIGINT
+);
+
+CREATE TABLE IF NOT EXISTS giveaways (
+    message_id BIGINT PRIMARY KEY,
+    channel_id BIGINT,
+    ends_at TIMESTAMP,
+    role_id BIGINT
+);
+
+CREATE TABLE IF NOT EXISTS cookies (
+    user_id BIGINT PRIMARY KEY,
+    cookies INT
+);
+
+CREATE TABLE IF NOT EXISTS blacklist (
+    id BIGINT PRIMARY KEY,
+    reason TEXT
+);
+
+CREATE TABLE IF NOT EXISTS guild_verification (
+    guild_id BIGINT PRIMARY KEY,
+    message_id BIGINT,
+    role_id BIGINT
+);
+
+CREATE TABLE IF NOT EXISTS temp_bans (
+    id SERIAL PRIMARY KEY,
+    guild_id BIGINT NOT NULL,
+    moderator_id BIGINT NOT NULL,
+    user_id BIGINT NOT NULL,
+    reason VARCHAR(255),
+    end_time TIMESTAMP NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS todos (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    task VARCHAR(100) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS warns (
+    id SERIAL PRIMARY KEY,
+    guild_id BIGINT,
+    moderator_id BIGINT,
+    offender_id BIGINT,
+    reason VARCHAR(255),
+    time_warned TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS tags (
+    id TEXT PRIMARY KEY,
+    guild BIGINT NOT NULL,
+    author BIGINT NOT NULL,
+    title VARCHAR(100) NOT NULL,
+    content TEXT NOT NULL,
+    uses INT DEFAULT 0
+);
+
+-- Publishes row changes of the cached tables so every bot process can keep its caches in sync.
+CREATE OR REPLACE FUNCTION notify_cache_change() RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('cache_changes', json_build_object(
+        'table', TG_TABLE_NAME,
+        'op', TG_OP,
+        'new', CASE WHEN TG_OP <> 'DELETE' THEN row_to_json(NEW) END,
+        'old', CASE WHEN TG_OP <> 'INSERT' THEN row_to_json(OLD) END
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS guild_settings_cache_changes ON guild_settings;
+CREATE TRIGGER guild_settings_cache_changes
+    AFTER INSERT OR UPDATE OR DELETE ON guild_settings
+    FOR EACH ROW EXECUTE PROCEDURE notify_cache_change();
+
+DROP TRIGGER IF EXISTS blacklist_cache_changes ON blacklist;
+CREATE TRIGGER blacklist_cache_changes
+    AFTER INSERT OR UPDATE OR DELETE ON blacklist
+    FOR EACH ROW EXECUTE PROCEDURE notify_cache_change();
+
+DROP TRIGGER IF EXISTS guild_verification_cache_changes ON guild_verification;
+CREATE TRIGGER guild_verification_cache_changes
+    AFTER INSERT OR UPDATE OR DELETE ON guild_verification
+    FOR EACH ROW EXECUTE PROCEDURE notify_cache_change();
+
+DROP TRIGGER IF EXISTS giveaways_cache_changes ON giveaways;
+CREATE TRIGGER giveaways_cache_changes
+    AFTER INSERT OR UPDATE OR DELETE ON giveaways
+    FOR EACH ROW EXECUTE PROCEDURE notify_cache_change();
@@ -0,0 +1,31 @@
+-- Indexes and keys for the lookups the bot does all the time.
+
+-- warns / delwarn look a member's warns up within a guild, in id order.
+CREATE INDEX IF NOT EXISTS warns_guild_offender_idx ON warns (guild_id, offender_id, id);
+
+-- persistent_mutes checks every member that joins, muting someone twice used to leave two rows.
+-- Keep the latest mute of every member before adding the key.
+DELETE FROM guild_mutes WHERE guild_id IS NULL OR member_id IS NULL;
+
+DELETE FROM guild_mutes
+WHERE ctid IN (
+    SELECT ctid FROM (
+        SELECT ctid, row_number() OVER (PARTITION BY guild_id, member_id ORDER BY end_time DESC NULLS LAST) AS n
+        FROM guild_mutes
+    ) AS ranked
+    WHERE n > 1
+);
+
+ALTER TABLE guild_mutes ADD PRIMARY KEY (guild_id, member_id);
+
+-- The timers load everything that expires within the next hour.
+CREATE INDEX IF NOT EXISTS guild_mutes_end_time_idx ON guild_mutes (end_time);
+CREATE INDEX IF NOT EXISTS temp_bans_end_time_idx ON temp_bans (end_time);
+CREATE INDEX IF NOT EXISTS giveaways_ends_at_idx ON giveaways (ends_at);
+
+-- Tags are looked up by their title and listed per author in a guild.
+CREATE INDEX IF NOT EXISTS tags_title_idx ON tags (title);
+CREATE INDEX IF NOT EXISTS tags_author_guild_idx ON tags (author, guild);
+
+-- The to-do commands read a user's whole list in id order.
+CREATE INDEX IF NOT EXISTS todos_user_idx ON todos (user_id, id);
@@ -0,0 +1,24 @@
+-- Warns get a case number that counts up per guild, that's what moderators see and delete by.
+ALTER TABLE warns ADD COLUMN case_id INT;
+
+UPDATE warns AS w
+SET case_id = numbered.n
+FROM (SELECT id, row_number() OVER (PARTITION BY guild_id ORDER BY id) AS n FROM warns) AS numbered
+WHERE w.id = numbered.id;
+
+ALTER TABLE warns ALTER COLUMN case_id SET NOT NULL;
+
+CREATE UNIQUE INDEX warns_guild_case_idx ON warns (guild_id, case_id);
+
+-- Warn history is paged through by case number now.
+DROP INDEX IF EXISTS warns_guild_offender_idx;
+CREATE INDEX warns_guild_offender_case_idx ON warns (guild_id, offender_id, case_id);
+
+-- The last case number handed out per guild, numbers aren't reused after a warn is deleted.
+CREATE TABLE warn_cases (
+    guild_id BIGINT PRIMARY KEY,
+    last_case INT NOT NULL
+);
+
+INSERT INTO warn_cases(guild_id, last_case)
+SELECT guild_id, MAX(case_id) FROM warns WHERE guild_id IS NOT NULL GROUP BY guild_id;
@@ -0,0 +1,5 @@
+-- Every cluster keeps the cookie leaderboard in memory, this keeps them in step with each other.
+DROP TRIGGER IF EXISTS cookies_cache_changes ON cookies;
+CREATE TRIGGER cookies_cache_changes
+    AFTER INSERT OR UPDATE OR DELETE ON cookies
+    FOR EACH ROW EXECUTE PROCEDURE notify_cache_change();
@@ -0,0 +1,5 @@
+-- How many times each command has been used, written in batches by the counter service.
+CREATE TABLE command_usage (
+    command TEXT PRIMARY KEY,
+    uses BIGINT NOT NULL DEFAULT 0
+);
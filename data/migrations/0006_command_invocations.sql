@@ -0,0 +1,13 @@
+-- One row per command invocation, partitioned by month so old months can be dropped whole.
+-- The partitions themselves are made by the bot (utils/analytics.py) as it needs them.
+CREATE TABLE command_invocations (
+    used_at TIMESTAMP NOT NULL,
+    command TEXT NOT NULL,
+    guild_id BIGINT,
+    shard_id INT,
+    latency DOUBLE PRECISION NOT NULL,
+    failed BOOLEAN NOT NULL,
+    error TEXT
+) PARTITION BY RANGE (used_at);
+
+CREATE INDEX command_invocations_used_at_idx ON command_invocations (used_at);
@@ -0,0 +1,7 @@
+-- Tags are looked up by title within a guild now, titles only have to be unique per guild.
+DELETE FROM tags AS t
+USING tags AS other
+WHERE t.guild = other.guild AND t.title = other.title AND t.ctid > other.ctid;
+
+DROP INDEX IF EXISTS tags_title_idx;
+CREATE UNIQUE INDEX tags_guild_title_idx ON tags (guild, title);
@@ -0,0 +1,2 @@
+-- Suggesting a command when one isn't found is something a guild turns on, by default unknown commands are ignored.
+ALTER TABLE guild_settings ADD COLUMN IF NOT EXISTS suggest_commands BOOLEAN DEFAULT 'f';
@@ -0,0 +1,217 @@
+"""
+Runs the bot as several processes (clusters) that each run a contiguous range of the shards.
+Copyright (C) 2021 kal-byte
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Usage: python launcher.py --clusters 4 [--shards 16]
+Send the launcher SIGHUP to restart the clusters one at a time.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import sys
+import time
+import aiohttp
+import utils
+from discord.ext.ipc import Client
+
+logger = utils.create_logger("launcher", logging.INFO)
+
+
+class Cluster:
+    def __init__(self, launcher: "Launcher", cluster_id: int, shard_ids: list):
+        self.launcher = launcher
+        self.cluster_id = cluster_id
+        self.shard_ids = shard_ids
+        self.process = None
+        self.restarting = False
+        self.ipc = Client("localhost", utils.ClusterInfo.ipc_port(cluster_id),
+                          launcher.settings["misc"]["secret_key"])
+
+    def __repr__(self):
+        return f"<Cluster id={self.cluster_id} shards={self.shard_ids[0]}-{self.shard_ids[-1]}>"
+
+    @property
+    def env(self) -> dict:
+        return {
+            **os.environ,
+            "TRAVIS_CLUSTER_ID": str(self.cluster_id),
+            "TRAVIS_CLUSTER_COUNT": str(len(self.launcher.clusters)),
+            "TRAVIS_SHARD_IDS": ",".join(map(str, self.shard_ids)),
+            "TRAVIS_SHARD_COUNT": str(self.launcher.shard_count),
+        }
+
+    async def start(self):
+        self.process = await asyncio.create_subprocess_exec(sys.executable, "main.py", env=self.env)
+        logger.info(f"Started {self!r} as pid {self.process.pid}.")
+
+    async def stop(self, timeout: float = 30.0):
+        if self.process is None or self.process.returncode is not None:
+            return
+
+        self.process.terminate()
+        try:
+            await asyncio.wait_for(self.process.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"{self!r} didn't stop within {timeout:.0f}s, killing it.")
+            self.process.kill()
+            await self.process.wait()
+
+    async def wait_until_ready(self, timeout: float = 600.0) -> bool:
+        """Polls the clusters IPC server until it says its caches are warmed up."""
+
+        deadline = time.monotonic() + timeout
+
+        while time.monotonic() < deadline:
+            if self.process.returncode is not None:
+                return False
+
+            try:
+                # The reply is the JSON text, "false" until the caches are warm.
+                if json.loads(await self.ipc.request("is_ready")) is True:
+                    return True
+            except Exception:
+                # The IPC server isn't up until the cogs are loaded.
+                pass
+
+            await asyncio.sleep(5.0)
+
+        return False
+
+
+class Launcher:
+    def __init__(self, cluster_count: int, shard_count: int = None):
+        self.settings = utils.Settings("config.toml")
+        self.cluster_count = cluster_count
+        self.shard_count = shard_count
+        self.clusters = []
+        self.stopping = asyncio.Event()
+        self._rolling = None
+
+    @property
+    def token(self) -> str:
+        return self.settings["tokens"]["beta"] if os.name == "nt" else self.settings["tokens"]["main"]
+
+    async def fetch_shard_count(self) -> int:
+        headers = {"Authorization": f"Bot {self.token}"}
+        async with aiohttp.ClientSession() as session:
+            async with session.get("https://discord.com/api/v8/gateway/bot", headers=headers) as resp:
+                resp.raise_for_status()
+                data = await resp.json()
+
+        return data["shards"]
+
+    async def start_cluster(self, cluster: Cluster):
+        await cluster.start()
+
+        # Clusters identify one after the other so they don't fight over the identify ratelimit.
+        if not await cluster.wait_until_ready():
+            logger.error(f"{cluster!r} didn't become ready.")
+
+    async def watch(self, cluster: Cluster):
+        """Restarts a cluster whenever it exits without us asking it to."""
+
+        retry_after = 5.0
+
+        while not self.stopping.is_set():
+            started = time.monotonic()
+            await cluster.process.wait()
+
+            if self.stopping.is_set():
+                return
+            if cluster.restarting:
+                # The rolling restart replaced the process, keep watching the new one.
+                while cluster.restarting:
+                    await asyncio.sleep(1.0)
+                continue
+
+            # Only back off when a cluster keeps dying straight after starting.
+            retry_after = 5.0 if time.monotonic() - started > 300 else min(retry_after * 2, 300.0)
+            logger.error(f"{cluster!r} exited with code {cluster.process.returncode}, restarting in {retry_after:.0f}s.")
+
+            await asyncio.sleep(retry_after)
+            if not self.stopping.is_set():
+                await self.start_cluster(cluster)
+
+    async def rolling_restart(self):
+        """Restarts the clusters one at a time, the next one only goes down once the last is ready again."""
+
+        logger.info("Starting a rolling restart.")
+
+        for cluster in self.clusters:
+            if self.stopping.is_set():
+                return
+
+            cluster.restarting = True
+            try:
+                await cluster.stop()
+                await self.start_cluster(cluster)
+            finally:
+                cluster.restarting = False
+
+        logger.info("Rolling restart finished.")
+
+    def on_sighup(self):
+        if self._rolling is not None and not self._rolling.done():
+            logger.warning("A rolling restart is already running.")
+            return
+
+        self._rolling = asyncio.get_event_loop().create_task(self.rolling_restart())
+
+    async def run(self):
+        loop = asyncio.get_event_loop()
+        loop.add_signal_handler(signal.SIGHUP, self.on_sighup)
+        loop.add_signal_handler(signal.SIGINT, self.stopping.set)
+        loop.add_signal_handler(signal.SIGTERM, self.stopping.set)
+
+        if self.shard_count is None:
+            self.shard_count = await self.fetch_shard_count()
+
+        ranges = utils.shard_ranges(self.shard_count, min(self.cluster_count, self.shard_count))
+        self.clusters = [Cluster(self, cluster_id, shard_ids) for cluster_id, shard_ids in enumerate(ranges)]
+        logger.info(f"Running {self.shard_count} shards over {len(self.clusters)} clusters.")
+
+        for cluster in self.clusters:
+            await self.start_cluster(cluster)
+
+        watchers = [loop.create_task(self.watch(cluster)) for cluster in self.clusters]
+
+        await self.stopping.wait()
+        logger.info("Shutting down all clusters.")
+
+        for task in watchers:
+            task.cancel()
+        await asyncio.gather(*(cluster.stop() for cluster in self.clusters))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs Travis Bott over multiple processes.")
+    parser.add_argument("--clusters", type=int, default=2, help="How many processes to run.")
+    parser.add_argument("--shards", type=int, default=None,
+                        help="Total shard count, defaults to what Discord recommends.")
+    args = parser.parse_args()
+
+    if args.shards is not None and args.shards < args.clusters:
+        parser.error("There can't be more clusters than shards.")
+
+    asyncio.get_event_loop().run_until_complete(Launcher(args.clusters, args.shards).run())
+
+
+if __name__ == "__main__":
+    main()
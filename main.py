@@ -32,62 +32,74 @@ my_intents.members = True
 
 stuff_to_cache = MemberCacheFlags.from_intents(my_intents)
 
-bot = MyBot(
-    status=Status.dnd,
-    activity=Game(name="Connecting..."),  # Connecting to the gateway :thonk:
-    case_insensitive=True,
-    max_messages=1000,
-    allowed_mentions=my_mentions,
-    intents=my_intents,
-    member_cache_flags=stuff_to_cache,
-    chunk_guilds_at_startup=False,
-)
-bot.ipc = Server(bot, "0.0.0.0", 8765, bot.settings["misc"]["secret_key"])
-
-bot.version = "But Better"
-bot.description = (
-    "A general purpose discord bot that provides a lot of utilities and such to use."
-)
-bot.owner_ids = {671777334906454026,
-                 200301688056315911}
-
-os.environ["JISHAKU_HIDE"] = "True"
-os.environ["JISHAKU_NO_UNDERSCORE"] = "True"
-os.environ["JISHAKU_NO_DM_TRACEBACK"] = "True"
-
-cogs = [
-    "cogs.developer",
-    "cogs.meta",
-    "cogs.management",
-    "cogs.moderation",
-    "cogs.fun",
-    "cogs.imagemanipulation",
-    "cogs.misc",
-    "cogs.debug",
-    "cogs.beta",
-    "cogs.topgg",
-    # "cogs.logginglisteners",
-    "cogs.utils.help",
-    "cogs.utils.errorhandler",
-    "cogs.custom.motherrussia",
-    "cogs.custom.scrib",
-    "cogs.custom.antinuke",
-    "cogs.custom.userrequests",
-    "jishaku",
-]
-
-for cog in cogs:
-    try:
-        bot.load_extension(cog)
-        logger.info(
-            f"-> [MODULE] {cog[5:] if cog.startswith('cog') else cog} loaded.")
-    except Exception as e:
-        logger.critical(f"{type(e).__name__} - {e}")
-
-bot.ipc.start()
-
-if os.name == "nt":
-    TOKEN = bot.settings["tokens"]["beta"]
-else:
-    TOKEN = bot.settings["tokens"]["main"]
-bot.run(TOKEN)
+
+def main():
+    # Set by launcher.py, running main.py directly still runs every shard in this one process.
+    cluster = utils.ClusterInfo.from_env()
+
+    bot = MyBot(
+        status=Status.dnd,
+        activity=Game(name="Connecting..."),  # Connecting to the gateway :thonk:
+        case_insensitive=True,
+        max_messages=1000,
+        allowed_mentions=my_mentions,
+        intents=my_intents,
+        member_cache_flags=stuff_to_cache,
+        chunk_guilds_at_startup=False,
+        cluster=cluster,
+    )
+    # discord-ext-ipc 1.0 only ever listens on localhost, whatever host it's given.
+    bot.ipc = Server(bot, "localhost", cluster.ipc_port(cluster.cluster_id), bot.settings["misc"]["secret_key"])
+
+    bot.version = "But Better"
+    bot.description = (
+        "A general purpose discord bot that provides a lot of utilities and such to use."
+    )
+    bot.owner_ids = {671777334906454026,
+                     200301688056315911}
+
+    os.environ["JISHAKU_HIDE"] = "True"
+    os.environ["JISHAKU_NO_UNDERSCORE"] = "True"
+    os.environ["JISHAKU_NO_DM_TRACEBACK"] = "True"
+
+    cogs = [
+        "cogs.developer",
+        "cogs.meta",
+        "cogs.management",
+        "cogs.moderation",
+        "cogs.fun",
+        "cogs.imagemanipulation",
+        "cogs.misc",
+        "cogs.debug",
+        "cogs.beta",
+        "cogs.topgg",
+        # "cogs.logginglisteners",
+        "cogs.utils.help",
+        "cogs.utils.errorhandler",
+        "cogs.custom.motherrussia",
+        "cogs.custom.scrib",
+        "cogs.custom.antinuke",
+        "cogs.custom.userrequests",
+        "jishaku",
+    ]
+
+    for cog in cogs:
+        try:
+            bot.load_extension(cog)
+            logger.info(
+                f"-> [MODULE] {cog[5:] if cog.startswith('cog') else cog} loaded.")
+        except Exception as e:
+            logger.critical(f"{type(e).__name__} - {e}")
+
+    bot.ipc.start()
+
+    if os.name == "nt":
+        TOKEN = bot.settings["tokens"]["beta"]
+    else:
+        TOKEN = bot.settings["tokens"]["main"]
+    bot.run(TOKEN)
+
+
+# Image workers come from a fork server that imports this file as well, only running it starts the bot.
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+import importlib.util
+import pathlib
+import sys
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# utils/__init__.py imports every module, and with them discord.py and the rest of the bot's dependencies.
+# The package is registered without running it so the modules that don't need those can be tested on their own.
+if "utils" not in sys.modules:
+    spec = importlib.util.spec_from_file_location("utils", ROOT / "utils" / "__init__.py",
+                                                  submodule_search_locations=[str(ROOT / "utils")])
+    sys.modules["utils"] = importlib.util.module_from_spec(spec)
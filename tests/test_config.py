@@ -0,0 +1,74 @@
+import asyncio
+import types
+import pytest
+
+pytest.importorskip("asyncpg")
+
+from utils.config import GuildConfig  # noqa: E402
+
+
+class SlowPool:
+    def __init__(self):
+        self.writes = []
+
+    async def execute(self, sql, *args):
+        await asyncio.sleep(0.1)
+        self.writes.append(args)
+
+
+def make_config():
+    loop = asyncio.get_running_loop()
+    bot = types.SimpleNamespace(loop=loop, pool=SlowPool(), invalidate_prefix=lambda guild_id: None)
+    return GuildConfig(bot, flush_interval=0.01)
+
+
+def test_update_only_marks_the_changed_fields():
+    async def main():
+        config = make_config()
+        config.update(1, prefix="!")
+        config.update(1, owoify=True)
+        await config.flush()
+
+        # The guild ids, then each field's value and whether it changed.
+        guild_ids, *fields = config.bot.pool.writes[0]
+        changed = dict(zip(GuildConfig.FIELDS, zip(fields[0::2], fields[1::2])))
+
+        assert guild_ids == [1]
+        assert changed["prefix"] == (["!"], [True])
+        assert changed["owoify"] == ([True], [True])
+        assert changed["mute_role_id"][1] == changed["log_channel"][1] == [False]
+
+    asyncio.run(main())
+
+
+def test_close_waits_for_a_running_flush():
+    async def main():
+        config = make_config()
+        config.update(1, prefix="!")
+        config.start()
+
+        # The flush loop is now part way through writing.
+        await asyncio.sleep(0.05)
+        config.update(2, prefix="?")
+        await config.close()
+
+        assert [args[0] for args in config.bot.pool.writes] == [[1], [2]]
+        assert not config._dirty
+
+    asyncio.run(main())
+
+
+def test_cancelled_flush_keeps_its_changes():
+    async def main():
+        config = make_config()
+        config.update(1, prefix="!")
+
+        flush = asyncio.ensure_future(config.flush())
+        await asyncio.sleep(0.05)
+        flush.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await flush
+
+        assert config._dirty == {1: {"prefix"}}
+
+    asyncio.run(main())
@@ -0,0 +1,27 @@
+import pytest
+
+pytest.importorskip("asyncpg")
+
+from utils.db import InstrumentedPool  # noqa: E402
+from utils.metrics import MetricsRegistry  # noqa: E402
+
+
+def test_statements_are_merged_by_their_normalised_text():
+    pool = InstrumentedPool(None, MetricsRegistry())
+    pool.record("SELECT *\n    FROM tags WHERE id = $1", 0.01, 1)
+    pool.record("SELECT * FROM tags   WHERE id = $1", 0.03, 1)
+
+    [stats] = pool.statements.values()
+    assert stats.query == "SELECT * FROM tags WHERE id = $1"
+    assert stats.calls == 2
+    assert stats.max == 0.03
+
+
+def test_least_recently_run_statements_are_dropped():
+    pool = InstrumentedPool(None, MetricsRegistry(), max_statements=2)
+    pool.record("SELECT 1", 0.01, 1)
+    pool.record("SELECT 2", 0.01, 1)
+    pool.record("SELECT 1", 0.01, 1)
+    pool.record("SELECT 3", 0.01, 1)
+
+    assert [stats.query for stats in pool.top_statements()] == ["SELECT 1", "SELECT 3"]
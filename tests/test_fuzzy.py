@@ -0,0 +1,52 @@
+import random
+import string
+import pytest
+
+Levenshtein = pytest.importorskip("Levenshtein")
+
+from utils.fuzzy import BKTree, FuzzyIndex  # noqa: E402
+
+
+def brute_force(words, query: str, max_distance: float) -> list:
+    found = ((Levenshtein.distance(query, word), word) for word in words)
+    return sorted(entry for entry in found if entry[0] <= max_distance)
+
+
+def test_matches_a_linear_scan():
+    rng = random.Random(0)
+    words = {"".join(rng.choices(string.ascii_lowercase[:6], k=rng.randint(2, 7))) for _ in range(400)}
+    tree = BKTree(words)
+
+    # Removed strings stay in the tree as nodes, they just aren't found.
+    removed = set(rng.sample(sorted(words), 50))
+    for word in removed:
+        tree.remove(word)
+    words -= removed
+
+    # And come back when they're added again.
+    readded = set(rng.sample(sorted(removed), 10))
+    for word in readded:
+        tree.add(word)
+    words |= readded
+
+    assert len(tree) == len(words)
+
+    for _ in range(100):
+        query = "".join(rng.choices(string.ascii_lowercase[:6], k=rng.randint(1, 8)))
+        expected = brute_force(words, query, 2)
+
+        assert tree.search(query, 2) == expected
+        assert tree.top_k(query, 5) == brute_force(words, query, float("inf"))[:5]
+        assert tree.top_k(query, 3, 2) == expected[:3]
+        assert tree.best(query, 2) == (expected[0][1] if expected else None)
+
+
+def test_fuzzy_index_ignores_case_but_keeps_the_original():
+    index = FuzzyIndex(["Ping", "userinfo", "Tag"])
+
+    assert "PING" in index
+    assert index.best("pnig", 2) == "Ping"
+    assert index.top_k("TAGS", 1) == [(1, "Tag")]
+
+    index.remove("ping")
+    assert index.best("ping", 2) is None
@@ -0,0 +1,45 @@
+import io
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+from utils.headers import ProbeError, probe  # noqa: E402
+
+
+def encode(format: str, size=(300, 200), frames: int = 1, **params) -> bytes:
+    images = [Image.new("RGB", size, (i * 40, 0, 0)) for i in range(frames)]
+    buffer = io.BytesIO()
+    images[0].save(buffer, format, save_all=frames > 1, append_images=images[1:], **params)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("format, params, expected", [
+    ("png", {}, "png"),
+    ("gif", {}, "gif"),
+    ("jpeg", {}, "jpeg"),
+    ("jpeg", {"progressive": True}, "jpeg"),
+    ("webp", {"lossless": True}, "webp"),
+    ("webp", {"quality": 80}, "webp"),
+])
+def test_reads_the_size_of_still_images(format, params, expected):
+    info = probe(encode(format, **params))
+
+    assert (info.format, info.width, info.height, info.animated) == (expected, 300, 200, False)
+
+
+@pytest.mark.parametrize("format", ["png", "gif", "webp"])
+def test_spots_animated_images(format):
+    info = probe(encode(format, frames=3, loop=0))
+
+    assert (info.width, info.height, info.animated) == (300, 200, True)
+
+
+def test_turns_away_what_it_cannot_read():
+    with pytest.raises(ProbeError, match="png, jpeg, gif and webp"):
+        probe(encode("bmp"))
+
+    with pytest.raises(ProbeError, match="broken"):
+        probe(encode("png")[:20])
+
+    with pytest.raises(ProbeError, match="broken"):
+        probe(b"\xff\xd8\xff\xe0" + b"\x00" * 4)
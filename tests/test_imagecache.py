@@ -0,0 +1,72 @@
+import asyncio
+import os
+import types
+
+from utils.imagecache import ResultCache
+from utils.metrics import MetricsRegistry
+
+
+def make_cache(**kwargs) -> ResultCache:
+    bot = types.SimpleNamespace(cluster=types.SimpleNamespace(cluster_id=0), metrics=MetricsRegistry())
+    return ResultCache(bot, **kwargs)
+
+
+def test_key_tells_apart_what_the_output_depends_on():
+    key = ResultCache.key
+
+    assert key("swirl", b"image", degrees=90) == key("swirl", b"image", degrees=90)
+    assert key("blur", b"a", size=1, strength=2) == key("blur", b"a", strength=2, size=1)
+
+    assert key("swirl", b"image") != key("chroma", b"image")
+    assert key("swirl", b"image", degrees=90) != key("swirl", b"image", degrees=180)
+    # Lengths are part of the hash so moving bytes between arguments isn't the same input.
+    assert key("facetime", b"ab", b"c") != key("facetime", b"a", b"bc")
+    assert key("ahb", b"text") != key("ahb", "text")
+
+
+def test_outputs_move_to_disk_and_out_again_least_recently_used_first(tmp_path):
+    async def main():
+        cache = make_cache(max_bytes=10, disk_path=str(tmp_path), max_disk_bytes=12)
+        await cache.start()
+        directory = tmp_path / "cluster-0"
+
+        await cache.put("a", b"a" * 6)
+        await cache.put("b", b"b" * 6)
+        assert list(cache._memory) == ["b"]
+        assert os.listdir(directory) == ["a"]
+
+        # Back in memory from disk, which pushes b out in turn.
+        assert await cache.get("a") == b"a" * 6
+        assert list(cache._memory) == ["a"]
+        assert sorted(os.listdir(directory)) == ["a", "b"]
+
+        # The disk only holds two, the least recently used goes.
+        await cache.put("c", b"c" * 6)
+        await cache.put("d", b"d" * 6)
+        assert list(cache._disk) == ["a", "c"]
+        assert sorted(os.listdir(directory)) == ["a", "c"]
+        assert await cache.get("b") is None
+
+        assert cache.hits.get("disk") == 1
+        assert cache.misses.get() == 1
+
+    asyncio.run(main())
+
+
+def test_start_picks_up_what_the_last_run_left(tmp_path):
+    async def main():
+        directory = tmp_path / "cluster-0"
+        directory.mkdir()
+        (directory / "old").write_bytes(b"o" * 4)
+        (directory / "half.tmp").write_bytes(b"t")
+
+        cache = make_cache(max_bytes=4, disk_path=str(tmp_path))
+        await cache.put("new", b"n" * 4)
+        await cache.put("newer", b"n" * 4)
+        await cache.start()
+
+        assert list(cache._disk) == ["old", "new"]
+        assert cache._disk_bytes == 8
+        assert await cache.get("old") == b"o" * 4
+
+    asyncio.run(main())
@@ -0,0 +1,60 @@
+import asyncio
+import signal
+import time
+import types
+import pytest
+
+pytest.importorskip("discord")
+# Workers import the whole utils package, so everything it needs has to be installed.
+pytest.importorskip("utils.utils")
+
+from utils.images import SHARE_THRESHOLD, ImagePool, ImageTimeout  # noqa: E402
+from utils.metrics import MetricsRegistry  # noqa: E402
+
+
+def test_timed_out_worker_is_killed_without_stopping_the_loop():
+    async def main():
+        loop = asyncio.get_running_loop()
+        stopped = asyncio.Event()
+        # What discord.py's Client.run() does, workers mustn't end up stopping the loop.
+        loop.add_signal_handler(signal.SIGTERM, stopped.set)
+
+        pool = ImagePool(types.SimpleNamespace(metrics=MetricsRegistry()), workers=1, timeout=0.5)
+        pool.start()
+        worker, = pool._workers
+
+        try:
+            with pytest.raises(ImageTimeout):
+                await pool.run(time.sleep, 30)
+
+            await asyncio.to_thread(worker.process.join, 5)
+            assert not worker.process.is_alive()
+
+            # Gives a signal written to the loop's wakeup fd the chance to be handled.
+            await asyncio.sleep(0.2)
+            assert not stopped.is_set()
+            assert loop.is_running()
+        finally:
+            loop.remove_signal_handler(signal.SIGTERM)
+            await pool.close()
+            if worker.process.is_alive():
+                worker.process.kill()
+
+    asyncio.run(main())
+
+
+def test_big_bytes_go_through_shared_memory_both_ways():
+    async def main():
+        pool = ImagePool(types.SimpleNamespace(metrics=MetricsRegistry()), workers=2, timeout=30)
+
+        try:
+            data = [bytes([i]) * (SHARE_THRESHOLD + i) for i in range(6)]
+            results = await asyncio.gather(*(pool.run(bytes.upper, item) for item in data))
+            assert results == [item.upper() for item in data]
+
+            # Small results come back in the message itself.
+            assert await pool.run(len, b"abc") == 3
+        finally:
+            await pool.close()
+
+    asyncio.run(main())
@@ -0,0 +1,45 @@
+import random
+
+from utils.leaderboard import Leaderboard
+
+
+def expected_order(scores: dict) -> list:
+    return sorted(scores.items(), key=lambda entry: (-entry[1], entry[0]))
+
+
+def test_matches_a_sorted_list_through_random_changes():
+    rng = random.Random(0)
+    board = Leaderboard(bucket_size=4)
+    board.load((user_id, rng.randint(0, 20)) for user_id in range(30))
+    scores = dict(board.scores)
+
+    for _ in range(500):
+        user_id = rng.randrange(40)
+        roll = rng.random()
+
+        if roll < 0.6:
+            scores[user_id] = rng.randint(0, 20)
+            board.set(user_id, scores[user_id])
+        elif roll < 0.9:
+            scores[user_id] = scores.get(user_id, 0) + 1
+            assert board.increment(user_id) == scores[user_id]
+        else:
+            scores.pop(user_id, None)
+            board.remove(user_id)
+
+        order = expected_order(scores)
+        assert board.top(len(board) + 5) == order
+        assert board.page(7, 5) == order[7:12]
+
+        for rank, (other, _) in enumerate(order, 1):
+            assert board.rank(other) == rank
+
+
+def test_around_clamps_at_the_top():
+    board = Leaderboard()
+    board.load([(1, 50), (2, 40), (3, 40), (4, 10)])
+
+    assert board.around(1) == [(1, 1, 50), (2, 2, 40), (3, 3, 40)]
+    assert board.around(3, 1) == [(2, 2, 40), (3, 3, 40), (4, 4, 10)]
+    assert board.rank(5) is None
+    assert board.around(5) == []
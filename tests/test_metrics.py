@@ -0,0 +1,80 @@
+import asyncio
+import time
+import types
+import pytest
+
+commands = pytest.importorskip("discord.ext.commands")
+
+from discord.ext.commands.view import StringView  # noqa: E402
+from utils.metrics import MetricsRegistry, CommandMetrics  # noqa: E402
+
+
+def make_context(bot, content: str):
+    message = types.SimpleNamespace(content=content, guild=None, author=None, channel=None, _state=None)
+    ctx = commands.Context(prefix="!", view=StringView(content), bot=bot, message=message)
+    ctx.timings = {"created": time.perf_counter()}
+    ctx.send_time = 0.0
+    return ctx
+
+
+def test_group_callbacks_stay_out_of_the_subcommand_phases():
+    async def main():
+        bot = commands.Bot(command_prefix="!")
+        hooked = []
+
+        @bot.before_invoke
+        async def before(ctx):
+            hooked.append(ctx.command.name)
+
+        @bot.group()
+        async def parent(ctx):
+            await asyncio.sleep(0.2)
+
+        @parent.command()
+        async def child(ctx, value: int):
+            pass
+
+        metrics = CommandMetrics(bot, MetricsRegistry())
+
+        ctx = make_context(bot, "parent child 1")
+        ctx.view.get_word()
+        ctx.invoked_with = "parent"
+        ctx.command = parent
+        await parent.invoke(ctx)
+        await metrics.on_command_completion(ctx)
+
+        # The hook set before the metrics still runs, for the group and the subcommand.
+        assert hooked == ["parent", "child"]
+
+        phases = {phase: series.sum for (name, phase), series in metrics.latency.series.items()}
+        assert phases["total"] >= 0.2
+        assert phases["checks"] < 0.1
+
+    asyncio.run(main())
+
+
+def test_help_running_checks_leaves_the_timings_alone():
+    async def main():
+        bot = commands.Bot(command_prefix="!")
+
+        @bot.command()
+        async def other(ctx):
+            pass
+
+        @bot.command()
+        async def info(ctx):
+            pass
+
+        CommandMetrics(bot, MetricsRegistry())
+
+        ctx = make_context(bot, "info")
+        ctx.view.get_word()
+        ctx.command = info
+        await info.prepare(ctx)
+        checked = ctx.timings["checked"]
+
+        # Like the help command filtering what it shows, from inside the callback.
+        assert await other.can_run(ctx)
+        assert ctx.timings["checked"] == checked
+
+    asyncio.run(main())
@@ -0,0 +1,102 @@
+import asyncio
+import json
+import types
+import pytest
+
+asyncpg = pytest.importorskip("asyncpg")
+
+from utils.counters import CounterService  # noqa: E402
+from utils.leaderboard import Leaderboard  # noqa: E402
+from utils.metrics import MetricsRegistry  # noqa: E402
+from utils.notify import CacheListener  # noqa: E402
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+
+    async def add_listener(self, channel, callback):
+        pass
+
+    async def fetchval(self, query, *, timeout=None):
+        return 1
+
+    def is_closed(self):
+        return self.closed
+
+    def terminate(self):
+        self.closed = True
+
+    async def close(self):
+        self.closed = True
+
+
+def test_listener_keeps_reconnecting_after_unexpected_errors(monkeypatch):
+    attempts = []
+
+    async def connect(**kwargs):
+        attempts.append(kwargs)
+        if len(attempts) == 1:
+            raise asyncio.TimeoutError()
+        return FakeConnection()
+
+    monkeypatch.setattr(asyncpg, "connect", connect)
+
+    async def main():
+        resyncs = []
+
+        async def resync_caches():
+            resyncs.append(None)
+            if len(resyncs) == 1:
+                raise RuntimeError("the cache warm up query failed")
+
+        bot = types.SimpleNamespace(loop=asyncio.get_running_loop(), resync_caches=resync_caches)
+        listener = CacheListener(bot, {}, health_check_interval=60.0)
+        # Like do_prep timing out waiting for LISTEN, the caches have to be resynced once it's in place.
+        listener._resync_pending = True
+        listener.start()
+
+        try:
+            # Connect times out, then the resync raises, the third attempt gets through.
+            await asyncio.wait_for(listener.listening.wait(), 10)
+            while len(attempts) < 3 or listener._resync_pending:
+                assert not listener._task.done()
+                await asyncio.sleep(0.05)
+
+            assert len(resyncs) == 2
+        finally:
+            await listener.close()
+
+    asyncio.run(main())
+
+
+def cookies_payload(user_id: int, cookies: int) -> str:
+    row = {"user_id": user_id, "cookies": cookies}
+    return json.dumps({"table": "cookies", "op": "UPDATE", "new": row, "old": row})
+
+
+def test_a_flush_is_not_counted_twice_once_its_row_is_committed():
+    async def main():
+        loop = asyncio.get_running_loop()
+        bot = types.SimpleNamespace(loop=loop, metrics=MetricsRegistry(), cookie_leaderboard=Leaderboard(),
+                                    pool=types.SimpleNamespace(backend_pids={42}))
+        bot.counters = CounterService(bot)
+        listener = CacheListener(bot, {})
+        scores = []
+
+        async def flusher(user_ids, amounts):
+            # Another process's change lands first, then this flush's own notification arrives before it returns.
+            listener._on_notification(None, 7, CacheListener.CHANNEL, cookies_payload(1, 10))
+            scores.append(bot.cookie_leaderboard.scores[1])
+            listener._on_notification(None, 42, CacheListener.CHANNEL, cookies_payload(1, 13))
+            scores.append(bot.cookie_leaderboard.scores[1])
+            listener._on_notification(None, 7, CacheListener.CHANNEL, cookies_payload(1, 14))
+            scores.append(bot.cookie_leaderboard.scores[1])
+
+        bot.counters.register("cookies", flusher)
+        bot.counters.add("cookies", 1, 3)
+        await bot.counters.flush()
+
+        assert scores == [13, 13, 14]
+
+    asyncio.run(main())
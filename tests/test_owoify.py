@@ -0,0 +1,27 @@
+import pytest
+
+# utils.utils needs discord.py and the rest of the bot's dependencies.
+_owoify = pytest.importorskip("utils.utils")._owoify
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("ruſ", "ruwus"),
+    ("thİs", "dis"),
+    ("thıng", "ding"),
+    ("THE ruSSIAN", "THUWU ruwusSIAN"),
+    ("yay hello", "yawy hewwo"),
+])
+def test_owoify_handles_unicode_case_folds(text, expected):
+    assert _owoify(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    # One pass over the text, 'er' can't match inside the 'the' that was already replaced.
+    ("There", "Thuwure"),
+    ("there", "thuwure"),
+    ("THERE", "THUWURE"),
+    ("error", "ewror"),
+    ("throw", "throwo"),
+])
+def test_owoify_replaces_overlapping_patterns_in_one_pass(text, expected):
+    assert _owoify(text) == expected
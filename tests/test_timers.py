@@ -0,0 +1,120 @@
+import asyncio
+import time
+import types
+import pytest
+
+pytest.importorskip("asyncpg")
+
+from utils.timers import CANCELLED, MuteTimers, TimerManager  # noqa: E402
+
+
+class FakePool:
+    def __init__(self):
+        self.rows = {}
+        self.deleted = []
+        self.fail = False
+
+    async def fetch(self, sql, *args):
+        return self.rows.get(sql, [])
+
+    async def execute(self, sql, *args):
+        if self.fail:
+            raise OSError("connection lost")
+        self.deleted.append(args)
+
+
+def make_manager(horizon=3600.0):
+    bot = types.SimpleNamespace(pool=FakePool(), shard_partition=(1, [0]), get_channel=lambda channel_id: object())
+    return TimerManager(bot, horizon=horizon)
+
+
+def mute_row(guild_id, member_id, end_time):
+    return {"guild_id": guild_id, "member_id": member_id, "end_time": int(end_time)}
+
+
+def test_create_only_keeps_timers_within_the_horizon():
+    timers = make_manager()
+    now = time.time()
+
+    timers.create("mute", (1, 2), now + 60)
+    timers.create("mute", (1, 3), now + 7200)
+
+    assert timers.get("mute", (1, 2)) is not None
+    assert timers.get("mute", (1, 3)) is None
+
+
+def test_pop_due_is_in_order_and_skips_cancelled_and_rescheduled():
+    timers = make_manager()
+    now = time.time()
+
+    timers.create("mute", (1, 1), now - 3)
+    timers.create("mute", (1, 2), now - 1)
+    timers.create("mute", (1, 3), now - 2)
+    timers.create("tempban", 7, now - 5)
+    timers.cancel("mute", (1, 2))
+    # Rescheduled into the future, the old heap entry has to be skipped.
+    timers.create("mute", (1, 3), now + 60)
+
+    due = timers._pop_due(now)
+
+    assert [(timer.event, timer.key) for timer in due] == [("tempban", 7), ("mute", (1, 1))]
+    assert timers.get("mute", (1, 3)).expires == now + 60
+    assert timers._pending_deletes["mute"][(1, 2)] == CANCELLED
+
+
+def test_load_skips_scheduled_and_deleted_rows():
+    timers = make_manager()
+    now = time.time()
+
+    timers.create("mute", (1, 1), now + 10)
+    timers._pending_deletes["mute"][(1, 2)] = now + 20
+    timers.bot.pool.rows[MuteTimers.load_sql] = [
+        mute_row(1, 1, now + 30),
+        mute_row(1, 2, now + 20),
+        mute_row(1, 3, now + 40),
+    ]
+
+    asyncio.run(timers._load(now + timers.horizon))
+
+    assert timers.get("mute", (1, 1)).expires == now + 10
+    assert timers.get("mute", (1, 2)) is None
+    assert timers.get("mute", (1, 3)).expires == int(now + 40)
+    assert timers._loaded_until == now + timers.horizon
+
+
+def test_mute_recreated_outside_the_horizon_survives_a_failed_delete():
+    timers = make_manager(horizon=60.0)
+    now = time.time()
+
+    # The old mute fired, but its row couldn't be deleted.
+    timers._pending_deletes["mute"][(1, 2)] = now - 5
+    timers.bot.pool.fail = True
+    asyncio.run(timers._flush_deletes())
+    assert (1, 2) in timers._pending_deletes["mute"]
+
+    # Muted again for longer than the horizon, so it's only picked up by a later load.
+    timers.create("mute", (1, 2), now + 120)
+    assert timers.get("mute", (1, 2)) is None
+
+    timers.bot.pool.rows[MuteTimers.load_sql] = [mute_row(1, 2, now + 120)]
+    asyncio.run(timers._load(now + 180))
+
+    assert timers.get("mute", (1, 2)).expires == int(now + 120)
+
+
+def test_flush_deletes_keeps_bounds_that_changed_during_the_write():
+    timers = make_manager()
+    pending = timers._pending_deletes["tempban"]
+    pending.update({1: 10.0, 2: 20.0})
+
+    original = timers.bot.pool.execute
+
+    async def execute(sql, *args):
+        await original(sql, *args)
+        pending[2] = CANCELLED
+
+    timers.bot.pool.execute = execute
+    asyncio.run(timers._flush_deletes())
+
+    assert timers.bot.pool.deleted == [([1, 2],)]
+    assert pending == {2: CANCELLED}
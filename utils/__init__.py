@@ -1,4 +1,25 @@
 from .subclasses import MyBot, CustomContext
 from .paginator import *
 from .utils import *
-from .logger import *
\ No newline at end of file
+from .logger import *
+from .timers import Timer, TimerManager
+from .config import GuildConfig, GuildSettings
+from .notify import CacheListener
+from .cluster import ClusterInfo, shard_ranges
+from .metrics import MetricsRegistry, Counter, Gauge, Histogram, CommandMetrics
+from .lag import LagMonitor
+from .db import InstrumentedPool, StatementStats
+from .queries import Queries, QueryConnection, STATEMENTS
+from .migrations import MigrationRunner, Migration
+from .leaderboard import Leaderboard
+from .counters import CounterService
+from .analytics import UsageRecorder
+from .fuzzy import BKTree, FuzzyIndex
+from .tags import TagCache, GuildTags
+from .catalogue import HelpCatalogue, CommandEntry
+from .images import ImagePool, ImageWorkerError, ImageTimeout
+from .imagecache import ResultCache, uncached
+from .assets import AssetFetcher, AssetError
+from .templates import TemplateRegistry, load_templates
+from .headers import ImageInfo, ProbeError, probe
+from .ingest import ImageIngest, IngestLimits, IngestError
\ No newline at end of file
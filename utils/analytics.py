@@ -0,0 +1,142 @@
+"""
+Records every command invocation and writes them to the database in batches.
+Copyright (C) 2021 kal-byte
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+import collections
+import datetime
+import logging
+import time
+import typing
+from .logger import create_logger
+
+
+logger = create_logger("analytics", logging.INFO)
+
+TABLE = "command_invocations"
+COLUMNS = ("used_at", "command", "guild_id", "shard_id", "latency", "failed", "error")
+
+
+def _month_start(moment: datetime.datetime) -> datetime.date:
+    return datetime.date(moment.year, moment.month, 1)
+
+
+def _next_month(month: datetime.date) -> datetime.date:
+    return datetime.date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+class UsageRecorder:
+    """Keeps a tuple per command invocation in a ring buffer and copies them into `command_invocations`.
+
+    Recording is a deque append so it costs the command nothing, the buffer
+    is written out with `copy_records_to_table` every `flush_interval`
+    seconds. If the database can't keep up the oldest records are dropped
+    once `capacity` is reached. The table is partitioned by month, the
+    partitions are created as records for a new month come in."""
+
+    def __init__(self, bot, *, capacity: int = 50_000, flush_interval: float = 10.0, batch_size: int = 5000):
+        self.bot = bot
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+
+        self.buffer = collections.deque(maxlen=capacity)
+        self._partitions = set()
+        self._lock = asyncio.Lock()
+        self._task = None
+
+        self.dropped = bot.metrics.counter("analytics_records_dropped_total",
+                                           "Invocation records dropped because the buffer was full.")
+        self.written = bot.metrics.counter("analytics_records_written_total", "Invocation records written out.")
+
+        bot.add_listener(self.on_command_completion)
+        bot.add_listener(self.on_command_error)
+
+    def record(self, ctx, error: Exception = None):
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped.inc()
+
+        timings = ctx.timings
+        latency = timings.get("finished", time.perf_counter()) - timings["created"]
+
+        self.buffer.append((
+            datetime.datetime.utcnow(),
+            ctx.command.qualified_name,
+            ctx.guild.id if ctx.guild else None,
+            ctx.guild.shard_id if ctx.guild else None,
+            latency,
+            error is not None,
+            type(getattr(error, "original", error)).__name__ if error is not None else None,
+        ))
+
+    async def on_command_completion(self, ctx):
+        self.record(ctx)
+
+    async def on_command_error(self, ctx, error):
+        if ctx.command is not None:
+            self.record(ctx, error)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = self.bot.loop.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            # Waits out a flush that's already running, cancelling it part way would lose its batch.
+            async with self._lock:
+                self._task.cancel()
+                self._task = None
+
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception(f"Failed to write out {len(self.buffer)} invocation records while closing.")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to write out invocation records.")
+
+    async def _ensure_partitions(self, connection, records: typing.List[tuple]):
+        for month in {_month_start(record[0]) for record in records} - self._partitions:
+            await connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {TABLE}_{month:%Y_%m} PARTITION OF {TABLE} "
+                f"FOR VALUES FROM ('{month}') TO ('{_next_month(month)}');"
+            )
+            self._partitions.add(month)
+
+    async def flush(self):
+        async with self._lock:
+            while self.buffer:
+                batch = [self.buffer.popleft() for _ in range(min(self.batch_size, len(self.buffer)))]
+
+                try:
+                    async with self.bot.pool.acquire() as connection:
+                        await self._ensure_partitions(connection, batch)
+
+                        start = time.perf_counter()
+                        await connection.copy_records_to_table(TABLE, records=batch, columns=COLUMNS)
+                        self.bot.pool.record(f"COPY {TABLE}", time.perf_counter() - start, len(batch))
+                except Exception:
+                    # Put back in front of anything recorded since, they're retried next flush.
+                    self.buffer.extendleft(reversed(batch))
+                    raise
+
+                self.written.inc(amount=len(batch))
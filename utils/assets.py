@@ -0,0 +1,128 @@
+"""
+Downloads avatars, emojis and attachments once and shares them between everything asking for them.
+Copyright (C) 2021 kal-byte
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+import collections
+import typing
+import aiohttp
+import humanize
+from discord.ext import commands
+
+
+class AssetError(commands.BadArgument):
+    """An asset couldn't be downloaded, the message is fine to show to whoever asked for it."""
+
+
+class AssetFetcher:
+    """The bytes behind asset URLs, with the most recently used kept up to `max_bytes`.
+
+    Discord's avatar and emoji URLs have the asset's hash or id in them, so
+    a URL always points at the same bytes and can be cached without ever
+    being checked again. Concurrent fetches of the same URL share the one
+    download. Downloads are read in chunks and given up on once they go
+    past `max_download_bytes`."""
+
+    def __init__(self, bot, *, max_bytes: int = 32 * 1024 * 1024, max_download_bytes: int = 8 * 1024 * 1024):
+        self.bot = bot
+        self.max_bytes = max_bytes
+        self.max_download_bytes = max_download_bytes
+
+        self._assets: "collections.OrderedDict[str, bytes]" = collections.OrderedDict()
+        self._bytes = 0
+        self._downloading: typing.Dict[str, asyncio.Future] = {}
+
+        self.hits = bot.metrics.counter("asset_cache_hits_total", "Asset fetches served from memory.")
+        self.misses = bot.metrics.counter("asset_cache_misses_total", "Asset fetches that were downloaded.")
+        self.coalesced = bot.metrics.counter("asset_fetches_coalesced_total",
+                                             "Asset fetches that waited on a download already running.")
+        bot.metrics.gauge("asset_cache_bytes", "Bytes of assets held in memory.", callback=lambda: self._bytes)
+
+    async def _download(self, url: str) -> bytes:
+        try:
+            async with self.bot.session.get(url) as response:
+                if response.status != 200:
+                    raise AssetError(f"I couldn't download that image, Discord said {response.status}.")
+
+                too_big = AssetError(f"That image is too big, I can take up to "
+                                     f"{humanize.naturalsize(self.max_download_bytes, binary=True)}.")
+
+                if (response.content_length or 0) > self.max_download_bytes:
+                    raise too_big
+
+                # The length header can't be trusted to be there or be right.
+                chunks, size = [], 0
+                async for chunk in response.content.iter_chunked(64 * 1024):
+                    size += len(chunk)
+                    if size > self.max_download_bytes:
+                        raise too_big
+                    chunks.append(chunk)
+
+                return b"".join(chunks)
+        except aiohttp.ClientError:
+            raise AssetError("I couldn't download that image, try again in a bit.") from None
+
+    def _downloaded(self, url: str, store: bool, future: asyncio.Future):
+        del self._downloading[url]
+
+        if not store or future.cancelled() or future.exception() is not None:
+            return
+
+        data = future.result()
+        if len(data) > self.max_bytes or url in self._assets:
+            return
+
+        self._assets[url] = data
+        self._bytes += len(data)
+
+        while self._bytes > self.max_bytes:
+            _, old = self._assets.popitem(last=False)
+            self._bytes -= len(old)
+
+    async def fetch(self, url: str, *, store: bool = True) -> bytes:
+        """The bytes at `url`, `store=False` for one offs that shouldn't push anything else out."""
+
+        try:
+            data = self._assets[url]
+        except KeyError:
+            pass
+        else:
+            self._assets.move_to_end(url)
+            self.hits.inc()
+            return data
+
+        future = self._downloading.get(url)
+        if future is None:
+            self.misses.inc()
+            future = self._downloading[url] = asyncio.ensure_future(self._download(url))
+            future.add_done_callback(lambda f: self._downloaded(url, store, f))
+        else:
+            self.coalesced.inc()
+
+        # Shielded so one caller giving up doesn't cancel the download for everyone else waiting on it.
+        return await asyncio.shield(future)
+
+    async def fetch_many(self, *urls: str, store: bool = True, concurrency: int = 8) -> typing.List[bytes]:
+        """The bytes at every URL in the same order, at most `concurrency` downloads at once."""
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(url):
+            async with semaphore:
+                return await self.fetch(url, store=store)
+
+        return await asyncio.gather(*map(fetch, urls))
@@ -0,0 +1,140 @@
+"""
+Everything the help command and the dashboard show about commands, worked out once per set of cogs.
+Copyright (C) 2021 kal-byte
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import collections
+import typing
+from discord.ext import commands
+
+
+class CommandEntry:
+    """What help shows for one command, `help` still has `{prefix}` in it."""
+
+    __slots__ = ("name", "qualified_name", "display_name", "signature", "help", "short_doc")
+
+    def __init__(self, command: commands.Command):
+        aliases = f" | {' | '.join(command.aliases)}" if command.aliases else ""
+
+        self.name = command.name
+        self.qualified_name = command.qualified_name
+        self.display_name = command.qualified_name + aliases
+        self.signature = command.signature
+        self.help = command.help or ""
+        self.short_doc = command.short_doc
+
+
+class HelpCatalogue:
+    """Sorted visible commands per category and group, with their help fields rendered per prefix.
+
+    Everything is built the first time it's asked for and kept until
+    `invalidate` is called, which the bot does whenever a cog is added or
+    removed (so loading, unloading and reloading extensions)."""
+
+    def __init__(self, bot, *, max_rendered: int = 256):
+        self.bot = bot
+        self.max_rendered = max_rendered
+
+        self._categories: typing.Optional[typing.Dict[str, typing.List[CommandEntry]]] = None
+        self._titles: typing.Optional[typing.List[str]] = None
+        self._groups: typing.Dict[str, typing.List[CommandEntry]] = {}
+        self._dashboard: typing.Optional[typing.List[dict]] = None
+        self._rendered = collections.OrderedDict()
+
+    def invalidate(self):
+        self._categories = None
+        self._titles = None
+        self._groups.clear()
+        self._dashboard = None
+        self._rendered.clear()
+
+    @staticmethod
+    def _visible(cmds: typing.Iterable[commands.Command]) -> typing.List[CommandEntry]:
+        return [CommandEntry(c) for c in sorted(cmds, key=lambda c: c.name) if not c.hidden]
+
+    def _build(self):
+        self._categories = {}
+        self._titles = []
+
+        for name, cog in self.bot.cogs.items():
+            if not hasattr(cog, "show_name"):
+                continue
+
+            entries = self._visible(cog.get_commands())
+            self._categories[name.lower()] = entries
+            if entries:
+                self._titles.append(cog.show_name)
+
+    @property
+    def titles(self) -> typing.List[str]:
+        """The show names of the categories that have a visible command."""
+
+        if self._titles is None:
+            self._build()
+
+        return self._titles
+
+    def category(self, cog_name: str) -> typing.List[CommandEntry]:
+        if self._categories is None:
+            self._build()
+
+        return self._categories.get(cog_name.lower(), [])
+
+    def group(self, group: commands.Group) -> typing.List[CommandEntry]:
+        try:
+            return self._groups[group.qualified_name]
+        except KeyError:
+            entries = self._groups[group.qualified_name] = self._visible(group.commands)
+            return entries
+
+    def _render(self, key: tuple, entries: typing.List[CommandEntry], name) -> typing.List[typing.Tuple[str, str]]:
+        try:
+            self._rendered.move_to_end(key)
+            return self._rendered[key]
+        except KeyError:
+            pass
+
+        prefix = key[-1]
+        fields = [(f"{prefix}{name(entry)} {entry.signature}", entry.help.format(prefix=prefix) or "No help given...")
+                  for entry in entries]
+
+        self._rendered[key] = fields
+        if len(self._rendered) > self.max_rendered:
+            self._rendered.popitem(last=False)
+
+        return fields
+
+    def category_fields(self, cog_name: str, prefix: str) -> typing.List[typing.Tuple[str, str]]:
+        """(signature, help) embed fields for every command in a category."""
+
+        return self._render(("cog", cog_name.lower(), prefix), self.category(cog_name), lambda e: e.name)
+
+    def group_fields(self, group: commands.Group, prefix: str) -> typing.List[typing.Tuple[str, str]]:
+        """(signature, help) embed fields for every subcommand of a group."""
+
+        return self._render(("group", group.qualified_name, prefix), self.group(group), lambda e: e.display_name)
+
+    def dashboard(self) -> typing.List[dict]:
+        """The top level commands with help that the dashboard lists."""
+
+        if self._dashboard is None:
+            self._dashboard = [
+                {"command": f"tb!{command.qualified_name} {command.signature}", "help": command.short_doc}
+                for command in self.bot.commands
+                if command.help and command.cog and hasattr(command.cog, "show_name")
+            ]
+
+        return self._dashboard
@@ -0,0 +1,121 @@
+"""
+Describes which shards this process runs when the bot is split into clusters by launcher.py.
+Copyright (C) 2021 kal-byte
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import typing
+from discord.ext.ipc import Client
+from .logger import create_logger
+
+
+logger = create_logger("cluster", logging.INFO)
+
+IPC_BASE_PORT = 8765
+
+
+def shard_ranges(shard_count: int, cluster_count: int) -> typing.List[typing.List[int]]:
+    """Splits the shards into `cluster_count` contiguous ranges of (nearly) equal size."""
+
+    per_cluster, extra = divmod(shard_count, cluster_count)
+    ranges, start = [], 0
+
+    for cluster_id in range(cluster_count):
+        end = start + per_cluster + (cluster_id < extra)
+        ranges.append(list(range(start, end)))
+        start = end
+
+    return ranges
+
+
+class ClusterInfo:
+    """What this process is responsible for, read from the environment the launcher sets.
+
+    Without the launcher everything defaults to a single cluster that runs
+    every shard, which is how the bot was always ran."""
+
+    def __init__(self,
+                 cluster_id: int = 0,
+                 cluster_count: int = 1,
+                 shard_ids: typing.Optional[typing.List[int]] = None,
+                 shard_count: typing.Optional[int] = None):
+        self.cluster_id = cluster_id
+        self.cluster_count = cluster_count
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+
+        self._clients = {}
+
+    @classmethod
+    def from_env(cls):
+        shard_ids = os.environ.get("TRAVIS_SHARD_IDS")
+        shard_count = os.environ.get("TRAVIS_SHARD_COUNT")
+
+        return cls(
+            int(os.environ.get("TRAVIS_CLUSTER_ID", 0)),
+            int(os.environ.get("TRAVIS_CLUSTER_COUNT", 1)),
+            [int(shard_id) for shard_id in shard_ids.split(",")] if shard_ids else None,
+            int(shard_count) if shard_count else None,
+        )
+
+    def __repr__(self):
+        return f"<ClusterInfo cluster_id={self.cluster_id} cluster_count={self.cluster_count} shard_ids={self.shard_ids}>"
+
+    @property
+    def is_main(self) -> bool:
+        """The main cluster is the one that answers for every cluster over IPC."""
+
+        return self.cluster_id == 0
+
+    @staticmethod
+    def ipc_port(cluster_id: int) -> int:
+        return IPC_BASE_PORT + cluster_id
+
+    async def request_peers(self, endpoint: str, secret_key: str, **kwargs) -> typing.List[typing.Any]:
+        """Makes the same IPC request to every other cluster at once.
+        Clusters that don't answer (restarting for example) are left out.
+
+        The IPC server only listens on localhost, so every cluster has to
+        run on the same machine."""
+
+        async def request(cluster_id):
+            try:
+                client = self._clients[cluster_id]
+            except KeyError:
+                client = self._clients[cluster_id] = Client("localhost", self.ipc_port(cluster_id), secret_key)
+
+            # The client hands back the JSON text the other cluster's route returned.
+            response = json.loads(await client.request(endpoint, **kwargs))
+            if isinstance(response, dict) and "error" in response:
+                raise RuntimeError(f"{response['status']}: {response['error']}")
+
+            return response
+
+        peers = [cluster_id for cluster_id in range(self.cluster_count) if cluster_id != self.cluster_id]
+        responses = await asyncio.gather(*map(request, peers), return_exceptions=True)
+
+        answers = []
+        for cluster_id, response in zip(peers, responses):
+            if isinstance(response, Exception):
+                logger.warning(f"Cluster {cluster_id} didn't answer {endpoint}: {response!r}")
+                continue
+
+            answers.append(response)
+
+        return answers
@@ -0,0 +1,220 @@
+"""
+In-memory guild configuration store that writes changes back to the database in batches.
+Copyright (C) 2021 kal-byte
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+import logging
+import typing
+import asyncpg
+from .logger import create_logger
+
+
+logger = create_logger("guild-config", logging.INFO)
+
+
+class GuildSettings:
+    """The settings for a single guild, mirrors a row in guild_settings."""
+
+    __slots__ = ("guild_id", "prefix", "mute_role_id", "log_channel", "owoify", "suggest_commands")
+
+    def __init__(self,
+                 guild_id: int,
+                 prefix: typing.Optional[str] = "tb!",
+                 mute_role_id: typing.Optional[int] = None,
+                 log_channel: typing.Optional[int] = None,
+                 owoify: bool = False,
+                 suggest_commands: bool = False):
+        self.guild_id = guild_id
+        self.prefix = prefix
+        self.mute_role_id = mute_role_id
+        self.log_channel = log_channel
+        self.owoify = owoify
+        self.suggest_commands = suggest_commands
+
+    @classmethod
+    def from_record(cls, record: asyncpg.Record):
+        return cls(record["guild_id"],
+                   record["guild_prefix"],
+                   record["mute_role_id"],
+                   record["log_channel"],
+                   bool(record["owoify"]),
+                   bool(record["suggest_commands"]))
+
+    def __repr__(self):
+        return f"<GuildSettings guild_id={self.guild_id} prefix={self.prefix!r}>"
+
+
+class GuildConfig:
+    """Holds a GuildSettings record for every guild.
+
+    Changes made through `update` are applied in memory straight away and the
+    changed fields get marked dirty, every `flush_interval` seconds every dirty
+    field is written with one statement. Only the fields that changed are
+    written so another cluster's change to a different field isn't undone."""
+
+    # GuildSettings attribute -> guild_settings column
+    FIELDS = {
+        "prefix": "guild_prefix",
+        "mute_role_id": "mute_role_id",
+        "log_channel": "log_channel",
+        "owoify": "owoify",
+        "suggest_commands": "suggest_commands",
+    }
+
+    # Each value comes with whether it changed, rows that don't exist yet are inserted whole.
+    FLUSH_SQL = (
+        "WITH changes AS ("
+        "SELECT * FROM unnest($1::BIGINT[], $2::VARCHAR[], $3::BOOLEAN[], $4::BIGINT[], $5::BOOLEAN[], "
+        "$6::BIGINT[], $7::BOOLEAN[], $8::BOOLEAN[], $9::BOOLEAN[], $10::BOOLEAN[], $11::BOOLEAN[]) "
+        "AS c(guild_id, guild_prefix, set_prefix, mute_role_id, set_mute_role_id, "
+        "log_channel, set_log_channel, owoify, set_owoify, suggest_commands, set_suggest_commands)"
+        "), updated AS ("
+        "UPDATE guild_settings AS g SET "
+        "guild_prefix = CASE WHEN c.set_prefix THEN c.guild_prefix ELSE g.guild_prefix END, "
+        "mute_role_id = CASE WHEN c.set_mute_role_id THEN c.mute_role_id ELSE g.mute_role_id END, "
+        "log_channel = CASE WHEN c.set_log_channel THEN c.log_channel ELSE g.log_channel END, "
+        "owoify = CASE WHEN c.set_owoify THEN c.owoify ELSE g.owoify END, "
+        "suggest_commands = CASE WHEN c.set_suggest_commands THEN c.suggest_commands ELSE g.suggest_commands END "
+        "FROM changes AS c WHERE g.guild_id = c.guild_id "
+        "RETURNING g.guild_id"
+        ") "
+        "INSERT INTO guild_settings(guild_id, guild_prefix, mute_role_id, log_channel, owoify, suggest_commands) "
+        "SELECT guild_id, guild_prefix, mute_role_id, log_channel, owoify, suggest_commands FROM changes "
+        "WHERE guild_id NOT IN (SELECT guild_id FROM updated) "
+        "ON CONFLICT (guild_id) DO NOTHING;"
+    )
+
+    def __init__(self, bot, *, flush_interval: float = 5.0):
+        self.bot = bot
+        self.flush_interval = flush_interval
+
+        self._records: typing.Dict[int, GuildSettings] = {}
+        # guild_id -> the GuildSettings attributes changed since the last flush
+        self._dirty: typing.Dict[int, typing.Set[str]] = {}
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    def __contains__(self, guild_id: int):
+        return guild_id in self._records
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        return iter(self._records.values())
+
+    def get(self, guild_id: int) -> GuildSettings:
+        """Gets the settings of a guild, guilds we don't know of get the defaults."""
+
+        try:
+            return self._records[guild_id]
+        except KeyError:
+            settings = self._records[guild_id] = GuildSettings(guild_id)
+            return settings
+
+    def load(self, records: typing.Iterable[asyncpg.Record]):
+        """Replaces the settings of every given row, pending local changes are kept."""
+
+        for record in records:
+            guild_id = record["guild_id"]
+            settings = GuildSettings.from_record(record)
+
+            current = self._records.get(guild_id)
+            if current is not None:
+                for name in self._dirty.get(guild_id, ()):
+                    setattr(settings, name, getattr(current, name))
+
+            self._records[guild_id] = settings
+            self.bot.invalidate_prefix(guild_id)
+
+    def add(self, guild_id: int) -> GuildSettings:
+        settings = self._records[guild_id] = GuildSettings(guild_id)
+        self._dirty[guild_id] = set(self.FIELDS)
+        self.bot.invalidate_prefix(guild_id)
+
+        return settings
+
+    def remove(self, guild_id: int):
+        self._records.pop(guild_id, None)
+        self._dirty.pop(guild_id, None)
+        self.bot.invalidate_prefix(guild_id)
+
+    def update(self, guild_id: int, **fields) -> GuildSettings:
+        """Updates the given fields of a guilds settings, they get written on the next flush."""
+
+        settings = self.get(guild_id)
+
+        for name, value in fields.items():
+            if name not in self.FIELDS:
+                raise TypeError(f"{name!r} is not a guild setting.")
+
+            setattr(settings, name, value)
+
+        self._dirty.setdefault(guild_id, set()).update(fields)
+
+        if "prefix" in fields:
+            self.bot.invalidate_prefix(guild_id)
+
+        return settings
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = self.bot.loop.create_task(self._flush_loop())
+
+    async def close(self):
+        if self._task is not None:
+            # Waits out a flush that's already running, cancelling it part way would lose its changes.
+            async with self._lock:
+                self._task.cancel()
+                self._task = None
+
+        await self.flush()
+
+    async def flush(self):
+        async with self._lock:
+            if not self._dirty:
+                return
+
+            dirty, self._dirty = self._dirty, {}
+            records = [(self._records[guild_id], fields) for guild_id, fields in dirty.items()
+                       if guild_id in self._records]
+
+            args = [[r.guild_id for r, _ in records]]
+            for name in self.FIELDS:
+                args.append([getattr(r, name) for r, _ in records])
+                args.append([name in fields for _, fields in records])
+
+            try:
+                await self.bot.pool.execute(self.FLUSH_SQL, *args)
+            except BaseException as error:
+                # Whatever went wrong the changes are kept, writing them twice does no harm.
+                for guild_id, fields in dirty.items():
+                    self._dirty.setdefault(guild_id, set()).update(fields)
+
+                if not isinstance(error, (asyncpg.PostgresError, OSError)):
+                    raise
+
+                logger.exception(f"Failed to write {len(records)} guild configs, retrying on the next flush.")
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to flush the guild configs.")
@@ -0,0 +1,121 @@
+"""
+Buffers counter increments in memory and writes them to the database in batches.
+Copyright (C) 2021 kal-byte
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+import logging
+import time
+import typing
+from collections import defaultdict
+from .logger import create_logger
+
+
+logger = create_logger("counters", logging.INFO)
+
+# Takes every key and how much to add to each, in the same order.
+Flusher = typing.Callable[[list, typing.List[int]], typing.Awaitable[typing.Any]]
+
+
+class CounterService:
+    """Named counters that are added to in memory and flushed every `flush_interval` seconds.
+
+    Each counter is flushed with a single statement for every key that
+    changed, anything that fails to flush is kept and tried again next time.
+    Whatever is still pending is flushed when the service is closed. The
+    database value plus `pending` is the up to date count."""
+
+    def __init__(self, bot, *, flush_interval: float = 30.0):
+        self.bot = bot
+        self.flush_interval = flush_interval
+
+        self._flushers: typing.Dict[str, Flusher] = {}
+        self._pending: typing.Dict[str, typing.DefaultDict[typing.Hashable, int]] = {}
+        self._flushing: typing.Dict[str, typing.Dict[typing.Hashable, int]] = {}
+        self._lock = asyncio.Lock()
+        self._task = None
+
+        self.flushed = bot.metrics.counter("counter_increments_flushed_total", "Counter increments written out.",
+                                           ["counter"])
+        self.flush_latency = bot.metrics.histogram("counter_flush_seconds", "Time spent flushing a counter.",
+                                                   ["counter"])
+
+    def register(self, name: str, flusher: Flusher):
+        self._flushers[name] = flusher
+        self._pending[name] = defaultdict(int)
+        self._flushing[name] = {}
+
+    def add(self, name: str, key: typing.Hashable, amount: int = 1):
+        self._pending[name][key] += amount
+
+    def pending(self, name: str, key: typing.Hashable = None) -> int:
+        """What hasn't reached the database yet for a key, or the whole counter without one."""
+
+        if key is None:
+            return sum(self._pending[name].values()) + sum(self._flushing[name].values())
+
+        return self._pending[name].get(key, 0) + self._flushing[name].get(key, 0)
+
+    def settle(self, name: str, key: typing.Hashable):
+        """Stops counting a key that's being flushed as pending, for when its write is known to be committed."""
+
+        self._flushing[name].pop(key, None)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = self.bot.loop.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            # Waits out a flush that's already running, cancelling it part way would lose its batch.
+            async with self._lock:
+                self._task.cancel()
+                self._task = None
+
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to flush the counters.")
+
+    async def flush(self):
+        async with self._lock:
+            for name, flusher in self._flushers.items():
+                if not self._pending[name]:
+                    continue
+
+                # Swapped out first so increments made during the write go into the next batch.
+                batch = self._flushing[name] = self._pending[name]
+                self._pending[name] = defaultdict(int)
+
+                start = time.perf_counter()
+                try:
+                    await flusher(list(batch.keys()), list(batch.values()))
+                except Exception:
+                    for key, amount in batch.items():
+                        self._pending[name][key] += amount
+
+                    logger.exception(f"Failed to flush the {name} counter, {len(batch)} keys will be retried.")
+                else:
+                    self.flushed.inc(name, amount=sum(batch.values()))
+                    self.flush_latency.observe(time.perf_counter() - start, name)
+                finally:
+                    self._flushing[name] = {}
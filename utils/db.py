@@ -0,0 +1,229 @@
+"""
+A facade over the asyncpg pool that keeps statistics on every statement the bot runs.
+Copyright (C) 2021 kal-byte
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import collections
+import functools
+import logging
+import os
+import sys
+import time
+import typing
+import asyncpg
+from .logger import create_logger
+from .metrics import MetricsRegistry
+
+
+logger = create_logger("database", logging.INFO)
+
+# Frames in these files are skipped when looking for who ran a statement.
+_INTERNAL_FILES = {__file__, os.path.join(os.path.dirname(__file__), "queries.py")}
+
+
+@functools.lru_cache(maxsize=2048)
+def normalise_query(query: str) -> str:
+    """Collapses the whitespace in a query so the same statement always gets the same key."""
+
+    return " ".join(query.split())
+
+
+def _call_site() -> str:
+    """The first frame outside of the database helpers, so the slow query log says who ran the statement."""
+
+    frame = sys._getframe(1)
+    while frame is not None and frame.f_code.co_filename in _INTERNAL_FILES:
+        frame = frame.f_back
+
+    if frame is None:
+        return "unknown"
+
+    return f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno} in {frame.f_code.co_name}"
+
+
+def rows_from_status(status: str) -> int:
+    # Statuses look like "INSERT 0 5" or "DELETE 3", the last part is the row count.
+    count = status.rpartition(" ")[2]
+    return int(count) if count.isdigit() else 0
+
+
+class StatementStats:
+    __slots__ = ("query", "calls", "total", "max", "rows")
+
+    def __init__(self, query: str):
+        self.query = query
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.calls if self.calls else 0.0
+
+
+class _PoolAcquireContext:
+    __slots__ = ("pool", "timeout", "connection")
+
+    def __init__(self, pool: "InstrumentedPool", timeout: typing.Optional[float]):
+        self.pool = pool
+        self.timeout = timeout
+        self.connection = None
+
+    async def __aenter__(self) -> asyncpg.Connection:
+        self.connection = await self.pool._acquire(self.timeout)
+        return self.connection
+
+    async def __aexit__(self, *_):
+        connection, self.connection = self.connection, None
+        await self.pool.release(connection)
+
+    def __await__(self):
+        return self.pool._acquire(self.timeout).__await__()
+
+
+class InstrumentedPool:
+    """Wraps an asyncpg.Pool with the same query methods, timing each statement.
+
+    The hot path only adds two perf_counter calls and a couple of dict lookups,
+    call sites are only looked up for statements slower than `slow_query_threshold`.
+    Statistics are kept for the `max_statements` most recently run statements.
+    Anything not wrapped here is passed through to the real pool."""
+
+    def __init__(self, pool: asyncpg.Pool, metrics: MetricsRegistry, *, slow_query_threshold: float = 0.1,
+                 max_statements: int = 1024):
+        self._pool = pool
+        self.slow_query_threshold = slow_query_threshold
+        self.max_statements = max_statements
+        self.statements: "collections.OrderedDict[str, StatementStats]" = collections.OrderedDict()
+        self.in_use = 0
+        # Server process ids of the connections handed out, notifications carry the pid of whoever sent them.
+        self.backend_pids: typing.Set[int] = set()
+
+        self.query_latency = metrics.histogram("db_query_seconds", "Time spent running statements.")
+        self.acquire_wait = metrics.histogram(
+            "db_acquire_wait_seconds", "Time spent waiting on a free pool connection.",
+            buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+        )
+        self.slow_queries = metrics.counter("db_slow_queries_total", "Statements over the slow query threshold.")
+        metrics.gauge("db_connections_in_use", "Pool connections currently acquired.", callback=lambda: self.in_use)
+        metrics.gauge("db_pool_size", "Connections the pool currently holds.", callback=lambda: self._pool.get_size())
+
+    def __getattr__(self, item):
+        return getattr(self._pool, item)
+
+    def record(self, query: str, elapsed: float, rows: int):
+        """Adds a statement that ran to the statistics."""
+
+        # Ad hoc statements, like the ones from the sql command, would otherwise pile up forever.
+        query = normalise_query(query)
+
+        try:
+            stats = self.statements[query]
+            self.statements.move_to_end(query)
+        except KeyError:
+            stats = self.statements[query] = StatementStats(query)
+            if len(self.statements) > self.max_statements:
+                self.statements.popitem(last=False)
+
+        stats.calls += 1
+        stats.total += elapsed
+        stats.rows += rows
+        if elapsed > stats.max:
+            stats.max = elapsed
+
+        self.query_latency.observe(elapsed)
+
+        if elapsed >= self.slow_query_threshold:
+            self.slow_queries.inc()
+            logger.warning(f"Slow query ({elapsed * 1000:,.2f}ms, {rows} rows) from {_call_site()}: {stats.query[:200]}")
+
+    async def _acquire(self, timeout: typing.Optional[float] = None) -> asyncpg.Connection:
+        start = time.perf_counter()
+        connection = await self._pool.acquire(timeout=timeout)
+        self.acquire_wait.observe(time.perf_counter() - start)
+        self.in_use += 1
+        self.backend_pids.add(connection.get_server_pid())
+
+        return connection
+
+    def acquire(self, *, timeout: float = None) -> _PoolAcquireContext:
+        return _PoolAcquireContext(self, timeout)
+
+    async def release(self, connection: asyncpg.Connection, *, timeout: float = None):
+        self.in_use -= 1
+        await self._pool.release(connection, timeout=timeout)
+
+    async def execute(self, query: str, *args, timeout: float = None) -> str:
+        async with self.acquire() as connection:
+            start = time.perf_counter()
+            status = await connection.execute(query, *args, timeout=timeout)
+            self.record(query, time.perf_counter() - start, rows_from_status(status))
+
+            return status
+
+    async def executemany(self, command: str, args, *, timeout: float = None):
+        args = list(args)
+
+        async with self.acquire() as connection:
+            start = time.perf_counter()
+            result = await connection.executemany(command, args, timeout=timeout)
+            self.record(command, time.perf_counter() - start, len(args))
+
+            return result
+
+    async def fetch(self, query: str, *args, timeout: float = None) -> typing.List[asyncpg.Record]:
+        async with self.acquire() as connection:
+            start = time.perf_counter()
+            records = await connection.fetch(query, *args, timeout=timeout)
+            self.record(query, time.perf_counter() - start, len(records))
+
+            return records
+
+    async def fetchrow(self, query: str, *args, timeout: float = None) -> typing.Optional[asyncpg.Record]:
+        async with self.acquire() as connection:
+            start = time.perf_counter()
+            record = await connection.fetchrow(query, *args, timeout=timeout)
+            self.record(query, time.perf_counter() - start, record is not None)
+
+            return record
+
+    async def fetchval(self, query: str, *args, column: int = 0, timeout: float = None):
+        async with self.acquire() as connection:
+            start = time.perf_counter()
+            value = await connection.fetchval(query, *args, column=column, timeout=timeout)
+            self.record(query, time.perf_counter() - start, 1)
+
+            return value
+
+    def top_statements(self, limit: int = None, *, key: str = "total") -> typing.List[StatementStats]:
+        """The statements that took the most time (or `key`)."""
+
+        ordered = sorted(self.statements.values(), key=lambda s: getattr(s, key), reverse=True)
+        return ordered[:limit] if limit is not None else ordered
+
+    def summary(self) -> dict:
+        """The state of the pool, times are in milliseconds."""
+
+        return {
+            "size": self._pool.get_size(),
+            "max_size": self._pool.get_max_size(),
+            "in_use": self.in_use,
+            "acquire_p50": (self.acquire_wait.percentile(50) or 0.0) * 1000,
+            "acquire_p95": (self.acquire_wait.percentile(95) or 0.0) * 1000,
+            "queries": sum(s.calls for s in self.statements.values()),
+            "slow_queries": int(self.slow_queries.get()),
+        }
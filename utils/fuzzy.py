@@ -0,0 +1,168 @@
+"""
+Indexes for finding strings within an edit distance of a query without comparing against all of them.
+Copyright (C) 2021 kal-byte
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import bisect
+import typing
+import Levenshtein
+
+
+class _Node:
+    __slots__ = ("word", "children", "removed")
+
+    def __init__(self, word: str):
+        self.word = word
+        self.children: typing.Dict[int, "_Node"] = {}
+        self.removed = False
+
+
+class BKTree:
+    """Strings arranged by their Levenshtein distance to each other.
+
+    Because the distance obeys the triangle inequality a search only has to
+    visit children whose distance to their parent is within `max_distance`
+    of the query's distance to that parent. Removed strings are only marked
+    as removed as taking them out would mean rebuilding their subtree."""
+
+    def __init__(self, words: typing.Iterable[str] = ()):
+        self._root = None
+        self._nodes: typing.Dict[str, _Node] = {}
+
+        for word in words:
+            self.add(word)
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __contains__(self, word: str):
+        return word in self._nodes
+
+    def add(self, word: str):
+        node = self._nodes.get(word)
+        if node is not None:
+            return
+
+        if self._root is None:
+            self._root = self._nodes[word] = _Node(word)
+            return
+
+        current = self._root
+        while True:
+            distance = Levenshtein.distance(word, current.word)
+            if distance == 0:
+                # It was removed before, its node is still in the tree.
+                current.removed = False
+                self._nodes[word] = current
+                return
+
+            child = current.children.get(distance)
+            if child is None:
+                current.children[distance] = self._nodes[word] = _Node(word)
+                return
+
+            current = child
+
+    def remove(self, word: str):
+        node = self._nodes.pop(word, None)
+        if node is not None:
+            node.removed = True
+
+    def search(self, query: str, max_distance: int) -> typing.List[typing.Tuple[int, str]]:
+        """Every (distance, string) within `max_distance` of the query, closest first."""
+
+        if self._root is None:
+            return []
+
+        found = []
+        stack = [self._root]
+
+        while stack:
+            node = stack.pop()
+            distance = Levenshtein.distance(query, node.word)
+
+            if distance <= max_distance and not node.removed:
+                found.append((distance, node.word))
+
+            for edge, child in node.children.items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    stack.append(child)
+
+        found.sort()
+        return found
+
+    def top_k(self, query: str, k: int, max_distance: int = None) -> typing.List[typing.Tuple[int, str]]:
+        """The `k` closest (distance, string) pairs, closest first.
+
+        The search radius shrinks to the k-th best distance found so far, so
+        fewer branches are walked than a search with a fixed radius."""
+
+        if self._root is None or k <= 0:
+            return []
+
+        radius = max_distance if max_distance is not None else float("inf")
+        best: typing.List[typing.Tuple[int, str]] = []
+        stack = [self._root]
+
+        while stack:
+            node = stack.pop()
+            distance = Levenshtein.distance(query, node.word)
+
+            if distance <= radius and not node.removed:
+                bisect.insort(best, (distance, node.word))
+                if len(best) > k:
+                    best.pop()
+                if len(best) == k:
+                    radius = min(radius, best[-1][0])
+
+            for edge, child in node.children.items():
+                if distance - radius <= edge <= distance + radius:
+                    stack.append(child)
+
+        return best
+
+    def best(self, query: str, max_distance: int) -> typing.Optional[str]:
+        """The closest string within `max_distance`, ties go to the alphabetically first."""
+
+        found = self.top_k(query, 1, max_distance)
+        return found[0][1] if found else None
+
+
+class FuzzyIndex(BKTree):
+    """A `BKTree` that matches case insensitively but gives back the strings as they were added."""
+
+    def __init__(self, words: typing.Iterable[str] = ()):
+        self._originals: typing.Dict[str, str] = {}
+        super().__init__(words)
+
+    def add(self, word: str):
+        key = word.casefold()
+        self._originals.setdefault(key, word)
+        super().add(key)
+
+    def remove(self, word: str):
+        key = word.casefold()
+        self._originals.pop(key, None)
+        super().remove(key)
+
+    def __contains__(self, word: str):
+        return super().__contains__(word.casefold())
+
+    def search(self, query: str, max_distance: int) -> typing.List[typing.Tuple[int, str]]:
+        return [(d, self._originals[w]) for d, w in super().search(query.casefold(), max_distance)]
+
+    def top_k(self, query: str, k: int, max_distance: int = None) -> typing.List[typing.Tuple[int, str]]:
+        return [(d, self._originals[w]) for d, w in super().top_k(query.casefold(), k, max_distance)]
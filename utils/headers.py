@@ -0,0 +1,122 @@
+"""
+Reads the format and size of an image from its header without decoding it.
+Copyright (C) 2021 kal-byte
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import struct
+
+
+class ProbeError(ValueError):
+    """The header couldn't be read, the message is fine to show to whoever sent the image."""
+
+
+class ImageInfo:
+    __slots__ = ("format", "width", "height", "animated")
+
+    def __init__(self, format: str, width: int, height: int, animated: bool = False):
+        self.format = format
+        self.width = width
+        self.height = height
+        self.animated = animated
+
+    @property
+    def pixels(self) -> int:
+        return self.width * self.height
+
+    def __repr__(self):
+        return f"<ImageInfo format={self.format} size={self.width}x{self.height} animated={self.animated}>"
+
+
+def _probe_png(data: bytes) -> ImageInfo:
+    width, height = struct.unpack(">II", data[16:24])
+
+    # An APNG says so with an acTL chunk somewhere before its first IDAT.
+    offset, animated = 8, False
+    while offset + 8 <= len(data):
+        length, kind = struct.unpack(">I4s", data[offset:offset + 8])
+        if kind == b"acTL":
+            animated = True
+        if kind in (b"acTL", b"IDAT"):
+            break
+        offset += length + 12
+
+    return ImageInfo("png", width, height, animated)
+
+
+def _probe_gif(data: bytes) -> ImageInfo:
+    width, height = struct.unpack("<HH", data[6:10])
+    # Animated gifs all loop through the NETSCAPE2.0 extension, which comes before the frames.
+    return ImageInfo("gif", width, height, b"NETSCAPE2.0" in data[:4096])
+
+
+def _probe_jpeg(data: bytes) -> ImageInfo:
+    offset = 2
+    while offset + 9 <= len(data):
+        if data[offset] != 0xFF:
+            break
+
+        marker = data[offset + 1]
+        if marker == 0xFF:
+            offset += 1
+            continue
+
+        length = struct.unpack(">H", data[offset + 2:offset + 4])[0]
+        # The start of frame markers, bar the ones that mean something else.
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">HH", data[offset + 5:offset + 9])
+            return ImageInfo("jpeg", width, height)
+
+        offset += 2 + length
+
+    raise ProbeError("That jpeg looks broken, I couldn't find how big it is.")
+
+
+def _probe_webp(data: bytes) -> ImageInfo:
+    chunk = data[12:16]
+
+    if chunk == b"VP8X":
+        flags = data[20]
+        width = int.from_bytes(data[24:27], "little") + 1
+        height = int.from_bytes(data[27:30], "little") + 1
+        return ImageInfo("webp", width, height, bool(flags & 0x02))
+
+    if chunk == b"VP8L":
+        bits = int.from_bytes(data[21:25], "little")
+        return ImageInfo("webp", (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1)
+
+    if chunk == b"VP8 ":
+        width, height = struct.unpack("<HH", data[26:30])
+        return ImageInfo("webp", width & 0x3FFF, height & 0x3FFF)
+
+    raise ProbeError("That webp looks broken, I couldn't find how big it is.")
+
+
+def probe(data: bytes) -> ImageInfo:
+    """The format and size of an image from its header, nothing is decoded."""
+
+    try:
+        if data.startswith(b"\x89PNG\r\n\x1a\n"):
+            return _probe_png(data)
+        if data[:6] in (b"GIF87a", b"GIF89a"):
+            return _probe_gif(data)
+        if data.startswith(b"\xff\xd8"):
+            return _probe_jpeg(data)
+        if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+            return _probe_webp(data)
+    except (struct.error, IndexError):
+        raise ProbeError("That image looks broken, I couldn't read its header.") from None
+
+    raise ProbeError("I can only work with png, jpeg, gif and webp images.")
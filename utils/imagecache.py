@@ -0,0 +1,253 @@
+"""
+Caches the output of image commands by what went into them so the same avatar isn't processed twice.
+Copyright (C) 2021 kal-byte
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+import collections
+import hashlib
+import logging
+import os
+import typing
+from .logger import create_logger
+
+
+logger = create_logger("image-cache", logging.INFO)
+
+
+def uncached(func):
+    """Marks an image function whose output isn't decided by its arguments alone, so it's never cached."""
+
+    func.uncached = True
+    return func
+
+
+class ResultCache:
+    """Image outputs keyed by a hash of the operation, its input bytes and its parameters.
+
+    Outputs are kept in memory up to `max_bytes`. With a `disk_path` the
+    least recently used ones are moved to disk instead of being dropped,
+    and the disk is kept under `max_disk_bytes` the same way. Anything on
+    disk is picked back up by `start` when the bot starts again. Every cluster keeps
+    its own `cluster-<id>` directory under `disk_path`, so `max_disk_bytes`
+    is per cluster."""
+
+    def __init__(self, bot, *, max_bytes: int = 64 * 1024 * 1024, disk_path: str = None,
+                 max_disk_bytes: int = 512 * 1024 * 1024):
+        self.bot = bot
+        self.max_bytes = max_bytes
+        # Clusters sharing the one directory would evict and overwrite each other's files.
+        self.disk_path = os.path.join(disk_path, f"cluster-{bot.cluster.cluster_id}") if disk_path is not None else None
+        self.max_disk_bytes = max_disk_bytes
+
+        self._memory: "collections.OrderedDict[str, bytes]" = collections.OrderedDict()
+        self._memory_bytes = 0
+        self._disk: "collections.OrderedDict[str, int]" = collections.OrderedDict()
+        self._disk_bytes = 0
+
+        self.hits = bot.metrics.counter("image_cache_hits_total", "Image outputs served from the cache.", ["tier"])
+        self.misses = bot.metrics.counter("image_cache_misses_total", "Image outputs that had to be made.")
+        bot.metrics.gauge("image_cache_memory_bytes", "Bytes of image outputs cached in memory.",
+                          callback=lambda: self._memory_bytes)
+        bot.metrics.gauge("image_cache_disk_bytes", "Bytes of image outputs cached on disk.",
+                          callback=lambda: self._disk_bytes)
+
+    @classmethod
+    def from_settings(cls, bot, **kwargs):
+        """Makes a cache from the `[image-cache]` section of the config, if there is one."""
+
+        try:
+            kwargs = {**bot.settings["image-cache"], **kwargs}
+        except KeyError:
+            pass
+
+        return cls(bot, **kwargs)
+
+    @staticmethod
+    def key(operation: str, *args, **params) -> str:
+        digest = hashlib.blake2b(operation.encode(), digest_size=20)
+
+        for arg in (*args, *sorted(params.items())):
+            if isinstance(arg, (bytes, bytearray)):
+                digest.update(b"b%d:" % len(arg))
+                digest.update(arg)
+            else:
+                value = repr(arg).encode()
+                digest.update(b"r%d:" % len(value))
+                digest.update(value)
+
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_path, key)
+
+    def _scan_disk(self) -> typing.List[typing.Tuple[float, str, int]]:
+        os.makedirs(self.disk_path, exist_ok=True)
+
+        entries = []
+        for entry in os.scandir(self.disk_path):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+
+        return sorted(entries)
+
+    async def start(self):
+        """Picks up the outputs left on disk by the last run, the directory is scanned off the loop."""
+
+        if self.disk_path is None:
+            return
+
+        try:
+            entries = await asyncio.to_thread(self._scan_disk)
+        except OSError:
+            logger.exception(f"Couldn't read the image cache directory {self.disk_path}.")
+            return
+
+        # Anything spilled during the scan is newer than what was already there.
+        disk = collections.OrderedDict((key, size) for _, key, size in entries if key not in self._disk)
+        self._disk_bytes += sum(disk.values())
+        disk.update(self._disk)
+        self._disk = disk
+
+        logger.info(f"Found {len(entries):,} cached image outputs on disk ({self._disk_bytes:,} bytes).")
+
+    def _write(self, key: str, data: bytes):
+        temp = self._path(key) + ".tmp"
+        with open(temp, "wb") as f:
+            f.write(data)
+
+        # Renamed into place so a half written file is never read back.
+        os.replace(temp, self._path(key))
+
+    def _read(self, key: str) -> typing.Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _unlink(self, keys: typing.List[str]):
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def _remember(self, key: str, data: bytes) -> typing.List[typing.Tuple[str, bytes]]:
+        """Puts an output in memory and gives back whatever had to make room for it."""
+
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return []
+
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+
+        evicted = []
+        while self._memory_bytes > self.max_bytes and len(self._memory) > 1:
+            old_key, old_data = self._memory.popitem(last=False)
+            self._memory_bytes -= len(old_data)
+            evicted.append((old_key, old_data))
+
+        return evicted
+
+    async def _spill(self, evicted: typing.List[typing.Tuple[str, bytes]]):
+        if self.disk_path is None:
+            return
+
+        spilled = []
+        for key, data in evicted:
+            if key in self._disk:
+                # Still on disk from before it was read back, it's only been used since.
+                self._disk.move_to_end(key)
+            else:
+                spilled.append((key, data))
+
+        for key, data in spilled:
+            self._disk[key] = len(data)
+            self._disk_bytes += len(data)
+
+        removed = []
+        while self._disk_bytes > self.max_disk_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            removed.append(key)
+
+        removed_set = set(removed)
+        spilled = [(key, data) for key, data in spilled if key not in removed_set]
+
+        try:
+            await asyncio.to_thread(self._write_many, spilled, removed)
+        except OSError:
+            logger.exception(f"Couldn't move {len(spilled)} image outputs to disk.")
+            for key, data in spilled:
+                if self._disk.pop(key, None) is not None:
+                    self._disk_bytes -= len(data)
+
+    def _write_many(self, spilled: typing.List[typing.Tuple[str, bytes]], removed: typing.List[str]):
+        self._unlink(removed)
+        for key, data in spilled:
+            self._write(key, data)
+
+    async def get(self, key: str) -> typing.Optional[bytes]:
+        data = self._memory.get(key)
+        if data is not None:
+            self._memory.move_to_end(key)
+            self.hits.inc("memory")
+            return data
+
+        if key in self._disk:
+            self._disk.move_to_end(key)
+
+            try:
+                data = await asyncio.to_thread(self._read, key)
+            except OSError:
+                logger.exception(f"Couldn't read the cached image output {key}.")
+                data = None
+
+            if data is not None:
+                self.hits.inc("disk")
+                await self._spill(self._remember(key, data))
+                return data
+
+            # Removed from under us, forget it.
+            self._disk_bytes -= self._disk.pop(key, 0)
+
+        self.misses.inc()
+        return None
+
+    async def put(self, key: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+
+        await self._spill(self._remember(key, data))
+
+    async def get_or_make(self, func: typing.Callable, *args, make: typing.Callable[..., typing.Awaitable[bytes]]):
+        """The cached output of `func(*args)`, otherwise what `make(func, *args)` gives back.
+
+        Functions marked with `uncached` are always made."""
+
+        if getattr(func, "uncached", False):
+            return await make(func, *args)
+
+        key = self.key(func.__name__, *args)
+        data = await self.get(key)
+        if data is None:
+            data = await make(func, *args)
+            await self.put(key, data)
+
+        return data
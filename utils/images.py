@@ -0,0 +1,343 @@
+"""
+A pool of worker processes that the image manipulation commands run in, away from the gateway's GIL.
+Copyright (C) 2021 kal-byte
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import pickle
+import signal
+import socket
+import struct
+import time
+import traceback
+import typing
+from multiprocessing import shared_memory
+from discord.ext import commands
+from .logger import create_logger
+
+
+logger = create_logger("images", logging.INFO)
+
+# Bytes at least this big go through shared memory instead of being pickled down the socket.
+SHARE_THRESHOLD = 64 * 1024
+
+# Every message between the bot and a worker is its pickled size followed by the pickle.
+_HEADER = struct.Struct("!Q")
+
+
+class ImageWorkerError(commands.CommandError):
+    """An image job raised or its worker died."""
+
+
+class ImageTimeout(ImageWorkerError):
+    def __init__(self, timeout: float):
+        super().__init__(f"That took longer than {timeout:g} seconds to process, try a smaller image.")
+
+
+class _SharedBytes:
+    """Where some bytes were copied into shared memory, this is what gets sent instead of the bytes.
+    The reading side copies them back out, the block is only ever used to hand them over."""
+
+    __slots__ = ("name", "size")
+
+    def __init__(self, name: str, size: int):
+        self.name = name
+        self.size = size
+
+
+def _share(data: bytes) -> typing.Tuple[_SharedBytes, shared_memory.SharedMemory]:
+    # A zero sized block can't be made, empty bytes are never shared anyway.
+    memory = shared_memory.SharedMemory(create=True, size=len(data))
+    memory.buf[:len(data)] = data
+    return _SharedBytes(memory.name, len(data)), memory
+
+
+def _read_shared(handle: _SharedBytes, *, unlink: bool = False) -> bytes:
+    memory = shared_memory.SharedMemory(name=handle.name)
+    try:
+        return bytes(memory.buf[:handle.size])
+    finally:
+        memory.close()
+        if unlink:
+            memory.unlink()
+
+
+def _frame(message) -> bytes:
+    data = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    return _HEADER.pack(len(data)) + data
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytearray:
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if not count:
+            raise EOFError()
+        received += count
+
+    return buffer
+
+
+def _recv_message(sock: socket.socket):
+    size, = _HEADER.unpack(_recv_exactly(sock, _HEADER.size))
+    return pickle.loads(_recv_exactly(sock, size))
+
+
+def _worker_main(sock: socket.socket, initializer: typing.Optional[typing.Callable[[], typing.Any]]):
+    # The fork server doesn't run an event loop, but make sure a SIGTERM stops this process whatever it inherited.
+    signal.set_wakeup_fd(-1)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    # Ctrl+C is for the bot, it shuts the workers down itself.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    if initializer is not None:
+        initializer()
+
+    while True:
+        try:
+            job = _recv_message(sock)
+        except (EOFError, OSError):
+            return
+
+        if job is None:
+            return
+
+        func, args, kwargs = job
+        try:
+            args = [_read_shared(arg) if isinstance(arg, _SharedBytes) else arg for arg in args]
+            result = func(*args, **kwargs)
+
+            if isinstance(result, (bytes, bytearray)) and len(result) >= SHARE_THRESHOLD:
+                # The bot unlinks it once it's read it.
+                result, memory = _share(result)
+                memory.close()
+
+            message = _frame((True, result))
+        except Exception as error:
+            message = _frame((False, f"{type(error).__name__}: {error}\n{traceback.format_exc()}"))
+
+        sock.sendall(message)
+
+
+class _Worker:
+    __slots__ = ("process", "socket", "reader", "writer", "jobs")
+
+    def __init__(self, process, sock: socket.socket):
+        self.process = process
+        self.socket = sock
+        self.reader: typing.Optional[asyncio.StreamReader] = None
+        self.writer: typing.Optional[asyncio.StreamWriter] = None
+        self.jobs = 0
+
+    async def connect(self):
+        # Made on first use as the pool can be started before there's a running loop.
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_unix_connection(sock=self.socket)
+
+    def send(self, message):
+        if self.writer is not None:
+            self.writer.write(_frame(message))
+        else:
+            self.socket.sendall(_frame(message))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        else:
+            self.socket.close()
+
+
+class ImagePool:
+    """Runs image functions in `workers` processes, one job per process at a time.
+
+    Jobs wait for an idle worker so no more than `workers` run at once.
+    Big bytes arguments and results are copied through shared memory
+    rather than pickled. A job that takes longer than `timeout` seconds
+    has its worker killed and replaced, and every worker is replaced after
+    `max_jobs_per_worker` jobs so whatever ImageMagick and Pillow hold on
+    to is given back.
+
+    Workers come from a fork server, a single threaded process with the
+    bot's modules already imported. Forking the bot itself could copy a
+    lock some other thread was holding. The functions have to be
+    importable at module level so they can be pickled."""
+
+    def __init__(self, bot, *, workers: int = None, max_jobs_per_worker: int = 100, timeout: float = 30.0,
+                 initializer: typing.Callable[[], typing.Any] = None):
+        self.bot = bot
+        self.size = workers or max(1, (os.cpu_count() or 2) // 2)
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.timeout = timeout
+        self.initializer = initializer
+
+        self._context = multiprocessing.get_context("forkserver")
+        # Imported once in the fork server rather than in every worker.
+        self._context.set_forkserver_preload([__name__])
+        self._workers: typing.Set[_Worker] = set()
+        self._idle: "asyncio.Queue[_Worker]" = asyncio.Queue()
+        self._closed = False
+
+        self.jobs = bot.metrics.counter("image_jobs_total", "Image jobs run in the worker pool.",
+                                        ["operation", "status"])
+        self.job_latency = bot.metrics.histogram("image_job_seconds", "Time from handing a job to a worker "
+                                                                      "to getting its result.", ["operation"])
+        self.replaced = bot.metrics.counter("image_workers_replaced_total", "Image workers replaced.", ["reason"])
+        bot.metrics.gauge("image_workers_busy", "Image workers running a job.",
+                          callback=lambda: len(self._workers) - self._idle.qsize())
+
+    @classmethod
+    def from_settings(cls, bot, **kwargs):
+        """Makes a pool from the `[images]` section of the config, if there is one."""
+
+        try:
+            kwargs = {**bot.settings["images"], **kwargs}
+        except KeyError:
+            pass
+
+        return cls(bot, **kwargs)
+
+    def _spawn(self):
+        parent, child = socket.socketpair()
+        process = self._context.Process(target=_worker_main, args=(child, self.initializer),
+                                        name="travis-image-worker", daemon=True)
+        process.start()
+        child.close()
+
+        worker = _Worker(process, parent)
+        self._workers.add(worker)
+        self._idle.put_nowait(worker)
+
+    def _retire(self, worker: _Worker, reason: str, *, kill: bool = False):
+        self._workers.discard(worker)
+        self.replaced.inc(reason)
+
+        if kill:
+            # A job stuck in native code may not get to handle a SIGTERM.
+            worker.process.kill()
+        else:
+            try:
+                worker.send(None)
+            except OSError:
+                worker.process.terminate()
+
+        worker.close()
+
+        if not self._closed:
+            self._spawn()
+
+        # Reaps any workers that have exited since.
+        multiprocessing.active_children()
+
+    def start(self):
+        if self._workers:
+            return
+
+        # The fork server hands the bot's resource tracker down, so shared memory a retired worker made isn't
+        # unlinked before the bot reads it.
+        for _ in range(self.size):
+            self._spawn()
+
+    async def _receive(self, worker: _Worker):
+        size, = _HEADER.unpack(await worker.reader.readexactly(_HEADER.size))
+        return pickle.loads(await worker.reader.readexactly(size))
+
+    async def run(self, func: typing.Callable, *args, **kwargs):
+        """Runs `func(*args, **kwargs)` in a worker and gives back what it returns."""
+
+        if self._closed:
+            raise ImageWorkerError("The image workers have been shut down.")
+
+        self.start()
+
+        operation = func.__name__
+        worker = await self._idle.get()
+        shared = []
+
+        try:
+            sent = []
+            for arg in args:
+                if isinstance(arg, (bytes, bytearray)) and len(arg) >= SHARE_THRESHOLD:
+                    arg, memory = _share(arg)
+                    shared.append(memory)
+                sent.append(arg)
+
+            start = time.perf_counter()
+            try:
+                await worker.connect()
+                worker.send((func, sent, kwargs))
+                worker.jobs += 1
+                await worker.writer.drain()
+                ok, result = await asyncio.wait_for(self._receive(worker), self.timeout)
+            except asyncio.TimeoutError:
+                self._retire(worker, "timeout", kill=True)
+                worker = None
+                self.jobs.inc(operation, "timeout")
+                raise ImageTimeout(self.timeout) from None
+            except (EOFError, OSError):
+                self._retire(worker, "died", kill=True)
+                worker = None
+                self.jobs.inc(operation, "died")
+                raise ImageWorkerError(f"The image worker running {operation} died.") from None
+            except asyncio.CancelledError:
+                # It's still working on this job, its result would be read by the next one.
+                self._retire(worker, "cancelled", kill=True)
+                worker = None
+                raise
+
+            self.job_latency.observe(time.perf_counter() - start, operation)
+
+            if not ok:
+                self.jobs.inc(operation, "error")
+                raise ImageWorkerError(f"{operation} failed in an image worker: {result}")
+
+            self.jobs.inc(operation, "ok")
+            if isinstance(result, _SharedBytes):
+                result = _read_shared(result, unlink=True)
+
+            return result
+        finally:
+            for memory in shared:
+                memory.close()
+                memory.unlink()
+
+            if worker is not None:
+                if worker.jobs >= self.max_jobs_per_worker:
+                    self._retire(worker, "recycled")
+                else:
+                    self._idle.put_nowait(worker)
+
+    async def close(self):
+        self._closed = True
+        workers, self._workers = self._workers, set()
+
+        for worker in workers:
+            try:
+                worker.send(None)
+            except OSError:
+                pass
+
+        for worker in workers:
+            await asyncio.to_thread(worker.process.join, 5)
+            if worker.process.is_alive():
+                worker.process.kill()
+
+            worker.close()
@@ -0,0 +1,144 @@
+"""
+Checks user supplied images from their headers and shrinks them before the image commands decode them.
+Copyright (C) 2021 kal-byte
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import typing
+import humanize
+from io import BytesIO
+from discord.ext import commands
+from PIL import Image as PImage
+from .headers import ImageInfo, ProbeError, probe
+
+
+class IngestError(commands.BadArgument):
+    """An image was turned away, the message is fine to show to whoever sent it."""
+
+
+def shrink(data: bytes, max_side: int) -> bytes:
+    """Scales an image down to fit in `max_side` and takes its first frame, as a png.
+
+    Runs in the image workers. Jpegs are decoded straight at a smaller scale
+    so the full size image never ends up in memory."""
+
+    with PImage.open(BytesIO(data)) as img:
+        img.draft("RGB", (max_side, max_side))
+        img.thumbnail((max_side, max_side))
+
+        buffer = BytesIO()
+        img.save(buffer, "png")
+
+    return buffer.getvalue()
+
+
+class IngestLimits:
+    """What one image operation is willing to take."""
+
+    __slots__ = ("max_bytes", "max_pixels", "working_size", "animated")
+
+    def __init__(self, *, max_bytes: int = 8 * 1024 * 1024, max_pixels: int = 40_000_000,
+                 working_size: int = 1024, animated: bool = False):
+        # Anything bigger than these is turned away.
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        # Bigger images are scaled down to fit in a square this size first, 0 leaves them be.
+        self.working_size = working_size
+        # Whether animated images go through as they are, otherwise only the first frame is used.
+        self.animated = animated
+
+    def replace(self, **fields) -> "IngestLimits":
+        return IngestLimits(**{**{name: getattr(self, name) for name in self.__slots__}, **fields})
+
+
+class ImageIngest:
+    """Checks every image going into an image operation against that operation's limits.
+
+    Images are probed from their headers so anything too big or in a format
+    the operations can't handle is turned away before a decoder sees it.
+    Images over the operation's working size, or animated ones the
+    operation doesn't take, go through `shrink` in the image workers."""
+
+    # Liquid rescaling is by far the slowest, everything else is fine at the default.
+    OVERRIDES = {
+        "magik": {"working_size": 512},
+    }
+
+    def __init__(self, bot, *, download_bytes: int = 8 * 1024 * 1024,
+                 default: typing.Mapping = None, **operations: typing.Mapping):
+        self.bot = bot
+        self.download_bytes = download_bytes
+
+        self.default = IngestLimits(**(default or {}))
+        self.limits: typing.Dict[str, IngestLimits] = {
+            name: self.default.replace(**{**self.OVERRIDES.get(name, {}), **operations.get(name, {})})
+            for name in {*self.OVERRIDES, *operations}
+        }
+
+        self.rejected = bot.metrics.counter("image_ingest_rejected_total", "Images turned away by the ingest.",
+                                            ["operation"])
+        self.shrunk = bot.metrics.counter("image_ingest_shrunk_total", "Images scaled down or flattened before "
+                                                                       "an operation.", ["operation"])
+
+    @classmethod
+    def from_settings(cls, bot, **kwargs):
+        """Makes the ingest from the `[image-limits]` section of the config, if there is one.
+
+        `default` and a table per operation name take the `IngestLimits` fields."""
+
+        try:
+            kwargs = {**bot.settings["image-limits"], **kwargs}
+        except KeyError:
+            pass
+
+        return cls(bot, **kwargs)
+
+    def limits_for(self, operation: str) -> IngestLimits:
+        return self.limits.get(operation, self.default)
+
+    def check(self, operation: str, data: bytes) -> typing.Tuple[ImageInfo, bool]:
+        """Probes an image for an operation, gives back what it is and whether it needs shrinking."""
+
+        limits = self.limits_for(operation)
+
+        try:
+            if len(data) > limits.max_bytes:
+                limit = humanize.naturalsize(limits.max_bytes, binary=True)
+                raise IngestError(f"That image is too big, I can take up to {limit}.")
+
+            try:
+                info = probe(data)
+            except ProbeError as error:
+                raise IngestError(str(error)) from None
+
+            if info.pixels > limits.max_pixels:
+                raise IngestError(f"That image is too big at {info.width}x{info.height}.")
+        except IngestError:
+            self.rejected.inc(operation)
+            raise
+
+        oversized = limits.working_size and max(info.width, info.height) > limits.working_size
+        return info, bool(oversized or (info.animated and not limits.animated))
+
+    async def prepare(self, operation: str, data: bytes) -> bytes:
+        """The image ready to go into an operation, shrunk in the image workers if it has to be."""
+
+        info, needs_shrinking = self.check(operation, data)
+        if not needs_shrinking:
+            return data
+
+        self.shrunk.inc(operation)
+        working_size = self.limits_for(operation).working_size or max(info.width, info.height)
+        return await self.bot.images.run(shrink, data, working_size)
@@ -0,0 +1,191 @@
+"""
+Watches how late the event loop runs and captures whatever was blocking it.
+Copyright (C) 2021 kal-byte
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+import collections
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+import traceback
+import typing
+import discord
+from .logger import create_logger
+
+
+logger = create_logger("lag-monitor", logging.INFO)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Stall:
+    """A stretch of time the loop didn't get to run, with the stack it was stuck in."""
+
+    __slots__ = ("started", "duration", "stack", "culprit")
+
+    def __init__(self, started: float, stack: typing.List[traceback.FrameSummary]):
+        self.started = started
+        self.duration = None
+        self.stack = stack
+
+        # The innermost frame that's our code is what's worth looking at, not asyncio or a library.
+        ours = [frame for frame in stack if frame.filename.startswith(PROJECT_ROOT)]
+        frame = (ours or stack or [None])[-1]
+        self.culprit = (f"{os.path.relpath(frame.filename, PROJECT_ROOT)}:{frame.lineno} in {frame.name}"
+                        if frame is not None else "unknown")
+
+
+class LagMonitor:
+    """Samples the loop lag every `interval` seconds by checking how late a sleep wakes up.
+
+    A watchdog thread checks the loop keeps ticking, once it hasn't for
+    `threshold` seconds it grabs the loop thread's stack with
+    `sys._current_frames` while it's still stuck. Stalls are summarised to
+    the error webhook at most once every `report_interval` seconds."""
+
+    def __init__(self, bot, *,
+                 interval: float = 0.5,
+                 threshold: float = 0.25,
+                 report_interval: float = 300.0,
+                 history: int = 1200):
+        self.bot = bot
+        self.interval = interval
+        self.threshold = threshold
+        self.report_interval = report_interval
+
+        self.samples = collections.deque(maxlen=history)
+        self.stalls: typing.List[Stall] = []
+
+        self.histogram = bot.metrics.histogram(
+            "event_loop_lag_seconds", "How late the event loop ran scheduled callbacks.",
+            buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+        )
+        self.stall_counter = bot.metrics.counter("event_loop_stalls_total", "Times the loop blocked past the threshold.")
+
+        self._last_tick = time.monotonic()
+        self._current_stall = None
+        self._loop_thread_id = None
+        self._task = None
+        self._report_task = None
+        self._stopped = threading.Event()
+        self._watchdog = None
+
+    def start(self):
+        if self._task is not None and not self._task.done():
+            return
+
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._stopped.clear()
+
+        self._task = self.bot.loop.create_task(self._sample())
+        self._report_task = self.bot.loop.create_task(self._report())
+        self._watchdog = threading.Thread(target=self._watch, name="lag-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def close(self):
+        self._stopped.set()
+
+        for task in (self._task, self._report_task):
+            if task is not None:
+                task.cancel()
+
+        self._task = self._report_task = None
+
+    def percentiles(self, *qs: float) -> typing.List[float]:
+        """The given percentiles of the recent lag samples in seconds."""
+
+        if len(self.samples) < 2:
+            return [0.0 for _ in qs]
+
+        cuts = statistics.quantiles(self.samples, n=100, method="inclusive")
+        return [cuts[min(max(int(q) - 1, 0), 98)] for q in qs]
+
+    async def _sample(self):
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+
+            lag = max(now - start - self.interval, 0.0)
+            self._last_tick = now
+            self.samples.append(lag)
+            self.histogram.observe(lag)
+
+            stall, self._current_stall = self._current_stall, None
+            if stall is not None:
+                stall.duration = lag
+                self.stalls.append(stall)
+                self.stall_counter.inc()
+                logger.warning(f"Event loop blocked for {lag * 1000:,.0f}ms in {stall.culprit}")
+
+    def _watch(self):
+        while not self._stopped.wait(self.threshold / 2):
+            blocked_for = time.monotonic() - self._last_tick - self.interval
+
+            if blocked_for < self.threshold or self._current_stall is not None:
+                continue
+
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+
+            # Only the first capture of a stall is kept, that's where it's stuck.
+            self._current_stall = Stall(time.time() - blocked_for, traceback.extract_stack(frame))
+
+    async def _report(self):
+        while True:
+            await asyncio.sleep(self.report_interval)
+
+            if not self.stalls:
+                continue
+
+            stalls, self.stalls = self.stalls, []
+
+            try:
+                await self.bot.error_webhook.send(embed=self._summarise(stalls), username="Event loop lag")
+            except discord.HTTPException:
+                logger.exception("Failed to report event loop stalls.")
+
+    def _summarise(self, stalls: typing.List[Stall]) -> discord.Embed:
+        by_culprit = collections.defaultdict(list)
+        for stall in stalls:
+            by_culprit[stall.culprit].append(stall.duration)
+
+        worst = max(stalls, key=lambda s: s.duration)
+        p50, p95, p99 = (lag * 1000 for lag in self.percentiles(50, 95, 99))
+
+        embed = discord.Embed(
+            title=f"{len(stalls)} event loop stalls over {self.threshold * 1000:,.0f}ms",
+            colour=discord.Colour.red(),
+        )
+        embed.description = "\n".join(
+            f"`{culprit}` - {len(durations)}x, worst {max(durations) * 1000:,.0f}ms"
+            for culprit, durations in sorted(by_culprit.items(), key=lambda i: max(i[1]), reverse=True)[:10]
+        )
+        embed.add_field(name="Loop Lag", value=f"p50 {p50:,.1f}ms | p95 {p95:,.1f}ms | p99 {p99:,.1f}ms",
+                        inline=False)
+
+        stack = "".join(traceback.format_list(worst.stack[-8:]))
+        embed.add_field(name=f"Worst stall ({worst.duration * 1000:,.0f}ms)", value=f"```py\n{stack[-950:]}```",
+                        inline=False)
+        embed.set_footer(text=f"Cluster {self.bot.cluster.cluster_id}")
+
+        return embed
@@ -0,0 +1,198 @@
+"""
+An in-memory ranked leaderboard that's kept up to date as scores change.
+Copyright (C) 2021 kal-byte
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import bisect
+import typing
+
+
+class _Fenwick:
+    """Prefix sums over the bucket sizes, so the rank of a bucket's first entry is a log n lookup."""
+
+    __slots__ = ("tree",)
+
+    def __init__(self, sizes: typing.Sequence[int]):
+        tree = [0, *sizes]
+
+        for index in range(1, len(tree)):
+            parent = index + (index & -index)
+            if parent < len(tree):
+                tree[parent] += tree[index]
+
+        self.tree = tree
+
+    def add(self, index: int, delta: int):
+        index += 1
+        while index < len(self.tree):
+            self.tree[index] += delta
+            index += index & -index
+
+    def prefix(self, index: int) -> int:
+        """The number of entries in the buckets before `index`."""
+
+        total = 0
+        while index > 0:
+            total += self.tree[index]
+            index -= index & -index
+
+        return total
+
+    def find(self, position: int) -> typing.Tuple[int, int]:
+        """The bucket holding the entry at `position` and where it is in that bucket."""
+
+        index = 0
+        step = 1 << (len(self.tree) - 1).bit_length()
+
+        while step:
+            following = index + step
+            if following < len(self.tree) and self.tree[following] <= position:
+                index = following
+                position -= self.tree[following]
+            step >>= 1
+
+        return index, position
+
+
+class Leaderboard:
+    """Scores by user, ordered highest first with ties broken by the lower user id.
+
+    The entries live in a list of sorted buckets like a B-tree with one
+    level, with a Fenwick tree over the bucket sizes. Setting a score, a
+    users rank and the entry at a rank all take about log n time. Buckets
+    are split once they get twice `bucket_size` long."""
+
+    def __init__(self, *, bucket_size: int = 1000):
+        self.bucket_size = bucket_size
+        self.scores: typing.Dict[int, int] = {}
+
+        self._buckets: typing.List[typing.List[tuple]] = []
+        self._maxes: typing.List[tuple] = []
+        self._fenwick = _Fenwick([])
+
+    def __len__(self):
+        return len(self.scores)
+
+    def __contains__(self, user_id: int):
+        return user_id in self.scores
+
+    def load(self, entries: typing.Iterable[typing.Tuple[int, int]]):
+        """Replaces everything with the given (user id, score) pairs."""
+
+        self.scores = dict(entries)
+
+        keys = sorted((-score, user_id) for user_id, score in self.scores.items())
+        self._buckets = [keys[i:i + self.bucket_size] for i in range(0, len(keys), self.bucket_size)]
+        self._rebuild()
+
+    def _rebuild(self):
+        self._maxes = [bucket[-1] for bucket in self._buckets]
+        self._fenwick = _Fenwick([len(bucket) for bucket in self._buckets])
+
+    def _locate(self, key: tuple) -> int:
+        return min(bisect.bisect_left(self._maxes, key), len(self._buckets) - 1)
+
+    def _insert(self, key: tuple):
+        if not self._buckets:
+            self._buckets.append([key])
+            self._rebuild()
+            return
+
+        index = self._locate(key)
+        bucket = self._buckets[index]
+        bisect.insort(bucket, key)
+
+        if len(bucket) > self.bucket_size * 2:
+            # Splitting shifts every bucket after it, the sums are rebuilt rather than patched.
+            self._buckets[index:index + 1] = [bucket[:self.bucket_size], bucket[self.bucket_size:]]
+            self._rebuild()
+        else:
+            self._maxes[index] = bucket[-1]
+            self._fenwick.add(index, 1)
+
+    def _remove(self, key: tuple):
+        index = self._locate(key)
+        bucket = self._buckets[index]
+        del bucket[bisect.bisect_left(bucket, key)]
+
+        if not bucket:
+            del self._buckets[index]
+            self._rebuild()
+        else:
+            self._maxes[index] = bucket[-1]
+            self._fenwick.add(index, -1)
+
+    def set(self, user_id: int, score: int):
+        old = self.scores.get(user_id)
+        if old == score:
+            return
+
+        if old is not None:
+            self._remove((-old, user_id))
+
+        self.scores[user_id] = score
+        self._insert((-score, user_id))
+
+    def increment(self, user_id: int, amount: int = 1) -> int:
+        score = self.scores.get(user_id, 0) + amount
+        self.set(user_id, score)
+        return score
+
+    def remove(self, user_id: int):
+        score = self.scores.pop(user_id, None)
+        if score is not None:
+            self._remove((-score, user_id))
+
+    def rank(self, user_id: int) -> typing.Optional[int]:
+        """The users place on the board starting from 1, None if they aren't on it."""
+
+        score = self.scores.get(user_id)
+        if score is None:
+            return None
+
+        key = (-score, user_id)
+        index = self._locate(key)
+        return self._fenwick.prefix(index) + bisect.bisect_left(self._buckets[index], key) + 1
+
+    def page(self, offset: int, limit: int) -> typing.List[typing.Tuple[int, int]]:
+        """`limit` (user id, score) pairs starting from the 0-indexed position `offset`."""
+
+        if offset >= len(self) or limit <= 0:
+            return []
+
+        index, position = self._fenwick.find(max(offset, 0))
+        entries = []
+
+        while index < len(self._buckets) and len(entries) < limit:
+            bucket = self._buckets[index]
+            entries.extend(bucket[position:position + limit - len(entries)])
+            index, position = index + 1, 0
+
+        return [(user_id, -score) for score, user_id in entries]
+
+    def top(self, limit: int) -> typing.List[typing.Tuple[int, int]]:
+        return self.page(0, limit)
+
+    def around(self, user_id: int, radius: int = 2) -> typing.List[typing.Tuple[int, int, int]]:
+        """(rank, user id, score) for the user and up to `radius` places either side of them."""
+
+        rank = self.rank(user_id)
+        if rank is None:
+            return []
+
+        start = max(rank - 1 - radius, 0)
+        entries = self.page(start, rank + radius - start)
+        return [(start + i + 1, uid, score) for i, (uid, score) in enumerate(entries)]
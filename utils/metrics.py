@@ -0,0 +1,351 @@
+"""
+A small in-process metrics registry with a Prometheus text exporter, plus the hooks that time commands.
+Copyright (C) 2021 kal-byte
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import bisect
+import logging
+import time
+import typing
+from collections import defaultdict
+from aiohttp import web
+from .logger import create_logger
+
+
+logger = create_logger("metrics", logging.INFO)
+
+# Seconds, these cover everything from a cache hit to a slow image command.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names: typing.Tuple[str, ...], values: typing.Tuple[str, ...], **extra) -> str:
+    pairs = [*zip(names, values), *extra.items()]
+    if not pairs:
+        return ""
+
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: typing.Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+
+    def _key(self, labels: tuple) -> tuple:
+        if len(labels) != len(self.label_names):
+            raise ValueError(f"{self.name} takes the labels {self.label_names}, got {labels}.")
+
+        return labels
+
+    def samples(self) -> typing.Iterator[typing.Tuple[str, str, float]]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(f"{name}{labels} {value}" for name, labels, value in self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """A value that only ever goes up."""
+
+    type = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        super().__init__(name, documentation, labels)
+        self.values = defaultdict(float)
+
+    def inc(self, *labels, amount: float = 1.0):
+        self.values[self._key(labels)] += amount
+
+    def get(self, *labels) -> float:
+        return self.values.get(labels, 0.0)
+
+    def samples(self):
+        for labels, value in self.values.items():
+            yield self.name, _format_labels(self.label_names, labels), value
+
+
+class Gauge(Metric):
+    """A value that can go up and down, or is worked out by `callback` whenever it is read."""
+
+    type = "gauge"
+
+    def __init__(self, name, documentation, labels=(), *, callback: typing.Callable[[], float] = None):
+        super().__init__(name, documentation, labels)
+        self.values = defaultdict(float)
+        self.callback = callback
+
+    def set(self, value: float, *labels):
+        self.values[self._key(labels)] = value
+
+    def inc(self, *labels, amount: float = 1.0):
+        self.values[self._key(labels)] += amount
+
+    def dec(self, *labels, amount: float = 1.0):
+        self.values[self._key(labels)] -= amount
+
+    def get(self, *labels) -> float:
+        if self.callback is not None:
+            return self.callback()
+
+        return self.values.get(labels, 0.0)
+
+    def samples(self):
+        if self.callback is not None:
+            yield self.name, "", self.callback()
+            return
+
+        for labels, value in self.values.items():
+            yield self.name, _format_labels(self.label_names, labels), value
+
+
+class _HistogramSeries:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram(Metric):
+    """Counts observations into fixed buckets, cheap enough to call on every command."""
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labels=(), *, buckets: typing.Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        self.series: typing.Dict[tuple, _HistogramSeries] = {}
+
+    def observe(self, value: float, *labels):
+        key = self._key(labels)
+
+        try:
+            series = self.series[key]
+        except KeyError:
+            # The last slot is the +Inf bucket.
+            series = self.series[key] = _HistogramSeries(len(self.buckets) + 1)
+
+        series.counts[bisect.bisect_left(self.buckets, value)] += 1
+        series.sum += value
+        series.count += 1
+
+    def percentile(self, q: float, *labels) -> typing.Optional[float]:
+        """Estimates the q-th percentile (0-100) by interpolating inside the bucket it falls in."""
+
+        series = self.series.get(labels)
+        if series is None or not series.count:
+            return None
+
+        rank = q / 100 * series.count
+        seen = 0
+
+        for index, count in enumerate(series.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[index - 1] if index else 0.0
+                if index == len(self.buckets):
+                    return lower
+
+                return lower + (self.buckets[index] - lower) * (rank - seen) / count
+
+            seen += count
+
+        return self.buckets[-1]
+
+    def samples(self):
+        for labels, series in self.series.items():
+            cumulative = 0
+
+            for bound, count in zip((*self.buckets, "+Inf"), series.counts):
+                cumulative += count
+                yield f"{self.name}_bucket", _format_labels(self.label_names, labels, le=bound), cumulative
+
+            yield f"{self.name}_sum", _format_labels(self.label_names, labels), series.sum
+            yield f"{self.name}_count", _format_labels(self.label_names, labels), series.count
+
+
+class MetricsRegistry:
+    """Holds every metric of the process by name, asking for an existing name returns that metric."""
+
+    def __init__(self, namespace: str = "travis"):
+        self.namespace = namespace
+        self.metrics: typing.Dict[str, Metric] = {}
+        self._runner = None
+
+    def __getitem__(self, name: str) -> Metric:
+        return self.metrics[f"{self.namespace}_{name}"]
+
+    def _register(self, cls, name, documentation, labels, **kwargs):
+        name = f"{self.namespace}_{name}"
+
+        try:
+            return self.metrics[name]
+        except KeyError:
+            metric = self.metrics[name] = cls(name, documentation, labels, **kwargs)
+            return metric
+
+    def counter(self, name: str, documentation: str, labels: typing.Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, documentation, labels)
+
+    def gauge(self, name: str, documentation: str, labels: typing.Sequence[str] = (), **kwargs) -> Gauge:
+        return self._register(Gauge, name, documentation, labels, **kwargs)
+
+    def histogram(self, name: str, documentation: str, labels: typing.Sequence[str] = (), **kwargs) -> Histogram:
+        return self._register(Histogram, name, documentation, labels, **kwargs)
+
+    def render(self) -> str:
+        """Every metric in the Prometheus text exposition format."""
+
+        return "\n".join(metric.render() for metric in self.metrics.values()) + "\n"
+
+    async def _handle_scrape(self, request: web.Request):
+        return web.Response(text=self.render(), content_type="text/plain", charset="utf-8")
+
+    async def start_exporter(self, host: str = "127.0.0.1", port: int = 9100):
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle_scrape)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+        logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+class CommandMetrics:
+    """Times every command in phases and counts uses and errors.
+
+    The phases come from timestamps along the invoke: the context being made,
+    a check that runs after each command's own checks, the global before
+    invoke hook once every argument is converted and the after invoke hook.
+    Time spent in `ctx.send` is taken out of the execution time, a parent
+    group running its own callback first only counts towards the total."""
+
+    PHASES = ("checks", "converters", "execution", "send", "total")
+
+    def __init__(self, bot, registry: MetricsRegistry):
+        self.bot = bot
+
+        self.invoked = registry.counter("commands_invoked_total", "Commands invoked.", ["command"])
+        self.completed = registry.counter("commands_completed_total", "Commands that finished without an error.",
+                                          ["command"])
+        self.errors = registry.counter("command_errors_total", "Commands that raised an error.", ["command", "error"])
+        self.latency = registry.histogram("command_latency_seconds", "Time spent per command phase.",
+                                          ["command", "phase"])
+
+        bot.add_listener(self.on_command)
+        bot.add_listener(self.on_command_completion)
+        bot.add_listener(self.on_command_error)
+
+        # Any global hooks set before this are still called rather than replaced.
+        self._before_invoke = bot._before_invoke
+        self._after_invoke = bot._after_invoke
+        bot.before_invoke(self.before_invoke)
+        bot.after_invoke(self.after_invoke)
+
+        for command in bot.walk_commands():
+            self.instrument(command)
+
+    def instrument(self, command):
+        """Adds the check that marks the end of the checks to a command and all of its subcommands."""
+
+        for command in (command, *getattr(command, "walk_commands", tuple)()):
+            if self._checked not in command.checks:
+                command.checks.append(self._checked)
+
+    def _checked(self, ctx) -> bool:
+        timings = ctx.timings
+
+        # Checks run from inside a callback, like the help command hiding what can't be used, are left alone.
+        if timings.get("converted", float("-inf")) > timings.get("finished", float("-inf")):
+            return True
+
+        # A subcommand's checks start once its parent group is done with its own callback.
+        timings["started"] = timings.get("finished", timings["created"])
+        timings["checked"] = time.perf_counter()
+        return True
+
+    async def before_invoke(self, ctx):
+        ctx.timings["converted"] = time.perf_counter()
+
+        if self._before_invoke is not None:
+            await self._before_invoke(ctx)
+
+    async def after_invoke(self, ctx):
+        ctx.timings["finished"] = time.perf_counter()
+
+        if self._after_invoke is not None:
+            await self._after_invoke(ctx)
+
+    async def on_command(self, ctx):
+        self.invoked.inc(ctx.command.qualified_name)
+
+    def _observe(self, ctx):
+        timings = ctx.timings
+        name = ctx.command.qualified_name
+        finished = timings.get("finished", time.perf_counter())
+        checked = timings.get("checked", finished)
+        converted = timings.get("converted", finished)
+
+        self.latency.observe(checked - timings.get("started", timings["created"]), name, "checks")
+        self.latency.observe(converted - checked, name, "converters")
+        self.latency.observe(max(finished - converted - ctx.send_time, 0.0), name, "execution")
+        self.latency.observe(ctx.send_time, name, "send")
+        self.latency.observe(finished - timings["created"], name, "total")
+
+    def summary(self) -> typing.List[dict]:
+        """Per command use counts and latencies in milliseconds, the most total time spent first."""
+
+        commands = {}
+        for (name, phase), series in self.latency.series.items():
+            entry = commands.setdefault(name, {"command": name, "phases": {}})
+            entry["phases"][phase] = {
+                "mean": series.sum / series.count * 1000,
+                "p50": self.latency.percentile(50, name, phase) * 1000,
+                "p95": self.latency.percentile(95, name, phase) * 1000,
+            }
+
+            if phase == "total":
+                entry["uses"] = series.count
+                entry["time_spent"] = series.sum
+
+        for (name, _), count in self.errors.values.items():
+            if name in commands:
+                commands[name]["errors"] = commands[name].get("errors", 0) + int(count)
+
+        return sorted(commands.values(), key=lambda entry: entry.get("time_spent", 0.0), reverse=True)
+
+    async def on_command_completion(self, ctx):
+        self.completed.inc(ctx.command.qualified_name)
+        self._observe(ctx)
+
+    async def on_command_error(self, ctx, error):
+        if ctx.command is None:
+            return
+
+        self.errors.inc(ctx.command.qualified_name, type(getattr(error, "original", error)).__name__)
+        self._observe(ctx)
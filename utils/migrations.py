@@ -0,0 +1,134 @@
+"""
+Applies the numbered SQL files in data/migrations and keeps track of which ones have ran.
+Copyright (C) 2021 kal-byte
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import logging
+import pathlib
+import re
+import time
+import typing
+from .logger import create_logger
+
+
+logger = create_logger("migrations", logging.INFO)
+
+MIGRATIONS_DIR = pathlib.Path(__file__).resolve().parent.parent / "data" / "migrations"
+FILENAME_REGEX = re.compile(r"^(\d{4})_(\w+)\.sql$")
+
+# Any constant works, it only has to be the same for every process so only one of them migrates at a time.
+ADVISORY_LOCK_ID = 0x7472617669
+
+CREATE_TRACKING_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INT PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc')
+);
+"""
+
+
+class Migration:
+    __slots__ = ("version", "name", "path")
+
+    def __init__(self, version: int, name: str, path: pathlib.Path):
+        self.version = version
+        self.name = name
+        self.path = path
+
+    def __repr__(self):
+        return f"<Migration version={self.version} name={self.name!r}>"
+
+    def __str__(self):
+        return f"{self.version:04d}_{self.name}"
+
+    @property
+    def sql(self) -> str:
+        return self.path.read_text(encoding="utf-8")
+
+
+class MigrationRunner:
+    """Runs every migration that hasn't been applied yet, each in its own transaction.
+
+    Migrations are only ever added, once one has been applied it must not be
+    edited. All of them are applied under an advisory lock so clusters that
+    start at the same time don't race each other."""
+
+    def __init__(self, pool, directory: pathlib.Path = MIGRATIONS_DIR):
+        self.pool = pool
+        self.directory = directory
+
+    def discover(self) -> typing.List[Migration]:
+        migrations = []
+
+        for path in sorted(self.directory.glob("*.sql")):
+            match = FILENAME_REGEX.match(path.name)
+            if match is None:
+                logger.warning(f"Ignoring {path.name}, migrations are named like 0001_some_name.sql")
+                continue
+
+            migrations.append(Migration(int(match.group(1)), match.group(2), path))
+
+        versions = [m.version for m in migrations]
+        if len(versions) != len(set(versions)):
+            raise RuntimeError("Two migrations share the same version number.")
+
+        return migrations
+
+    async def applied(self, connection=None) -> typing.Dict[int, typing.Any]:
+        """The version of every applied migration with when it was applied."""
+
+        connection = connection or self.pool
+        await connection.execute(CREATE_TRACKING_TABLE)
+
+        records = await connection.fetch("SELECT version, applied_at FROM schema_migrations;")
+        return {record["version"]: record["applied_at"] for record in records}
+
+    async def pending(self) -> typing.List[Migration]:
+        applied = await self.applied()
+        return [m for m in self.discover() if m.version not in applied]
+
+    async def run(self) -> typing.List[Migration]:
+        """Applies every pending migration in order, returns the ones that were applied."""
+
+        ran = []
+
+        async with self.pool.acquire() as connection:
+            await connection.execute("SELECT pg_advisory_lock($1);", ADVISORY_LOCK_ID)
+
+            try:
+                # Checked again under the lock, another process may have just migrated.
+                applied = await self.applied(connection)
+
+                for migration in self.discover():
+                    if migration.version in applied:
+                        continue
+
+                    start = time.perf_counter()
+
+                    async with connection.transaction():
+                        await connection.execute(migration.sql)
+                        await connection.execute(
+                            "INSERT INTO schema_migrations(version, name) VALUES($1, $2);",
+                            migration.version, migration.name
+                        )
+
+                    logger.info(f"Applied migration {migration} in {(time.perf_counter() - start) * 1000:,.2f}ms")
+                    ran.append(migration)
+            finally:
+                await connection.execute("SELECT pg_advisory_unlock($1);", ADVISORY_LOCK_ID)
+
+        return ran
@@ -0,0 +1,172 @@
+"""
+Keeps the in-memory caches of every bot process in sync through Postgres LISTEN/NOTIFY.
+Copyright (C) 2021 kal-byte
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+import json
+import logging
+import asyncpg
+from .logger import create_logger
+
+
+logger = create_logger("cache-listener", logging.INFO)
+
+
+class CacheListener:
+    """Listens on the `cache_changes` channel the triggers from data/migrations publish to
+    and applies each row change to the bots caches.
+
+    It uses its own connection rather than one from the pool, whenever that
+    connection is lost it reconnects and does a full resync of the caches
+    as any notifications sent in the meantime are gone."""
+
+    CHANNEL = "cache_changes"
+    # Tables that counters are flushed to, with the counter and the column its keys are in.
+    COUNTED = {"cookies": ("cookies", "user_id")}
+
+    def __init__(self, bot, connect_kwargs: dict, *, health_check_interval: float = 15.0,
+                 health_check_timeout: float = 10.0):
+        self.bot = bot
+        self.connect_kwargs = connect_kwargs
+        self.health_check_interval = health_check_interval
+        self.health_check_timeout = health_check_timeout
+
+        self.handlers = {
+            "guild_settings": self._apply_guild_settings,
+            "blacklist": self._apply_blacklist,
+            "guild_verification": self._apply_verification,
+            "giveaways": self._apply_giveaway,
+            "cookies": self._apply_cookies,
+        }
+
+        self._connection = None
+        self._task = None
+        # Set while LISTEN is in place, anything notified while it's clear is missed.
+        self.listening = asyncio.Event()
+        self._resync_pending = False
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = self.bot.loop.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
+
+    async def wait_until_listening(self, timeout: float) -> bool:
+        """Waits for LISTEN to be in place, if it isn't by `timeout` the caches are resynced once it is."""
+
+        try:
+            await asyncio.wait_for(self.listening.wait(), timeout)
+        except asyncio.TimeoutError:
+            self._resync_pending = True
+            return False
+
+        return True
+
+    async def _run(self):
+        resync = False
+        retry_after = 1.0
+
+        while True:
+            try:
+                self._connection = await asyncpg.connect(**self.connect_kwargs)
+                await self._connection.add_listener(self.CHANNEL, self._on_notification)
+                self.listening.set()
+
+                # Only resync after we're listening, otherwise changes in between would be lost.
+                if resync or self._resync_pending:
+                    await self.bot.resync_caches()
+                    self._resync_pending = False
+                    logger.info("Listening on the cache notification channel again, resynced the caches.")
+
+                resync = True
+                retry_after = 1.0
+
+                while True:
+                    await asyncio.sleep(self.health_check_interval)
+                    # A connection that's gone quiet without closing would otherwise hang here.
+                    await self._connection.fetchval("SELECT 1;", timeout=self.health_check_timeout)
+            except Exception:
+                # Whatever it was, the task has to stay up to keep the caches in sync. Cancelling isn't caught.
+                logger.exception(f"Lost the cache notification connection, reconnecting in {retry_after:.0f}s.")
+            finally:
+                self.listening.clear()
+                if self._connection is not None and not self._connection.is_closed():
+                    self._connection.terminate()
+                self._connection = None
+
+            await asyncio.sleep(retry_after)
+            retry_after = min(retry_after * 2, 60.0)
+
+    def _on_notification(self, connection, pid, channel, payload):
+        try:
+            data = json.loads(payload)
+
+            # A change this process made, when that's a counter flush its rows are committed even if the flush
+            # hasn't returned yet. Left counted as pending they'd be added on top of the row a second time.
+            if pid in self.bot.pool.backend_pids and data["table"] in self.COUNTED and data["new"] is not None:
+                counter, column = self.COUNTED[data["table"]]
+                self.bot.counters.settle(counter, data["new"][column])
+
+            handler = self.handlers[data["table"]]
+            handler(data["op"], data["new"], data["old"])
+        except Exception:
+            logger.exception(f"Failed to apply a cache change: {payload}")
+
+    def _apply_guild_settings(self, op, new, old):
+        if not self.bot.owns_guild((new or old)["guild_id"]):
+            return
+
+        if op == "DELETE":
+            self.bot.config.remove(old["guild_id"])
+        else:
+            self.bot.config.load([new])
+
+    def _apply_blacklist(self, op, new, old):
+        if op != "INSERT":
+            self.bot.blacklist.pop(old["id"], None)
+        if op != "DELETE":
+            self.bot.blacklist[new["id"]] = new["reason"]
+
+    def _apply_verification(self, op, new, old):
+        if not self.bot.owns_guild((new or old)["guild_id"]):
+            return
+
+        if op != "INSERT":
+            self.bot.verification_config.pop(old["message_id"], None)
+        if op != "DELETE":
+            self.bot.verification_config[new["message_id"]] = new["role_id"]
+
+    def _apply_giveaway(self, op, new, old):
+        if op != "INSERT":
+            self.bot.giveaway_roles.pop(old["message_id"], None)
+        if op != "DELETE" and new["role_id"] and self.bot.get_channel(new["channel_id"]):
+            self.bot.giveaway_roles[new["message_id"]] = new["role_id"]
+
+    def _apply_cookies(self, op, new, old):
+        if op == "DELETE":
+            self.bot.cookie_leaderboard.remove(old["user_id"])
+        else:
+            # Cookies this process hasn't flushed yet aren't in the row.
+            cookies = (new["cookies"] or 0) + self.bot.counters.pending("cookies", new["user_id"])
+            self.bot.cookie_leaderboard.set(new["user_id"], cookies)
@@ -17,6 +17,8 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
 import discord
+import collections
+import typing
 from discord.ext import commands, menus
 from utils import utils
 import asyncio
@@ -53,6 +55,152 @@ class GeneralPageSource(menus.ListPageSource):
         return embed
 
 
+class AsyncPageSource(menus.PageSource):
+    """A page source that loads its pages as the menu gets to them instead of up front.
+
+    Subclasses give the number of entries with `fetch_count`, one page of
+    entries with `fetch_page` and turn a page into an embed with `render`.
+    The next page is fetched in the background while the current one is
+    shown, loaded pages and rendered embeds are kept in small LRUs."""
+
+    def __init__(self, *, per_page: int, cache_size: int = 8, prefetch: bool = True):
+        self.per_page = per_page
+        self.cache_size = cache_size
+        self.prefetch = prefetch
+        self.count = None
+
+        self._pages = collections.OrderedDict()
+        self._embeds = collections.OrderedDict()
+        self._pending: typing.Dict[int, asyncio.Future] = {}
+
+    async def fetch_count(self) -> int:
+        raise NotImplementedError
+
+    async def fetch_page(self, page_number: int) -> list:
+        raise NotImplementedError
+
+    async def render(self, menu: menus.Menu, page: list):
+        raise NotImplementedError
+
+    def offset(self, page_number: int) -> int:
+        return page_number * self.per_page
+
+    async def prepare(self):
+        if self.count is None:
+            self.count = await self.fetch_count()
+
+    def is_paginating(self):
+        return self.count > self.per_page
+
+    def get_max_pages(self):
+        return max(-(-self.count // self.per_page), 1)
+
+    def _remember(self, cache: collections.OrderedDict, key, value):
+        cache[key] = value
+        cache.move_to_end(key)
+
+        if len(cache) > self.cache_size:
+            cache.popitem(last=False)
+
+    def _store(self, page_number: int, future: asyncio.Future):
+        self._pending.pop(page_number, None)
+
+        # Checking the exception marks it as retrieved, a failed prefetch is just fetched again when it's needed.
+        if not future.cancelled() and future.exception() is None:
+            self._remember(self._pages, page_number, future.result())
+
+    def _schedule(self, page_number: int) -> asyncio.Future:
+        future = self._pending.get(page_number)
+
+        if future is None:
+            future = self._pending[page_number] = asyncio.ensure_future(self.fetch_page(page_number))
+            future.add_done_callback(lambda f: self._store(page_number, f))
+
+        return future
+
+    async def get_page(self, page_number: int):
+        try:
+            page = self._pages[page_number]
+            self._pages.move_to_end(page_number)
+        except KeyError:
+            page = await self._schedule(page_number)
+            self._remember(self._pages, page_number, page)
+
+        following = page_number + 1
+        if self.prefetch and following < self.get_max_pages() and following not in self._pages:
+            self._schedule(following)
+
+        return page
+
+    async def format_page(self, menu: menus.Menu, page: list):
+        # The menu sets the current page before formatting, so that's what rendered pages are kept by.
+        try:
+            embed = self._embeds[menu.current_page]
+            self._embeds.move_to_end(menu.current_page)
+        except KeyError:
+            embed = await self.render(menu, page)
+            self._remember(self._embeds, menu.current_page, embed)
+
+        return embed
+
+
+class KeysetPageSource(AsyncPageSource):
+    """An `AsyncPageSource` that seeks by a sort key rather than an offset, so a deep page costs the same as the first.
+
+    `fetch_after(None, limit)` gives the first entries and
+    `fetch_before(None, limit)` the last ones, both in display order. Pages
+    are fetched off a neighbouring page that's already been loaded, the last
+    page is read backwards so jumping to the end stays one query."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._bounds: typing.Dict[int, tuple] = {}
+
+    def key(self, entry):
+        raise NotImplementedError
+
+    async def fetch_after(self, key, limit: int) -> list:
+        raise NotImplementedError
+
+    async def fetch_before(self, key, limit: int) -> list:
+        raise NotImplementedError
+
+    def _remember(self, cache, key, value):
+        super()._remember(cache, key, value)
+
+        # The first and last key of every page seen are kept after the page itself is evicted.
+        if cache is self._pages and value:
+            self._bounds[key] = (self.key(value[0]), self.key(value[-1]))
+
+    async def fetch_page(self, page_number: int) -> list:
+        last_page = self.get_max_pages() - 1
+
+        if page_number == last_page:
+            return await self.fetch_before(None, self.count - last_page * self.per_page)
+
+        if page_number + 1 in self._bounds:
+            return await self.fetch_before(self._bounds[page_number + 1][0], self.per_page)
+
+        if page_number == 0:
+            return await self.fetch_after(None, self.per_page)
+
+        if page_number - 1 in self._bounds:
+            return await self.fetch_after(self._bounds[page_number - 1][1], self.per_page)
+
+        # Nothing next to it has been loaded, walk forward from the closest page that has.
+        loaded = max((n for n in self._bounds if n < page_number), default=None)
+        key = self._bounds[loaded][1] if loaded is not None else None
+        start = loaded + 1 if loaded is not None else 0
+
+        for number in range(start, page_number + 1):
+            page = await self.fetch_after(key, self.per_page)
+            if not page or number == page_number:
+                return page
+
+            self._remember(self._pages, number, page)
+            key = self.key(page[-1])
+
+
 class KalPages(menus.MenuPages):
     def __init__(self, source, **kwargs):
         super().__init__(source=source, check_embeds=True, **kwargs)
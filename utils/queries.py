@@ -0,0 +1,488 @@
+"""
+Every statement the bot runs, registered once and prepared on each pooled connection.
+Copyright (C) 2021 kal-byte
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import datetime
+import logging
+import time
+import typing
+import asyncpg
+from .logger import create_logger
+from .db import rows_from_status
+
+
+logger = create_logger("queries", logging.INFO)
+
+# Statement name -> SQL, filled in as the namespaces below are defined.
+STATEMENTS: typing.Dict[str, str] = {}
+
+
+def statement(name: str, sql: str) -> str:
+    """Registers a statement so every connection prepares it, returns the name to run it by."""
+
+    if name in STATEMENTS:
+        raise ValueError(f"A statement called {name!r} is already registered.")
+
+    STATEMENTS[name] = sql
+    return name
+
+
+class QueryConnection(asyncpg.Connection):
+    """A connection that holds a prepared statement for every registered statement."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.statements: typing.Dict[str, asyncpg.prepared_stmt.PreparedStatement] = {}
+
+    async def prepare_registered(self, name: str):
+        prepared = self.statements[name] = await self.prepare(STATEMENTS[name])
+        return prepared
+
+    async def prepare_all(self):
+        for name in STATEMENTS:
+            try:
+                await self.prepare_registered(name)
+            except asyncpg.PostgresError as e:
+                # A table that doesn't exist yet shouldn't stop the pool from starting,
+                # the statement is prepared again the first time it's ran.
+                logger.warning(f"Couldn't prepare {name}: {e}")
+
+
+async def init_connection(connection: QueryConnection):
+    """The pools `init` hook."""
+
+    await connection.prepare_all()
+
+
+class QueryRunner:
+    """Runs registered statements on a pooled connection, recording them in the pools statistics."""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def _run_prepared(self, connection: QueryConnection, name: str, method: str, args: tuple):
+        prepared = connection.statements.get(name)
+        if prepared is None:
+            prepared = await connection.prepare_registered(name)
+
+        if method == "execute":
+            await prepared.fetch(*args)
+            return prepared.get_statusmsg()
+
+        return await getattr(prepared, method)(*args)
+
+    async def run(self, name: str, method: str, *args):
+        async with self.pool.acquire() as connection:
+            start = time.perf_counter()
+
+            try:
+                result = await self._run_prepared(connection, name, method, args)
+            except (asyncpg.InvalidCachedStatementError, asyncpg.FeatureNotSupportedError):
+                # The schema changed under the prepared statement (a migration), prepare it again.
+                connection.statements.pop(name, None)
+                result = await self._run_prepared(connection, name, method, args)
+
+            if method == "fetch":
+                rows = len(result)
+            elif method == "execute":
+                rows = rows_from_status(result)
+            else:
+                rows = result is not None
+
+            self.pool.record(STATEMENTS[name], time.perf_counter() - start, rows)
+            return result
+
+
+class Namespace:
+    def __init__(self, runner: QueryRunner):
+        self._run = runner.run
+
+
+class SettingsQueries(Namespace):
+    UPSERT_MANY = statement(
+        "settings.upsert_many",
+        "INSERT INTO guild_settings(guild_id) SELECT unnest($1::BIGINT[]) ON CONFLICT (guild_id) DO NOTHING;"
+    )
+    FOR_SHARDS = statement(
+        "settings.for_shards",
+        "SELECT * FROM guild_settings WHERE (guild_id >> 22) % $1 = ANY($2::INT[]);"
+    )
+    DELETE = statement("settings.delete", "DELETE FROM guild_settings WHERE guild_id = $1;")
+
+    async def upsert_many(self, guild_ids: typing.List[int]) -> str:
+        return await self._run(self.UPSERT_MANY, "execute", guild_ids)
+
+    async def for_shards(self, shard_count: int, shard_ids: typing.List[int]) -> typing.List[asyncpg.Record]:
+        return await self._run(self.FOR_SHARDS, "fetch", shard_count, shard_ids)
+
+    async def delete(self, guild_id: int) -> str:
+        return await self._run(self.DELETE, "execute", guild_id)
+
+
+class VerificationQueries(Namespace):
+    FOR_SHARDS = statement(
+        "verification.for_shards",
+        "SELECT message_id, role_id FROM guild_verification WHERE (guild_id >> 22) % $1 = ANY($2::INT[]);"
+    )
+    FOR_GUILD = statement("verification.for_guild", "SELECT * FROM guild_verification WHERE guild_id = $1;")
+    CREATE = statement(
+        "verification.create",
+        "INSERT INTO guild_verification(guild_id, message_id, role_id) VALUES($1, $2, $3);"
+    )
+    DELETE_FOR_GUILD = statement(
+        "verification.delete_for_guild",
+        "DELETE FROM guild_verification WHERE guild_id = $1 RETURNING message_id;"
+    )
+    DELETE_BY_MESSAGE = statement(
+        "verification.delete_by_message",
+        "DELETE FROM guild_verification WHERE message_id = $1;"
+    )
+
+    async def for_shards(self, shard_count: int, shard_ids: typing.List[int]) -> typing.List[asyncpg.Record]:
+        return await self._run(self.FOR_SHARDS, "fetch", shard_count, shard_ids)
+
+    async def for_guild(self, guild_id: int) -> typing.Optional[asyncpg.Record]:
+        return await self._run(self.FOR_GUILD, "fetchrow", guild_id)
+
+    async def create(self, guild_id: int, message_id: int, role_id: int) -> str:
+        return await self._run(self.CREATE, "execute", guild_id, message_id, role_id)
+
+    async def delete_for_guild(self, guild_id: int) -> typing.Optional[int]:
+        """Deletes a guilds verification, returns the message it was on if there was one."""
+
+        return await self._run(self.DELETE_FOR_GUILD, "fetchval", guild_id)
+
+    async def delete_by_message(self, message_id: int) -> str:
+        return await self._run(self.DELETE_BY_MESSAGE, "execute", message_id)
+
+
+class BlacklistQueries(Namespace):
+    ALL = statement("blacklist.all", "SELECT * FROM blacklist;")
+    ADD = statement("blacklist.add", "INSERT INTO blacklist VALUES($1, $2);")
+
+    async def all(self) -> typing.List[asyncpg.Record]:
+        return await self._run(self.ALL, "fetch")
+
+    async def add(self, user_id: int, reason: str) -> str:
+        return await self._run(self.ADD, "execute", user_id, reason)
+
+
+class GiveawayQueries(Namespace):
+    ROLES = statement(
+        "giveaways.roles",
+        "SELECT message_id, channel_id, role_id FROM giveaways WHERE role_id IS NOT NULL;"
+    )
+    CREATE = statement("giveaways.create", "INSERT INTO giveaways VALUES($1, $2, $3, $4);")
+
+    async def roles(self) -> typing.List[asyncpg.Record]:
+        return await self._run(self.ROLES, "fetch")
+
+    async def create(self,
+                     message_id: int,
+                     channel_id: int,
+                     ends_at: datetime.datetime,
+                     role_id: typing.Optional[int] = None) -> str:
+        return await self._run(self.CREATE, "execute", message_id, channel_id, ends_at, role_id)
+
+
+class MuteQueries(Namespace):
+    FOR_MEMBER = statement(
+        "mutes.for_member",
+        "SELECT * FROM guild_mutes WHERE guild_id = $1 AND member_id = $2;"
+    )
+    COUNT_FOR_GUILD = statement("mutes.count_for_guild", "SELECT COUNT(*) FROM guild_mutes WHERE guild_id = $1;")
+    PAGE_FOR_GUILD = statement(
+        "mutes.page_for_guild",
+        "SELECT * FROM guild_mutes WHERE guild_id = $1 ORDER BY end_time, member_id LIMIT $2 OFFSET $3;"
+    )
+    CREATE = statement(
+        "mutes.create",
+        "INSERT INTO guild_mutes VALUES($1, $2, $3) "
+        "ON CONFLICT (guild_id, member_id) DO UPDATE SET end_time = EXCLUDED.end_time;"
+    )
+
+    async def for_member(self, guild_id: int, member_id: int) -> typing.Optional[asyncpg.Record]:
+        return await self._run(self.FOR_MEMBER, "fetchrow", guild_id, member_id)
+
+    async def count_for_guild(self, guild_id: int) -> int:
+        return await self._run(self.COUNT_FOR_GUILD, "fetchval", guild_id)
+
+    async def page_for_guild(self, guild_id: int, limit: int, offset: int) -> typing.List[asyncpg.Record]:
+        return await self._run(self.PAGE_FOR_GUILD, "fetch", guild_id, limit, offset)
+
+    async def create(self, guild_id: int, member_id: int, end_time: int) -> str:
+        return await self._run(self.CREATE, "execute", guild_id, member_id, end_time)
+
+
+class WarnQueries(Namespace):
+    COUNT_FOR_MEMBER = statement(
+        "warns.count_for_member",
+        "SELECT COUNT(*) FROM warns WHERE guild_id = $1 AND offender_id = $2;"
+    )
+    PAGE_AFTER = statement(
+        "warns.page_after",
+        "SELECT * FROM warns WHERE guild_id = $1 AND offender_id = $2 AND case_id > $3 "
+        "ORDER BY case_id LIMIT $4;"
+    )
+    PAGE_BEFORE = statement(
+        "warns.page_before",
+        "SELECT * FROM warns WHERE guild_id = $1 AND offender_id = $2 AND case_id < $3 "
+        "ORDER BY case_id DESC LIMIT $4;"
+    )
+    # Takes the next case number for the guild and inserts the warn in one round trip.
+    CREATE = statement(
+        "warns.create",
+        "WITH next_case AS ("
+        "INSERT INTO warn_cases(guild_id, last_case) VALUES($1, 1) "
+        "ON CONFLICT (guild_id) DO UPDATE SET last_case = warn_cases.last_case + 1 RETURNING last_case"
+        ") INSERT INTO warns(guild_id, moderator_id, offender_id, reason, time_warned, case_id) "
+        "SELECT $1, $2, $3, $4, $5, last_case FROM next_case RETURNING case_id;"
+    )
+    DELETE_CASE = statement(
+        "warns.delete_case",
+        "DELETE FROM warns WHERE guild_id = $1 AND offender_id = $2 AND case_id = $3;"
+    )
+
+    async def count_for_member(self, guild_id: int, offender_id: int) -> int:
+        return await self._run(self.COUNT_FOR_MEMBER, "fetchval", guild_id, offender_id)
+
+    async def page_after(self, guild_id: int, offender_id: int, case_id: int, limit: int) -> typing.List[asyncpg.Record]:
+        """The next `limit` warns after `case_id`, oldest first."""
+
+        return await self._run(self.PAGE_AFTER, "fetch", guild_id, offender_id, case_id, limit)
+
+    async def page_before(self, guild_id: int, offender_id: int, case_id: int, limit: int) -> typing.List[asyncpg.Record]:
+        """The `limit` warns before `case_id`, oldest first."""
+
+        records = await self._run(self.PAGE_BEFORE, "fetch", guild_id, offender_id, case_id, limit)
+        return records[::-1]
+
+    async def create(self,
+                     guild_id: int,
+                     moderator_id: int,
+                     offender_id: int,
+                     reason: str,
+                     warned_at: datetime.datetime) -> int:
+        """Returns the case number the warn was given."""
+
+        return await self._run(self.CREATE, "fetchval", guild_id, moderator_id, offender_id, reason, warned_at)
+
+    async def delete_case(self, guild_id: int, offender_id: int, case_id: int) -> bool:
+        status = await self._run(self.DELETE_CASE, "execute", guild_id, offender_id, case_id)
+        return status == "DELETE 1"
+
+
+class TempBanQueries(Namespace):
+    CREATE = statement(
+        "tempbans.create",
+        "INSERT INTO temp_bans(guild_id, moderator_id, user_id, reason, end_time) "
+        "VALUES($1, $2, $3, $4, $5) RETURNING id;"
+    )
+
+    async def create(self,
+                     guild_id: int,
+                     moderator_id: int,
+                     user_id: int,
+                     reason: str,
+                     end_time: datetime.datetime) -> int:
+        return await self._run(self.CREATE, "fetchval", guild_id, moderator_id, user_id, reason, end_time)
+
+
+class TodoQueries(Namespace):
+    # One statement per sort order instead of appending an ORDER BY at runtime.
+    FOR_USER = statement("todos.for_user", "SELECT * FROM todos WHERE user_id = $1 ORDER BY id;")
+    COUNT_FOR_USER = statement("todos.count_for_user", "SELECT COUNT(*) FROM todos WHERE user_id = $1;")
+    PAGE_FOR_USER = {
+        "id": statement(
+            "todos.page_for_user",
+            "SELECT * FROM todos WHERE user_id = $1 ORDER BY id LIMIT $2 OFFSET $3;"
+        ),
+        "alphabetical": statement(
+            "todos.page_for_user_alphabetical",
+            "SELECT * FROM todos WHERE user_id = $1 ORDER BY task ASC, id LIMIT $2 OFFSET $3;"
+        ),
+        "size": statement(
+            "todos.page_for_user_by_size",
+            "SELECT * FROM todos WHERE user_id = $1 ORDER BY CHAR_LENGTH(task) ASC, id LIMIT $2 OFFSET $3;"
+        ),
+    }
+    CREATE_MANY = statement(
+        "todos.create_many",
+        "INSERT INTO todos(user_id, task) SELECT $1, unnest($2::VARCHAR[]);"
+    )
+    UPDATE = statement("todos.update", "UPDATE todos SET task = $3 WHERE user_id = $1 AND id = $2;")
+    DELETE_MANY = statement("todos.delete_many", "DELETE FROM todos WHERE user_id = $1 AND id = ANY($2::INT[]);")
+    DELETE_ALL = statement("todos.delete_all", "DELETE FROM todos WHERE user_id = $1;")
+
+    async def for_user(self, user_id: int) -> typing.List[asyncpg.Record]:
+        return await self._run(self.FOR_USER, "fetch", user_id)
+
+    async def count_for_user(self, user_id: int) -> int:
+        return await self._run(self.COUNT_FOR_USER, "fetchval", user_id)
+
+    async def page_for_user(self, user_id: int, limit: int, offset: int, order: str = "id") -> typing.List[asyncpg.Record]:
+        return await self._run(self.PAGE_FOR_USER[order], "fetch", user_id, limit, offset)
+
+    async def create(self, user_id: int, task: str) -> str:
+        return await self.create_many(user_id, [task])
+
+    async def create_many(self, user_id: int, tasks: typing.List[str]) -> str:
+        return await self._run(self.CREATE_MANY, "execute", user_id, tasks)
+
+    async def update(self, user_id: int, todo_id: int, task: str) -> str:
+        return await self._run(self.UPDATE, "execute", user_id, todo_id, task)
+
+    async def delete_many(self, user_id: int, todo_ids: typing.List[int]) -> str:
+        return await self._run(self.DELETE_MANY, "execute", user_id, todo_ids)
+
+    async def delete_all(self, user_id: int) -> str:
+        return await self._run(self.DELETE_ALL, "execute", user_id)
+
+
+class CookieQueries(Namespace):
+    # The cookies column is nullable, a NULL count is treated as none.
+    ALL = statement("cookies.all", "SELECT user_id, COALESCE(cookies, 0) AS cookies FROM cookies;")
+    ADD_MANY = statement(
+        "cookies.add_many",
+        "INSERT INTO cookies(user_id, cookies) SELECT * FROM unnest($1::BIGINT[], $2::INT[]) "
+        "ON CONFLICT (user_id) DO UPDATE SET cookies = COALESCE(cookies.cookies, 0) + EXCLUDED.cookies;"
+    )
+
+    async def all(self) -> typing.List[asyncpg.Record]:
+        return await self._run(self.ALL, "fetch")
+
+    async def add_many(self, user_ids: typing.List[int], amounts: typing.List[int]) -> str:
+        return await self._run(self.ADD_MANY, "execute", user_ids, amounts)
+
+
+class TagQueries(Namespace):
+    FOR_GUILD = statement("tags.for_guild", "SELECT * FROM tags WHERE guild = $1;")
+    COUNT_FOR_AUTHOR = statement(
+        "tags.count_for_author",
+        "SELECT COUNT(*) FROM tags WHERE author = $1 AND guild = $2;"
+    )
+    TITLES_FOR_AUTHOR = statement(
+        "tags.titles_for_author",
+        "SELECT title FROM tags WHERE author = $1 AND guild = $2 ORDER BY title LIMIT $3 OFFSET $4;"
+    )
+    CREATE = statement(
+        "tags.create",
+        "INSERT INTO tags VALUES($1, $2, $3, $4, $5, 0) ON CONFLICT (guild, title) DO NOTHING RETURNING *;"
+    )
+    DELETE = statement("tags.delete", "DELETE FROM tags WHERE id = $1;")
+    ADD_USES = statement(
+        "tags.add_uses",
+        "UPDATE tags SET uses = tags.uses + d.amount FROM unnest($1::TEXT[], $2::INT[]) AS d(id, amount) "
+        "WHERE tags.id = d.id;"
+    )
+
+    async def for_guild(self, guild_id: int) -> typing.List[asyncpg.Record]:
+        return await self._run(self.FOR_GUILD, "fetch", guild_id)
+
+    async def count_for_author(self, author_id: int, guild_id: int) -> int:
+        return await self._run(self.COUNT_FOR_AUTHOR, "fetchval", author_id, guild_id)
+
+    async def titles_for_author(self,
+                                author_id: int,
+                                guild_id: int,
+                                limit: int,
+                                offset: int) -> typing.List[asyncpg.Record]:
+        return await self._run(self.TITLES_FOR_AUTHOR, "fetch", author_id, guild_id, limit, offset)
+
+    async def create(self,
+                     tag_id: str,
+                     guild_id: int,
+                     author_id: int,
+                     title: str,
+                     content: str) -> typing.Optional[asyncpg.Record]:
+        """Returns the new tag, None if the guild already has one with that title."""
+
+        return await self._run(self.CREATE, "fetchrow", tag_id, guild_id, author_id, title, content)
+
+    async def delete(self, tag_id: str) -> str:
+        return await self._run(self.DELETE, "execute", tag_id)
+
+    async def add_uses(self, tag_ids: typing.List[str], amounts: typing.List[int]) -> str:
+        return await self._run(self.ADD_USES, "execute", tag_ids, amounts)
+
+
+class CommandUsageQueries(Namespace):
+    ADD_MANY = statement(
+        "command_usage.add_many",
+        "INSERT INTO command_usage(command, uses) SELECT * FROM unnest($1::TEXT[], $2::BIGINT[]) "
+        "ON CONFLICT (command) DO UPDATE SET uses = command_usage.uses + EXCLUDED.uses;"
+    )
+    TOTAL = statement("command_usage.total", "SELECT COALESCE(SUM(uses), 0) FROM command_usage;")
+
+    async def add_many(self, commands: typing.List[str], amounts: typing.List[int]) -> str:
+        return await self._run(self.ADD_MANY, "execute", commands, amounts)
+
+    async def total(self) -> int:
+        return await self._run(self.TOTAL, "fetchval")
+
+
+class UsageQueries(Namespace):
+    COMMANDS = statement(
+        "usage.commands",
+        "SELECT command, COUNT(*) AS uses, COUNT(*) FILTER (WHERE failed) AS errors, "
+        "percentile_cont(0.95) WITHIN GROUP (ORDER BY latency) AS p95 "
+        "FROM command_invocations WHERE used_at >= $1 GROUP BY command ORDER BY uses DESC LIMIT $2;"
+    )
+    TIMELINE = statement(
+        "usage.timeline",
+        "SELECT date_trunc($2, used_at) AS period, COUNT(*) AS uses, COUNT(*) FILTER (WHERE failed) AS errors, "
+        "percentile_cont(0.95) WITHIN GROUP (ORDER BY latency) AS p95 "
+        "FROM command_invocations WHERE used_at >= $1 GROUP BY period ORDER BY period;"
+    )
+    ERRORS = statement(
+        "usage.errors",
+        "SELECT error, COUNT(*) AS count FROM command_invocations WHERE used_at >= $1 AND failed "
+        "GROUP BY error ORDER BY count DESC LIMIT $2;"
+    )
+
+    async def commands(self, since: datetime.datetime, limit: int = 25) -> typing.List[asyncpg.Record]:
+        """Use counts, error counts and p95 latency in seconds per command."""
+
+        return await self._run(self.COMMANDS, "fetch", since, limit)
+
+    async def timeline(self, since: datetime.datetime, period: str = "hour") -> typing.List[asyncpg.Record]:
+        """The same totals for every `period` (a date_trunc field, e.g. hour or day)."""
+
+        return await self._run(self.TIMELINE, "fetch", since, period)
+
+    async def errors(self, since: datetime.datetime, limit: int = 10) -> typing.List[asyncpg.Record]:
+        return await self._run(self.ERRORS, "fetch", since, limit)
+
+
+class Queries:
+    """All of the bots statements by table, e.g. `bot.queries.warns.for_member(guild_id, user_id)`."""
+
+    def __init__(self, pool):
+        runner = QueryRunner(pool)
+
+        self.settings = SettingsQueries(runner)
+        self.verification = VerificationQueries(runner)
+        self.blacklist = BlacklistQueries(runner)
+        self.giveaways = GiveawayQueries(runner)
+        self.mutes = MuteQueries(runner)
+        self.warns = WarnQueries(runner)
+        self.tempbans = TempBanQueries(runner)
+        self.todos = TodoQueries(runner)
+        self.cookies = CookieQueries(runner)
+        self.tags = TagQueries(runner)
+        self.command_usage = CommandUsageQueries(runner)
+        self.usage = UsageQueries(runner)
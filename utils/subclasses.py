@@ -17,9 +17,9 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
 import os
-import re
 import time
 import random
+import typing
 import logging
 import asyncio
 import asyncdagpi
@@ -32,6 +32,26 @@ from discord.ext import commands
 from datetime import datetime as dt
 from . import utils
 from .logger import create_logger
+from .timers import TimerManager
+from .config import GuildConfig
+from .notify import CacheListener
+from .cluster import ClusterInfo
+from .metrics import MetricsRegistry, CommandMetrics
+from .lag import LagMonitor
+from .db import InstrumentedPool
+from .queries import Queries, QueryConnection, init_connection
+from .migrations import MigrationRunner
+from .leaderboard import Leaderboard
+from .counters import CounterService
+from .analytics import UsageRecorder
+from .tags import TagCache
+from .fuzzy import FuzzyIndex
+from .catalogue import HelpCatalogue
+from .images import ImagePool
+from .templates import load_templates
+from .imagecache import ResultCache
+from .assets import AssetFetcher
+from .ingest import ImageIngest
 
 
 logger = create_logger("custom-bot", logging.INFO)
@@ -50,19 +70,7 @@ else:
 async def get_prefix(bot: "MyBot", message: discord.Message):
     """This gets called every message to get the prefix of the given message."""
 
-    base = [f"<@{bot.user.id}> ", f"<@!{bot.user.id}> "]
-
-    if message.guild is None:
-        base.append("tb!")
-        return base
-
-    try:
-        prefix = bot.config[message.guild.id]["guild_prefix"]
-    except KeyError:
-        prefix = "tb!"
-
-    base.append(prefix)
-    return base
+    return bot.get_prefixes(message.guild)
 
 
 class CustomContext(commands.Context):
@@ -72,9 +80,13 @@ class CustomContext(commands.Context):
         self.timeit = TimeIt(self)
         self.bot: MyBot = self.bot
 
+        # Filled in along the invoke for utils.CommandMetrics.
+        self.timings = {"created": time.perf_counter()}
+        self.send_time = 0.0
+
     @staticmethod
     def _owoify_message(content: str, embed: discord.Embed = None):
-        ret = {"content": utils.owoify_text(content)}
+        ret = {"content": utils.owoify_text(content) if content else content}
 
         if embed:
             ret["embed"] = utils.owoify_embed(embed)
@@ -87,11 +99,18 @@ class CustomContext(commands.Context):
         yield embed
 
     async def send(self, content: str = None, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await self._send(content, **kwargs)
+        finally:
+            self.send_time += time.perf_counter() - start
+
+    async def _send(self, content: str = None, **kwargs):
         if content:
             content = str(content)
 
-        if self.guild and self.bot.config[self.guild.id]["owoify"]:
-            owoified = self._owoify_message(content, kwargs["embed"])
+        if self.guild and self.bot.config.get(self.guild.id).owoify:
+            owoified = self._owoify_message(content, kwargs.get("embed"))
             content = owoified["content"]
 
             if kwargs.get("embed"):
@@ -136,6 +155,11 @@ class TimeIt(ContextDecorator):
 
 class MyBot(commands.AutoShardedBot):
     def __init__(self, *args, **kwargs):
+        # When ran by launcher.py this process only runs its clusters share of the shards.
+        self.cluster = kwargs.pop("cluster", None) or ClusterInfo()
+        if self.cluster.shard_ids is not None:
+            kwargs.update(shard_ids=self.cluster.shard_ids, shard_count=self.cluster.shard_count)
+
         super().__init__(get_prefix, *args, **kwargs)
 
         # Prep for embed colour stuff. (Thank you to z03h for this :))
@@ -161,7 +185,6 @@ class MyBot(commands.AutoShardedBot):
         self.start_time = dt.now()
         self.support_url = "https://discord.gg/tKZbxAF"
         self.invite_url = "https://kal-byte.co.uk/invite/706530005169209386/1580592374"
-        self.cmd_usage = 0
         self.announcement = {
             "title": None,
             "message": None
@@ -171,16 +194,56 @@ class MyBot(commands.AutoShardedBot):
         self.verification_config = {}
         self.giveaway_roles = {}
         self.blacklist = {}
+        self.cookie_leaderboard = Leaderboard()
         self.ctx_cache = {}
-        self.config = {}
+        self.config = GuildConfig(self)
+
+        # Set once do_prep has filled the caches, no commands are handled until then.
+        self.prepped = asyncio.Event()
+
+        # Built the first time a command isn't found, thrown away whenever a cog is added or removed.
+        self._command_index = None
+        self.help_catalogue = HelpCatalogue(self)
+
+        # Prefix tuples per guild, these only get rebuilt when a guild's prefix changes.
+        self._prefixes = {}
+        self._mention_prefixes = ()
+        self._bare_mentions = frozenset()
+
+        # Metrics, scraped from the exporter when a port is configured.
+        self.metrics = MetricsRegistry()
+        self.command_metrics = CommandMetrics(self, self.metrics)
+        self.metrics.gauge("guilds", "Guilds this process is in.", callback=lambda: len(self.guilds))
+        self.metrics.gauge("heartbeat_latency_seconds", "Average gateway heartbeat latency.",
+                           callback=lambda: self.latency)
+        self.lag_monitor = LagMonitor(self)
 
         # Stuff that requires the bots loop
         self.loop = asyncio.get_event_loop()
-        self.pool = self.loop.run_until_complete(
-            asyncpg.create_pool(
-                **self.settings["database"]["main"] if os.name != "nt" else self.settings["database"]["beta"])
+        self._db_settings = self.settings["database"]["main"] if os.name != "nt" else self.settings["database"]["beta"]
+        self.pool = InstrumentedPool(
+            self.loop.run_until_complete(asyncpg.create_pool(**self._db_settings,
+                                                             connection_class=QueryConnection,
+                                                             init=init_connection)),
+            self.metrics
         )
+        self.queries = Queries(self.pool)
+        self.migrations = MigrationRunner(self.pool)
         self.session = aiohttp.ClientSession(loop=self.loop)
+        self.timers = TimerManager(self)
+        self.cache_listener = CacheListener(self, self._db_settings)
+
+        # Counters bumped often enough that writing each one straight away isn't worth it.
+        self.counters = CounterService(self)
+        self.counters.register("cookies", self.queries.cookies.add_many)
+        self.counters.register("tag_uses", self.queries.tags.add_uses)
+        self.counters.register("command_usage", self.queries.command_usage.add_many)
+        self.usage_recorder = UsageRecorder(self)
+        self.tag_cache = TagCache(self)
+        self.images = ImagePool.from_settings(self, initializer=load_templates)
+        self.image_cache = ResultCache.from_settings(self)
+        self.ingest = ImageIngest.from_settings(self)
+        self.assets = AssetFetcher(self, max_download_bytes=self.ingest.download_bytes)
 
         # Checks to disable functionality for certain things.
         self.add_check(self.command_check)
@@ -218,6 +281,15 @@ class MyBot(commands.AutoShardedBot):
         return discord.Colour.from_rgb(*new_colour)
 
     async def close(self):
+        await self.lag_monitor.close()
+        await self.metrics.close()
+        await self.cache_listener.close()
+        # Flushed before the pool goes away so no counts are lost.
+        await self.counters.close()
+        await self.usage_recorder.close()
+        await self.timers.close()
+        await self.images.close()
+        await self.config.close()
         await self.session.close()
         await self.pool.close()
         await self.zane.close()
@@ -233,60 +305,103 @@ class MyBot(commands.AutoShardedBot):
             if guild.member_count >= 250:
                 await guild.chunk()
 
-    async def do_prep(self):
-        await self.wait_until_ready()
-
-        # Credits to pikaninja for the refactor here down to just 1 query.
-        for guild in self.guilds:
-            sql = (
-                "INSERT INTO guild_settings VALUES($1, DEFAULT, $2, $3, $4) "
-                "ON CONFLICT (guild_id) DO NOTHING;"
-            )
-            values = (guild.id, None, None, False)
-            await self.pool.execute(sql, *values)
+    async def _timed_stage(self, timings: dict, name: str, coro):
+        """Awaits a warm-up stage and records how long it took."""
 
-        verification_config = await self.pool.fetch("SELECT message_id, role_id FROM guild_verification")
-        guild_configs = await self.pool.fetch("SELECT * FROM guild_settings")
-        blacklist = await self.pool.fetch("SELECT * FROM blacklist")
-        giveaways = await self.pool.fetch("SELECT * FROM giveaways")
-
-        for entry in verification_config:
-            self.verification_config[entry["message_id"]] = entry["role_id"]
-
-        logger.info("Finished caching the verification config")
-
-        for entry in guild_configs:
-            settings = dict(entry)
-            settings.pop("guild_id")
+        start = time.perf_counter()
+        try:
+            return await coro
+        finally:
+            timings[name] = time.perf_counter() - start
 
-            self.config[entry["guild_id"]] = settings
+    @property
+    def shard_partition(self) -> typing.Tuple[int, typing.List[int]]:
+        """The shard count and the shards this process runs, for filtering rows with
+        `(guild_id >> 22) % $1 = ANY($2::INT[])`."""
 
-        logger.info("Finished caching guild configs")
+        shard_count = self.shard_count or 1
+        shard_ids = self.shard_ids if self.shard_ids is not None else range(shard_count)
+        return shard_count, list(shard_ids)
 
-        for entry in blacklist:
-            self.blacklist[entry["id"]] = entry["reason"]
+    def owns_guild(self, guild_id: int) -> bool:
+        """Whether the guild belongs to one of the shards this process runs."""
 
-        logger.info("Finished caching blacklists")
+        shard_count, shard_ids = self.shard_partition
+        return (guild_id >> 22) % shard_count in shard_ids
 
-        for entry in giveaways:
-            if entry["role_id"]:
-                self.giveaway_roles[entry["message_id"]] = entry["role_id"]
+    def add_command(self, command):
+        super().add_command(command)
 
-            await utils.set_giveaway(self, entry["ends_at"], entry["channel_id"], entry["message_id"])
+        # The default help command gets added before the metrics exist, CommandMetrics picks that one up itself.
+        if getattr(self, "command_metrics", None) is not None:
+            self.command_metrics.instrument(command)
 
-        logger.info("Finished caching and setting giveaways")
+    def add_cog(self, cog):
+        super().add_cog(cog)
+        self._command_index = None
+        self.help_catalogue.invalidate()
 
-        mutes = await self.pool.fetch("SELECT * FROM guild_mutes")
-        for mute in mutes:
-            now = time.time()
-            seconds_left = mute["end_time"] - now
-            await utils.set_mute(bot=self,
-                                 guild_id=mute["guild_id"],
-                                 user_id=mute["member_id"],
-                                 _time=seconds_left)
+    def remove_cog(self, name):
+        super().remove_cog(name)
+        self._command_index = None
+        self.help_catalogue.invalidate()
 
-        logger.info("Finished setting mutes.")
+    @property
+    def command_index(self) -> FuzzyIndex:
+        """Every visible command's name and aliases, for suggesting a command when one isn't found."""
+
+        if self._command_index is None:
+            names = []
+            for command in self.walk_commands():
+                if command.hidden:
+                    continue
+
+                parent = f"{command.full_parent_name} " if command.parent else ""
+                names.append(command.qualified_name)
+                names.extend(parent + alias for alias in command.aliases)
+
+            self._command_index = FuzzyIndex(names)
+
+        return self._command_index
+
+    async def _upsert_guild_settings(self):
+        # One statement for every guild instead of a round trip per guild.
+        await self.queries.settings.upsert_many([guild.id for guild in self.guilds])
+
+    async def _load_verification_config(self):
+        records = await self.queries.verification.for_shards(*self.shard_partition)
+        self.verification_config = {entry["message_id"]: entry["role_id"] for entry in records}
+
+    async def _load_guild_configs(self):
+        records = await self.queries.settings.for_shards(*self.shard_partition)
+        self.config.load(records)
+
+    async def _load_blacklist(self):
+        records = await self.queries.blacklist.all()
+        self.blacklist = {entry["id"]: entry["reason"] for entry in records}
+
+    async def _load_giveaway_roles(self):
+        records = await self.queries.giveaways.roles()
+        # Giveaways only know their channel, if we can't see it another cluster runs that guild.
+        self.giveaway_roles = {entry["message_id"]: entry["role_id"]
+                               for entry in records if self.get_channel(entry["channel_id"])}
+
+    async def _load_cookie_leaderboard(self):
+        records = await self.queries.cookies.all()
+        self.cookie_leaderboard.load((entry["user_id"], entry["cookies"]) for entry in records)
+
+    async def resync_caches(self):
+        """Reloads every cache the cache listener keeps up to date from the database."""
+
+        await asyncio.gather(
+            self._load_verification_config(),
+            self._load_guild_configs(),
+            self._load_blacklist(),
+            self._load_giveaway_roles(),
+            self._load_cookie_leaderboard(),
+        )
 
+    async def _load_announcement(self):
         updates_channel = self.get_channel(711586681580552232)
         last_update = await updates_channel.fetch_message(updates_channel.last_message_id)
         cool = last_update.content.split("\n")
@@ -297,8 +412,74 @@ class MyBot(commands.AutoShardedBot):
 
         self.announcement = update
 
+    async def do_prep(self):
+        # Started before anything else so stalls while connecting get caught too.
+        self.lag_monitor.start()
+        await self.wait_until_ready()
+
+        timings = {}
+        start = time.perf_counter()
+
+        try:
+            await self._timed_stage(timings, "migrations", self.migrations.run())
+            await self._timed_stage(timings, "guild settings upsert", self._upsert_guild_settings())
+
+            # Listen for changes before loading so nothing made while loading gets missed.
+            self.cache_listener.start()
+            if not await self.cache_listener.wait_until_listening(10.0):
+                logger.warning("Not listening for cache changes yet, the caches get resynced once it is.")
+
+            # These are all independent of each other so there's no reason to wait on them one by one.
+            await asyncio.gather(
+                self._timed_stage(timings, "verification config", self._load_verification_config()),
+                self._timed_stage(timings, "guild configs", self._load_guild_configs()),
+                self._timed_stage(timings, "blacklist", self._load_blacklist()),
+                self._timed_stage(timings, "giveaway roles", self._load_giveaway_roles()),
+                self._timed_stage(timings, "cookie leaderboard", self._load_cookie_leaderboard()),
+                self._timed_stage(timings, "image cache", self.image_cache.start()),
+            )
+        except Exception:
+            logger.exception("Warm-up failed, commands will stay disabled.")
+            raise
+
+        # Expiring mutes need the guild configs so the timers only start once those are in.
+        self.timers.start()
+        self.config.start()
+        self.counters.start()
+        self.usage_recorder.start()
+        self.images.start()
+        self.prepped.set()
+
+        report = ", ".join(f"{name}: {taken * 1000:,.2f}ms" for name, taken in timings.items())
+        logger.info(f"Warm-up finished in {time.perf_counter() - start:,.2f}s ({report})")
+
+        try:
+            await self._load_announcement()
+        except (AttributeError, discord.HTTPException):
+            logger.warning("Couldn't fetch the latest announcement.")
+
+        await self._start_metrics_exporter()
         await self.change_presence(activity=discord.Game(name=self.settings["misc"]["status"]))
 
+    async def _start_metrics_exporter(self):
+        try:
+            metrics = self.settings["metrics"]
+        except KeyError:
+            return
+
+        # Every cluster gets its own port so they can all be scraped from the one host.
+        port = metrics["port"] + self.cluster.cluster_id
+
+        try:
+            await self.metrics.start_exporter(metrics.get("host", "127.0.0.1"), port)
+        except OSError:
+            logger.exception(f"Couldn't start the metrics exporter on port {port}.")
+
+    async def wait_until_prepped(self):
+        """Waits until the caches have been warmed up and commands are being handled."""
+
+        await self.prepped.wait()
+
     @property
     def kal(self):
         return self.get_user(671777334906454026)
@@ -321,36 +502,58 @@ class MyBot(commands.AutoShardedBot):
     async def get_context(self, message: discord.Message, *, cls=CustomContext):
         return await super().get_context(message, cls=cls)
 
+    def get_prefixes(self, guild: discord.Guild = None) -> tuple:
+        """Gets the precomputed prefixes for a guild, building them if they're not cached."""
+
+        guild_id = guild.id if guild else None
+
+        try:
+            return self._prefixes[guild_id]
+        except KeyError:
+            pass
+
+        prefix = self.config.get(guild_id).prefix if guild_id else None
+
+        prefixes = (*self._mention_prefixes, "tb!" if prefix is None else prefix)
+        self._prefixes[guild_id] = prefixes
+        return prefixes
+
+    def invalidate_prefix(self, guild_id: int):
+        """Drops the cached prefixes for a guild so they get rebuilt from the config."""
+
+        self._prefixes.pop(guild_id, None)
+
     async def on_ready(self):
+        self._mention_prefixes = (f"<@{self.user.id}> ", f"<@!{self.user.id}> ")
+        self._bare_mentions = frozenset((f"<@{self.user.id}>", f"<@!{self.user.id}>"))
+        self._prefixes.clear()
+
         logger.info(f"Logged in as -> {self.user.name}")
         logger.info(f"Client ID -> {self.user.id}")
+        logger.info(f"Cluster -> {self.cluster.cluster_id} (shards {self.shard_partition[1]})")
         logger.info(f"Guild Count -> {len(self.guilds)}")
 
     async def on_message(self, message: discord.Message):
-        if not self.is_ready():
+        if not self.prepped.is_set():
             return
 
-        BOT_MENTION_REGEX = f"<@(!)?{self.user.id}>"
+        content = message.content
 
-        if re.fullmatch(BOT_MENTION_REGEX, message.content):
+        if content in self._bare_mentions:
             ctx = await self.get_context(message)
             cmd = self.get_command("prefix")
-            await cmd(ctx)
+            return await cmd(ctx)
+
+        # Most messages aren't commands, bail out before a context is ever built for them.
+        if not content.startswith(self.get_prefixes(message.guild)):
+            return
 
         await self.process_commands(message)
 
     async def on_guild_join(self, guild: discord.Guild):
         await guild.chunk()
 
-        sql = "INSERT INTO guild_settings(guild_id, guild_prefix, owoify) VALUES($1, DEFAULT, DEFAULT)"
-        await self.pool.execute(sql, guild.id)
-
-        self.config[guild.id] = {
-            "guild_prefix": "tb!",
-            "mute_role_id": None,
-            "log_channel": None,
-            "owoify": False,
-        }
+        self.config.add(guild.id)
 
         message = [
             f"I was just added to {guild.name} with {guild.member_count} members.",
@@ -370,15 +573,10 @@ class MyBot(commands.AutoShardedBot):
                                       username="Added to guild.")
 
     async def on_guild_remove(self, guild: discord.Guild):
-        await self.pool.execute(
-            "DELETE FROM guild_settings WHERE guild_id = $1", guild.id
-        )
-
-        await self.pool.execute(
-            "DELETE FROM guild_verification WHERE guild_id = $1", guild.id
-        )
+        await self.queries.settings.delete(guild.id)
+        await self.queries.verification.delete_for_guild(guild.id)
 
-        del self.config[guild.id]
+        self.config.remove(guild.id)
 
         message = [
             f"I was just removed from {guild.name} with {guild.member_count} members.",
@@ -0,0 +1,147 @@
+"""
+Keeps the tags of recently used guilds in memory with indexes for exact, prefix and fuzzy lookups.
+Copyright (C) 2021 kal-byte
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+import bisect
+import collections
+import typing
+from .fuzzy import BKTree
+
+
+class GuildTags:
+    """Every tag in one guild by title."""
+
+    __slots__ = ("tags", "titles", "tree")
+
+    def __init__(self, records: typing.Iterable[typing.Mapping]):
+        self.tags: typing.Dict[str, dict] = {record["title"]: dict(record) for record in records}
+        self.titles = sorted(self.tags)
+        self.tree = BKTree(self.titles)
+
+    def __len__(self):
+        return len(self.tags)
+
+    def get(self, title: str) -> typing.Optional[dict]:
+        return self.tags.get(title)
+
+    def with_prefix(self, prefix: str, limit: int = 25) -> typing.List[str]:
+        """Titles starting with `prefix` in alphabetical order."""
+
+        start = bisect.bisect_left(self.titles, prefix)
+        found = []
+
+        for title in self.titles[start:start + limit]:
+            if not title.startswith(prefix):
+                break
+            found.append(title)
+
+        return found
+
+    def suggest(self, title: str, *, max_distance: int = 3, limit: int = 3) -> typing.List[str]:
+        """The titles closest to `title` by edit distance."""
+
+        return [match for _, match in self.tree.search(title, max_distance)[:limit]]
+
+    def add(self, record: typing.Mapping):
+        title = record["title"]
+        if title not in self.tags:
+            bisect.insort(self.titles, title)
+            self.tree.add(title)
+
+        self.tags[title] = dict(record)
+
+    def remove(self, title: str):
+        if self.tags.pop(title, None) is None:
+            return
+
+        del self.titles[bisect.bisect_left(self.titles, title)]
+        self.tree.remove(title)
+
+
+class TagCache:
+    """The `GuildTags` of the `max_guilds` most recently used guilds.
+
+    A guild's tags are loaded the first time they're asked for, concurrent
+    requests for the same guild share the one query. Creating and removing
+    tags goes through here so the database and the cache stay the same,
+    a guild's tags are only ever changed by the cluster running it."""
+
+    def __init__(self, bot, *, max_guilds: int = 1000):
+        self.bot = bot
+        self.max_guilds = max_guilds
+
+        self._guilds: "collections.OrderedDict[int, GuildTags]" = collections.OrderedDict()
+        self._loading: typing.Dict[int, asyncio.Future] = {}
+
+        self.hits = bot.metrics.counter("tag_cache_hits_total", "Guild tag lookups served from memory.")
+        self.misses = bot.metrics.counter("tag_cache_misses_total", "Guild tag lookups that loaded from the database.")
+
+    async def _load(self, guild_id: int) -> GuildTags:
+        records = await self.bot.queries.tags.for_guild(guild_id)
+        return GuildTags(records)
+
+    async def get(self, guild_id: int) -> GuildTags:
+        try:
+            tags = self._guilds[guild_id]
+        except KeyError:
+            pass
+        else:
+            self._guilds.move_to_end(guild_id)
+            self.hits.inc()
+            return tags
+
+        future = self._loading.get(guild_id)
+        if future is None:
+            self.misses.inc()
+            future = self._loading[guild_id] = asyncio.ensure_future(self._load(guild_id))
+            future.add_done_callback(lambda f: self._loaded(guild_id, f))
+
+        # Shielded so one caller giving up doesn't cancel the load for everyone else waiting on it.
+        return await asyncio.shield(future)
+
+    def _loaded(self, guild_id: int, future: asyncio.Future):
+        del self._loading[guild_id]
+
+        if future.cancelled() or future.exception() is not None:
+            return
+
+        self._guilds[guild_id] = future.result()
+        if len(self._guilds) > self.max_guilds:
+            self._guilds.popitem(last=False)
+
+    async def create(self, tag_id: str, guild_id: int, author_id: int, title: str, content: str) -> bool:
+        """Adds a tag, False if the guild already has one with that title."""
+
+        tags = await self.get(guild_id)
+        if tags.get(title) is not None:
+            return False
+
+        record = await self.bot.queries.tags.create(tag_id, guild_id, author_id, title, content)
+        if record is None:
+            return False
+
+        tags.add(record)
+        return True
+
+    async def remove(self, guild_id: int, title: str):
+        tags = await self.get(guild_id)
+        tag = tags.get(title)
+
+        if tag is not None:
+            await self.bot.queries.tags.delete(tag["id"])
+            tags.remove(title)
@@ -0,0 +1,88 @@
+"""
+The template images and fonts the image commands draw with, decoded and sized once per process.
+Copyright (C) 2021 kal-byte
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import functools
+import logging
+import os
+import time
+import typing
+from polaroid import Image as PoImage
+from PIL import Image as PImage, ImageFont
+from .logger import create_logger
+
+
+logger = create_logger("templates", logging.INFO)
+
+
+class TemplateRegistry:
+    """Every png under `root` as a decoded Pillow image, plus the ones that are used at another size.
+
+    Loaded once per process, in the bot when the image cog loads and in
+    each image worker by its initializer. `image` gives back a copy to draw
+    on, `view` the loaded one which must only be read from."""
+
+    def __init__(self, root: str = "./data"):
+        self.root = root
+        self.loaded = False
+
+        self._images: typing.Dict[str, PImage.Image] = {}
+        self.facetime_buttons: typing.Optional[PoImage] = None
+
+    def load(self):
+        if self.loaded:
+            return
+
+        start = time.perf_counter()
+
+        for directory, _, files in os.walk(self.root):
+            for file in files:
+                if not file.endswith(".png"):
+                    continue
+
+                path = os.path.join(directory, file)
+                with PImage.open(path) as img:
+                    img.load()
+                    self._images[os.path.relpath(path, self.root).replace(os.sep, "/")] = img.copy()
+
+        # Only ever used as an overlay on a 1024x1024 image.
+        self.facetime_buttons = PoImage(os.path.join(self.root, "facetimebuttons.png"))
+        self.facetime_buttons.resize(1024, 1024, 5)
+
+        self.loaded = True
+        logger.info(f"Loaded {len(self._images)} templates in {(time.perf_counter() - start) * 1000:,.2f}ms.")
+
+    def view(self, name: str) -> PImage.Image:
+        """The shared image, don't draw on it."""
+
+        return self._images[name]
+
+    def image(self, name: str) -> PImage.Image:
+        return self._images[name].copy()
+
+    @functools.lru_cache(maxsize=32)
+    def font(self, size: int, name: str = "JetBrainsMono-Regular.ttf") -> ImageFont.FreeTypeFont:
+        return ImageFont.truetype(os.path.join(self.root, name), size)
+
+
+templates = TemplateRegistry()
+
+
+def load_templates():
+    """Loads the templates in this process, used as the image workers' initializer."""
+
+    templates.load()
@@ -0,0 +1,289 @@
+"""
+A single heap backed scheduler for everything that expires at some point (mutes, giveaways, tempbans).
+Copyright (C) 2021 kal-byte
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+import datetime
+import heapq
+import itertools
+import logging
+import time
+import typing
+import asyncpg
+from collections import defaultdict
+from .logger import create_logger
+
+
+logger = create_logger("timers", logging.INFO)
+
+# Upper bound used when a timer is cancelled, every row with that key goes.
+CANCELLED = 2 ** 62
+
+
+def _to_timestamp(naive_utc: datetime.datetime) -> float:
+    return naive_utc.replace(tzinfo=datetime.timezone.utc).timestamp()
+
+
+def _from_timestamp(timestamp: float) -> datetime.datetime:
+    return datetime.datetime.utcfromtimestamp(timestamp)
+
+
+class Timer:
+    """Something that needs to happen at a given unix timestamp.
+    Once it expires `on_<event>_timer_complete` is dispatched with the timer."""
+
+    __slots__ = ("event", "key", "expires", "data")
+
+    def __init__(self, event: str, key: typing.Hashable, expires: float, data: dict = None):
+        self.event = event
+        self.key = key
+        self.expires = expires
+        self.data = data or {}
+
+    def __repr__(self):
+        return f"<Timer event={self.event!r} key={self.key!r} expires={self.expires}>"
+
+
+class TimerSource:
+    """Describes the table a type of timer is persisted in."""
+
+    event: str
+    load_sql: str
+    delete_sql: str
+
+    def load_args(self, bot, until: float) -> tuple:
+        raise NotImplementedError
+
+    def owns(self, bot, timer: Timer) -> bool:
+        """Whether this process runs the guild the timer is for, rows are usually filtered in SQL already."""
+
+        return True
+
+    def from_record(self, record: asyncpg.Record) -> Timer:
+        raise NotImplementedError
+
+    def delete_args(self, items: typing.List[typing.Tuple[typing.Hashable, float]]) -> tuple:
+        return ([key for key, _ in items],)
+
+
+class MuteTimers(TimerSource):
+    event = "mute"
+    load_sql = (
+        "SELECT guild_id, member_id, end_time FROM guild_mutes "
+        "WHERE end_time < $1 AND (guild_id >> 22) % $2 = ANY($3::INT[])"
+    )
+    # Mutes are keyed by guild and member, bounding by end_time stops us from deleting a newer mute.
+    delete_sql = (
+        "DELETE FROM guild_mutes AS m "
+        "USING unnest($1::BIGINT[], $2::BIGINT[], $3::BIGINT[]) AS d(guild_id, member_id, end_time) "
+        "WHERE m.guild_id = d.guild_id AND m.member_id = d.member_id AND m.end_time <= d.end_time"
+    )
+
+    def load_args(self, bot, until):
+        return (int(until), *bot.shard_partition)
+
+    def from_record(self, record):
+        return Timer(self.event, (record["guild_id"], record["member_id"]), float(record["end_time"]))
+
+    def delete_args(self, items):
+        return ([key[0] for key, _ in items],
+                [key[1] for key, _ in items],
+                [min(int(bound), CANCELLED) for _, bound in items])
+
+
+class GiveawayTimers(TimerSource):
+    event = "giveaway"
+    load_sql = "SELECT message_id, channel_id, ends_at FROM giveaways WHERE ends_at < $1"
+    delete_sql = "DELETE FROM giveaways WHERE message_id = ANY($1::BIGINT[])"
+
+    def load_args(self, bot, until):
+        return (_from_timestamp(until),)
+
+    def owns(self, bot, timer):
+        # Giveaways don't store their guild, the channel only being visible to one cluster does the job.
+        return bot.get_channel(timer.data["channel_id"]) is not None
+
+    def from_record(self, record):
+        return Timer(self.event, record["message_id"], _to_timestamp(record["ends_at"]),
+                     {"channel_id": record["channel_id"]})
+
+
+class TempBanTimers(TimerSource):
+    event = "tempban"
+    load_sql = (
+        "SELECT id, guild_id, user_id, end_time FROM temp_bans "
+        "WHERE end_time < $1 AND (guild_id >> 22) % $2 = ANY($3::INT[])"
+    )
+    delete_sql = "DELETE FROM temp_bans WHERE id = ANY($1::INT[])"
+
+    def load_args(self, bot, until):
+        return (_from_timestamp(until), *bot.shard_partition)
+
+    def from_record(self, record):
+        return Timer(self.event, record["id"], _to_timestamp(record["end_time"]),
+                     {"guild_id": record["guild_id"], "user_id": record["user_id"]})
+
+
+class TimerManager:
+    """Keeps every timer that is due within `horizon` seconds in a min-heap
+    and has one task that sleeps until the earliest of them.
+
+    Rows further in the future stay in the database and get picked up by the
+    next window load, fired timers are deleted from their table in batches."""
+
+    def __init__(self, bot, *, horizon: float = 3600.0):
+        self.bot = bot
+        self.horizon = horizon
+        self.sources = {source.event: source for source in (MuteTimers(), GiveawayTimers(), TempBanTimers())}
+
+        self._heap = []
+        self._counter = itertools.count()
+        self._timers = {}
+        self._pending_deletes = defaultdict(dict)
+        self._loaded_until = 0.0
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def __len__(self):
+        return len(self._timers)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = self.bot.loop.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+        await self._flush_deletes()
+
+    def _push(self, timer: Timer):
+        self._timers[(timer.event, timer.key)] = timer
+        heapq.heappush(self._heap, (timer.expires, next(self._counter), timer))
+
+    def create(self, event: str, key: typing.Hashable, expires: float, **data) -> Timer:
+        """Schedules a timer whose row has already been inserted into its table."""
+
+        timer = Timer(event, key, expires, data)
+
+        # A delete for an older timer with the same key may still be queued, keep it from taking this one too.
+        pending = self._pending_deletes[event]
+        if key in pending:
+            pending[key] = min(pending[key], expires - 1)
+
+        # Anything outside of the window will get loaded from the table later on.
+        if expires < time.time() + self.horizon:
+            self._push(timer)
+            self._wakeup.set()
+
+        return timer
+
+    def get(self, event: str, key: typing.Hashable) -> typing.Optional[Timer]:
+        return self._timers.get((event, key))
+
+    def cancel(self, event: str, key: typing.Hashable) -> bool:
+        """Cancels a timer and deletes its row, returns whether it was scheduled in memory."""
+
+        timer = self._timers.pop((event, key), None)
+        self._pending_deletes[event][key] = CANCELLED
+        self._wakeup.set()
+
+        return timer is not None
+
+    async def _load(self, until: float):
+        for source in self.sources.values():
+            records = await self.bot.pool.fetch(source.load_sql, *source.load_args(self.bot, until))
+
+            for record in records:
+                timer = source.from_record(record)
+
+                if not source.owns(self.bot, timer):
+                    continue
+                if (timer.event, timer.key) in self._timers:
+                    continue
+                # Only rows the queued delete is going to take, a newer timer with the same key is kept.
+                if timer.expires <= self._pending_deletes[timer.event].get(timer.key, float("-inf")):
+                    continue
+
+                self._push(timer)
+
+        self._loaded_until = until
+
+    async def _flush_deletes(self):
+        for event, pending in list(self._pending_deletes.items()):
+            if not pending:
+                continue
+
+            source = self.sources[event]
+            batch = [*pending.items()]
+
+            try:
+                await self.bot.pool.execute(source.delete_sql, *source.delete_args(batch))
+            except (asyncpg.PostgresError, OSError):
+                logger.exception(f"Failed to delete {len(batch)} expired {event} timers, retrying later.")
+                continue
+
+            for key, bound in batch:
+                if pending.get(key) == bound:
+                    del pending[key]
+
+    def _pop_due(self, now: float) -> typing.List[Timer]:
+        due = []
+
+        while self._heap and self._heap[0][0] <= now:
+            _, _, timer = heapq.heappop(self._heap)
+
+            # Cancelled or rescheduled timers are left in the heap and skipped here.
+            if self._timers.get((timer.event, timer.key)) is not timer:
+                continue
+
+            del self._timers[(timer.event, timer.key)]
+            due.append(timer)
+
+        return due
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            await self._flush_deletes()
+
+            now = time.time()
+            if now + self.horizon / 2 >= self._loaded_until:
+                try:
+                    await self._load(now + self.horizon)
+                except (asyncpg.PostgresError, OSError):
+                    logger.exception("Failed to load timers, retrying in 30 seconds.")
+                    await asyncio.sleep(30.0)
+                    continue
+
+            due = self._pop_due(now)
+
+            for timer in due:
+                self._pending_deletes[timer.event][timer.key] = timer.expires
+                self.bot.dispatch(f"{timer.event}_timer_complete", timer)
+
+            if due:
+                continue
+
+            next_load = self._loaded_until - self.horizon / 2
+            delay = min(self._heap[0][0] if self._heap else next_load, next_load) - now
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(delay, 0.0))
+            except asyncio.TimeoutError:
+                pass
@@ -18,6 +18,8 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import asyncio
 import datetime
+import functools
+import itertools
 import random
 import re
 import time
@@ -26,9 +28,7 @@ import Levenshtein
 import aiohttp
 import dateparser
 import humanize
-import asyncpg
 import discord
-import pytz
 import toml
 import twemoji_parser
 import unicodedata
@@ -149,22 +149,56 @@ OWO_REPL = {
 }
 
 
-def _maintain_case_replace(sub: str, repl: str, text: str):
-    def _repl(match: re.Match):
-        group = match.group()
+def _owo_literal(pattern: str) -> str:
+    return pattern.replace("\\B", "")
 
-        for cond, method in METHODS.items():
-            if cond(group):
-                return method(repl)
-        return repl
-    return re.sub(sub, _repl, text, flags=re.I)
 
+def _owo_cased(group: str, repl: str) -> str:
+    return next((method(repl) for cond, method in METHODS.items() if cond(group)), repl)
+
+
+def _owo_case_variants() -> dict:
+    """Maps every casing of every OWO_REPL match to its replacement, in the case of the match."""
+
+    variants = {}
+
+    for pattern, repl in OWO_REPL.items():
+        literal = _owo_literal(pattern)
+
+        for combo in itertools.product(*((c.lower(), c.upper()) for c in literal)):
+            group = "".join(combo)
+            variants[group] = _owo_cased(group, repl)
+
+    return variants
+
+
+# Longest matches go first in the alternation and the lookahead lets the
+# regex engine skip any character that can't start a match.
+_OWO_PATTERNS = sorted(OWO_REPL, key=lambda p: len(_owo_literal(p)), reverse=True)
+_OWO_FIRST_CHARS = "".join(sorted({_owo_literal(p)[0] for p in _OWO_PATTERNS}))
+OWO_REGEX = re.compile(f"(?=[{_OWO_FIRST_CHARS}])(?:{'|'.join(_OWO_PATTERNS)})", flags=re.I)
+OWO_VARIANTS = _owo_case_variants()
+
+
+def _owo_repl(match: re.Match):
+    group = match.group()
+
+    try:
+        return OWO_VARIANTS[group]
+    except KeyError:
+        # re.I also matches unicode case folds like "ſ" for "s", which aren't in the table.
+        repl = next(repl for pattern, repl in OWO_REPL.items()
+                    if re.fullmatch(_owo_literal(pattern), group, flags=re.I))
+        return _owo_cased(group, repl)
+
+
+@functools.lru_cache(maxsize=1024)
+def _owoify(text: str) -> str:
+    return OWO_REGEX.sub(_owo_repl, text)
 
-def owoify_text(text: str):
-    for sub, repl in OWO_REPL.items():
-        text = _maintain_case_replace(sub, repl, text)
 
-    return text + " " + random.choice(("owo", "uwu"))
+def owoify_text(text: str):
+    return _owoify(text) + " " + random.choice(("owo", "uwu"))
 
 
 def owoify_embed(embed: discord.Embed):
@@ -290,42 +324,6 @@ class NotTagOwner(commands.CheckFailure):
     pass
 
 
-async def set_giveaway(bot, end_time, channel_id, message_id):
-    async def giveaway_task(bot, end_time, channel_id, message_id):
-        now = datetime.datetime.utcnow().replace(tzinfo=pytz.UTC)
-        seconds_until = (end_time - now).total_seconds()
-        await asyncio.sleep(seconds_until)
-
-        try:
-            await bot.pool.execute("DELETE FROM giveaways WHERE message_id = $1",
-                                   message_id)
-            channel = await bot.fetch_channel(channel_id)
-            message = discord.PartialMessage(channel=channel, id=message_id)
-            bot.dispatch("giveaway_end", message)
-        except asyncpg.PostgresError:
-            pass
-
-    bot.loop.create_task(giveaway_task(bot, end_time, channel_id, message_id))
-
-
-async def set_mute(bot, guild_id, user_id, _time):
-    async def mute_task(bot, guild_id, user_id, _time):
-        await asyncio.sleep(_time)
-
-        try:
-            await bot.pool.execute("DELETE FROM guild_mutes WHERE member_id = $1 AND guild_id = $2",
-                                   user_id, guild_id)
-            guild = await bot.fetch_guild(guild_id)
-            member = await guild.fetch_member(user_id)
-            mute_role = guild.get_role(bot.config[guild_id]["mute_role_id"])
-
-            await member.remove_roles(mute_role, reason="Mute time is over.")
-        except asyncpg.PostgresError:
-            pass
-
-    bot.loop.create_task(mute_task(bot, guild_id, user_id, _time))
-
-
 def log(*args):
     print(f"{time.strftime('%I:%M:%S')} | {' '.join(map(str, args))}")
 
@@ -498,15 +496,12 @@ def format_time(dt):
 
 
 def get_best_difference(list_of_strings, string_main) -> typing.Union[None, str]:
-    differences = {}
-    values = []
-    for string in list_of_strings:
-        difference = Levenshtein.distance(string_main, string)
-        differences[string] = difference
-    for key, value in differences.items():
-        values.append(value)
-    values = sorted(values, reverse=False)
-    if values[0] > 5:
+    """The closest string within 5 edits, in one pass over the strings.
+    Use a `utils.FuzzyIndex` instead when matching against the same strings more than once."""
+
+    distance, best = min(((Levenshtein.distance(string_main, string), string) for string in list_of_strings),
+                         key=lambda pair: pair[0], default=(None, None))
+    if distance is None or distance > 5:
         return None
-    differences = sorted(differences, key=differences.get, reverse=False)
-    return differences[0]
+
+    return best